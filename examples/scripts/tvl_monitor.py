@@ -84,7 +84,8 @@ sns.set_palette(sns.color_palette(colors))
 
 # Get & clean TVL data from DeFiLlama
 dl = DeFiLlama()
-protocol_tvls = dl.get_protocol_tvl_timeseries(protocols, start_date=start, end_date=end)
+protocol_tvls = dl.get_protocol_tvl_timeseries(protocols, start_date=start, end_date=end,
+                                               include_native=False)
 df = clean_tvl_data(protocol_tvls)
 
 protocol_name = protocols[0].capitalize()
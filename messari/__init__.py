@@ -0,0 +1,21 @@
+"""Module to handle initialization, imports, for the messari package"""
+
+# Names in __all__ are resolved by the module level __getattr__ (PEP 562)
+# pylint: disable=undefined-all-variable,invalid-name
+
+import importlib
+
+# Client classes & the subpackage they are imported from on first use
+_LAZY_ATTRIBUTES = {'Messari': '.messari', 'DeFiLlama': '.defillama'}
+
+__all__ = list(_LAZY_ATTRIBUTES)
+
+
+def __getattr__(name: str):
+    if name in _LAZY_ATTRIBUTES:
+        return getattr(importlib.import_module(_LAZY_ATTRIBUTES[name], __name__), name)
+    raise AttributeError(f'module {__name__!r} has no attribute {name!r}')
+
+
+def __dir__():
+    return sorted(list(globals()) + __all__)
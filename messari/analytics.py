@@ -0,0 +1,251 @@
+"""This module is dedicated to vectorized rolling analytics over metric panels,
+DataFrames indexed by timestamp with one column per asset, as returned by
+Messari.get_metric_timeseries (price panels are indexed by df[asset][field])"""
+
+from __future__ import annotations
+
+from typing import Dict, Tuple
+
+from messari.lazy import numpy as np
+from messari.lazy import pandas as pd
+
+
+def panel_matrix(panel: pd.DataFrame, field: str = 'close') -> pd.DataFrame:
+    """Select one value per asset from a metric panel.
+
+    :param panel: pd.DataFrame
+        Panel with one column per asset or MultiIndex columns indexed by df[asset][field]
+    :param field: str
+        Field selected from MultiIndex panels. Default is 'close'.
+    :return pandas DataFrame indexed by timestamp with one float column per asset
+    """
+    if isinstance(panel.columns, pd.MultiIndex):
+        panel = panel.xs(field, axis=1, level=1)
+    return panel.astype(float)
+
+
+def _rolling_moments(values: np.ndarray, window: int,
+                     min_periods: int = None) -> Tuple[np.ndarray, np.ndarray]:
+    """Rolling mean & sample standard deviation of every column at once, ignoring NaN.
+    Windows are updated with pandas' online (Welford) algorithm, which stays accurate
+    where differences of cumulative sums of squares lose precision.
+
+    :param values: np.ndarray
+        2D array (rows x assets)
+    :param window: int
+        Number of rows in each window
+    :param min_periods: int
+        Minimum non-NaN observations required, defaults to window
+    :return Tuple of mean & std arrays shaped like values
+    """
+    min_periods = window if min_periods is None else min_periods
+    rolling = pd.DataFrame(values).rolling(window, min_periods=max(min_periods, 2))
+    return rolling.mean().to_numpy(), rolling.std().to_numpy()
+
+
+def returns(panel: pd.DataFrame, field: str = 'close', log: bool = False) -> pd.DataFrame:
+    """Period returns of every asset.
+
+    :param panel: pd.DataFrame
+        Metric panel
+    :param field: str
+        Field selected from MultiIndex panels. Default is 'close'.
+    :param log: bool
+        Return log returns instead of simple returns. Default is False.
+    :return pandas DataFrame of returns
+    """
+    matrix = panel_matrix(panel, field)
+    values = matrix.to_numpy()
+    output = np.full(values.shape, np.nan)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        if log:
+            output[1:] = np.log(values[1:] / values[:-1])
+        else:
+            output[1:] = values[1:] / values[:-1] - 1.0
+    return pd.DataFrame(output, index=matrix.index, columns=matrix.columns)
+
+
+def rolling_volatility(panel: pd.DataFrame, window: int, field: str = 'close',
+                       periods_per_year: int = 365) -> pd.DataFrame:
+    """Annualized rolling standard deviation of returns.
+
+    :param panel: pd.DataFrame
+        Metric panel
+    :param window: int
+        Number of periods in each window
+    :param field: str
+        Field selected from MultiIndex panels. Default is 'close'.
+    :param periods_per_year: int
+        Periods used to annualize, default is 365 for daily data
+    :return pandas DataFrame of volatility
+    """
+    period_returns = returns(panel, field)
+    _, std = _rolling_moments(period_returns.to_numpy(), window)
+    return pd.DataFrame(std * np.sqrt(periods_per_year), index=period_returns.index,
+                        columns=period_returns.columns)
+
+
+def rolling_sharpe(panel: pd.DataFrame, window: int, field: str = 'close',
+                   risk_free_rate: float = 0.0, periods_per_year: int = 365) -> pd.DataFrame:
+    """Annualized rolling Sharpe ratio of returns.
+
+    :param panel: pd.DataFrame
+        Metric panel
+    :param window: int
+        Number of periods in each window
+    :param field: str
+        Field selected from MultiIndex panels. Default is 'close'.
+    :param risk_free_rate: float
+        Annual risk-free rate. Default is 0.
+    :param periods_per_year: int
+        Periods used to annualize, default is 365 for daily data
+    :return pandas DataFrame of Sharpe ratios
+    """
+    period_returns = returns(panel, field)
+    excess = period_returns.to_numpy() - risk_free_rate / periods_per_year
+    mean, std = _rolling_moments(excess, window)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        sharpe = mean / std * np.sqrt(periods_per_year)
+    return pd.DataFrame(sharpe, index=period_returns.index, columns=period_returns.columns)
+
+
+def drawdowns(panel: pd.DataFrame, field: str = 'close') -> pd.DataFrame:
+    """Drawdown of every asset from its running peak, as a negative fraction.
+
+    :param panel: pd.DataFrame
+        Metric panel
+    :param field: str
+        Field selected from MultiIndex panels. Default is 'close'.
+    :return pandas DataFrame of drawdowns
+    """
+    matrix = panel_matrix(panel, field)
+    values = matrix.to_numpy()
+    peaks = np.fmax.accumulate(values, axis=0)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        drawdown = values / peaks - 1.0
+    return pd.DataFrame(drawdown, index=matrix.index, columns=matrix.columns)
+
+
+def max_drawdown(panel: pd.DataFrame, field: str = 'close') -> pd.Series:
+    """Largest drawdown of every asset over the panel.
+
+    :param panel: pd.DataFrame
+        Metric panel
+    :param field: str
+        Field selected from MultiIndex panels. Default is 'close'.
+    :return pandas Series of max drawdown indexed by asset
+    """
+    return drawdowns(panel, field).min()
+
+
+def rolling_correlation(panel: pd.DataFrame, window: int, field: str = 'close') -> Dict:
+    """Rolling cross-asset correlation of returns computed for all pairs at once.
+
+    :param panel: pd.DataFrame
+        Metric panel
+    :param window: int
+        Number of periods in each window
+    :param field: str
+        Field selected from MultiIndex panels. Default is 'close'.
+    :return Dictionary with 'index', 'assets' & 'values', a
+        (rows x assets x assets) array of correlation matrices ending at each row
+    """
+    period_returns = returns(panel, field)
+    values = period_returns.to_numpy()
+    rows, assets = values.shape
+    correlations = np.full((rows, assets, assets), np.nan)
+    if rows >= window:
+        windows = np.lib.stride_tricks.sliding_window_view(values, window, axis=0)
+        # windows: (rows - window + 1, assets, window)
+        centered = windows - np.nanmean(windows, axis=2, keepdims=True)
+        centered = np.where(np.isnan(centered), 0.0, centered)
+        covariance = np.einsum('nat,nbt->nab', centered, centered)
+        scale = np.sqrt(np.einsum('naa->na', covariance))
+        with np.errstate(invalid='ignore', divide='ignore'):
+            correlations[window - 1:] = covariance / (scale[:, :, None] * scale[:, None, :])
+    return {'index': period_returns.index, 'assets': list(period_returns.columns),
+            'values': correlations}
+
+
+class RollingAnalytics:
+    """This class keeps rolling volatility, Sharpe & drawdowns for a panel that
+    grows over time. Each update only computes statistics for the new rows,
+    reusing the last window of returns & the running peaks.
+
+    Parameters
+    ----------
+       window: int
+           Number of periods in each window
+       field: str
+           Field selected from MultiIndex panels. Default is 'close'.
+       risk_free_rate: float
+           Annual risk-free rate. Default is 0.
+       periods_per_year: int
+           Periods used to annualize, default is 365 for daily data
+    """
+
+    def __init__(self, window: int, field: str = 'close', risk_free_rate: float = 0.0,
+                 periods_per_year: int = 365):
+        self.window = window
+        self.field = field
+        self.risk_free_rate = risk_free_rate
+        self.periods_per_year = periods_per_year
+        self.last_index = None
+        self._columns = None
+        self._last_values = None
+        self._tail_returns = None
+        self._peaks = None
+
+    def update(self, panel: pd.DataFrame) -> Dict[str, pd.DataFrame]:
+        """Add rows to the tracked panel. Rows at or before the last seen
+        timestamp are ignored, so the full panel can be passed on every update.
+
+        :param panel: pd.DataFrame
+            Metric panel containing new rows
+        :return Dictionary of 'volatility', 'sharpe' & 'drawdown' DataFrames for the new rows
+        """
+        matrix = panel_matrix(panel, self.field)
+        if self._columns is None:
+            self._columns = matrix.columns
+            self._tail_returns = np.empty((0, len(self._columns)))
+            self._peaks = np.full(len(self._columns), np.nan)
+        matrix = matrix.reindex(columns=self._columns)
+        if self.last_index is not None:
+            matrix = matrix[matrix.index > self.last_index]
+        values = matrix.to_numpy()
+        if matrix.index.empty:
+            empty = pd.DataFrame(columns=self._columns, dtype=float)
+            return {'volatility': empty, 'sharpe': empty, 'drawdown': empty}
+
+        if self._last_values is None:
+            prior = np.vstack([np.full((1, values.shape[1]), np.nan), values[:-1]])
+        else:
+            prior = np.vstack([self._last_values, values[:-1]])
+        with np.errstate(invalid='ignore', divide='ignore'):
+            new_returns = values / prior - 1.0
+
+        history = np.vstack([self._tail_returns, new_returns])
+        excess = history - self.risk_free_rate / self.periods_per_year
+        _, std = _rolling_moments(history, self.window)
+        mean, excess_std = _rolling_moments(excess, self.window)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            sharpe = mean / excess_std * np.sqrt(self.periods_per_year)
+        new_rows = slice(len(history) - len(values), None)
+
+        peaks = np.fmax.accumulate(np.vstack([self._peaks, values]), axis=0)[1:]
+        with np.errstate(invalid='ignore', divide='ignore'):
+            drawdown = values / peaks - 1.0
+
+        self._tail_returns = history[-(self.window - 1):] if self.window > 1 \
+            else history[:0]
+        self._last_values = values[-1:]
+        self._peaks = peaks[-1]
+        self.last_index = matrix.index[-1]
+
+        def frame(array: np.ndarray) -> pd.DataFrame:
+            return pd.DataFrame(array, index=matrix.index, columns=self._columns)
+
+        return {'volatility': frame(std[new_rows] * np.sqrt(self.periods_per_year)),
+                'sharpe': frame(sharpe[new_rows]),
+                'drawdown': frame(drawdown)}
+
@@ -0,0 +1,554 @@
+"""This module is dedicated to long running backfills. A job is split into units
+(assets x metrics x date range chunks, or one unit per DeFi Llama protocol/chain)
+recorded in a SQLite work queue. Workers lease units, write them with the export
+writer & checkpoint them as done, so a crashed backfill resumes where it stopped
+& several worker processes sharing the queue file split the work between them."""
+
+from __future__ import annotations
+
+import argparse
+import datetime
+import json
+import logging
+import os
+import socket
+import sqlite3
+import sys
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterator, List, Tuple
+
+from messari.export import ExportJob, ExportTask, PartitionedWriter, flatten_frame
+from messari.messari.catalog import get_catalog
+from messari.priority import BATCH, request_priority
+from messari.scheduler import RateLimiter
+
+# Unit states, leased units whose lease expired are available again
+PENDING = "pending"
+LEASED = "leased"
+DONE = "done"
+FAILED = "failed"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    name TEXT PRIMARY KEY,
+    spec TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS units (
+    id INTEGER PRIMARY KEY,
+    job TEXT NOT NULL REFERENCES jobs(name),
+    source TEXT NOT NULL,
+    dataset TEXT NOT NULL,
+    key TEXT NOT NULL,
+    method TEXT NOT NULL,
+    kwargs TEXT NOT NULL,
+    part TEXT NOT NULL,
+    status TEXT NOT NULL DEFAULT 'pending',
+    attempts INTEGER NOT NULL DEFAULT 0,
+    available_at REAL NOT NULL DEFAULT 0,
+    owner TEXT,
+    lease_expires REAL,
+    checkpoint TEXT,
+    error TEXT,
+    UNIQUE (job, dataset, key, part)
+);
+CREATE INDEX IF NOT EXISTS units_status ON units (status, available_at);
+"""
+
+UNIT_COLUMNS = "id, job, source, dataset, key, method, kwargs, part, attempts"
+
+SECONDS_PER_DAY = 86400
+
+
+class BackfillUnit:
+    """This class is one leased unit of work of a backfill job
+
+    Parameters
+    ----------
+       unit_id: int
+           Row id in the queue
+       job: str
+           Job name
+       task: ExportTask
+           Fetch of the unit
+       part: str
+           File name suffix of the unit's range chunk
+       attempts: int
+           Times the unit was leased, including this lease
+    """
+
+    def __init__(self, unit_id: int, job: str, task: ExportTask, part: str, attempts: int):
+        self.id = unit_id
+        self.job = job
+        self.task = task
+        self.part = part
+        self.attempts = attempts
+
+    def __repr__(self) -> str:
+        return f"BackfillUnit({self.id}, {self.job!r}, {self.task.name!r}, {self.part!r})"
+
+
+def chunk_range(start: str, end: str, chunk_days: int) -> List[Tuple[str, str]]:
+    """Split an inclusive date range into consecutive chunks
+
+    :param start: str
+        Start date ("YYYY-MM-DD")
+    :param end: str
+        End date ("YYYY-MM-DD")
+    :param chunk_days: int
+        Days per chunk
+    :return: List of inclusive (start, end) date strings
+    """
+    if chunk_days < 1:
+        raise ValueError("chunk_days must be at least 1")
+    first = datetime.date.fromisoformat(start)
+    last = datetime.date.fromisoformat(end)
+    if last < first:
+        raise ValueError("End date must not be before start date")
+    chunks = []
+    while first <= last:
+        chunk_end = min(first + datetime.timedelta(days=chunk_days - 1), last)
+        chunks.append((first.isoformat(), chunk_end.isoformat()))
+        first = chunk_end + datetime.timedelta(days=1)
+    return chunks
+
+
+def plan_units(job: ExportJob, chunk_days: int = 365) -> List[Tuple[ExportTask, str]]:
+    """Split the tasks of a job into units
+
+    Messari timeseries are split into chunk_days date ranges, shortened so a chunk
+    never spans more points at the job's interval than one request can return. DeFi
+    Llama endpoints return the full history in one response so their tasks aren't split.
+
+    :param job: ExportJob
+        Job to split
+    :param chunk_days: int
+        Days per Messari range chunk. Default is 365.
+    :return: List of (task, part) pairs
+    """
+    catalog = get_catalog()
+    units = []
+    for task in job.tasks():
+        if task.source != "messari" or not job.start:
+            units.append((task, "0"))
+            continue
+        task_chunk_days = chunk_days
+        interval_seconds = catalog.intervals.get(task.kwargs.get("interval"))
+        if interval_seconds:
+            max_days = catalog.max_points * interval_seconds // SECONDS_PER_DAY
+            task_chunk_days = max(1, min(chunk_days, int(max_days)))
+        for chunk_start, chunk_end in chunk_range(job.start, job.end, task_chunk_days):
+            kwargs = dict(task.kwargs, start=chunk_start, end=chunk_end)
+            chunk = ExportTask(task.source, task.dataset, task.key, task.method, kwargs)
+            units.append((chunk, chunk_start.replace("-", "")))
+    return units
+
+
+class BackfillQueue:
+    """This class is a work queue of backfill units stored in a SQLite file.
+
+    Every operation runs in its own short transaction, so worker threads, processes
+    & nodes sharing the file can lease units concurrently. A unit's lease expires
+    after lease_seconds unless its worker heartbeats, after which another worker
+    picks it up; failed units are retried until max_attempts, invalid requests
+    (ValueError) fail right away.
+
+    Parameters
+    ----------
+       path: str
+           Path to the SQLite file, created if missing
+       max_attempts: int
+           Leases of a unit before it is marked failed. Default is 5.
+       retry_delay: float
+           Seconds before a failed unit is leased again. Default is 60.
+       journal_mode: str
+           SQLite journal mode. Default is WAL, which only works for processes on one
+           machine; use DELETE when workers on several nodes share the file.
+       clock: Callable
+           Function returning the current unix time. Default is time.time.
+    """
+
+    def __init__(self, path: str, max_attempts: int = 5, retry_delay: float = 60.0,
+                 journal_mode: str = "WAL", clock: Callable[[], float] = time.time):
+        self.path = path
+        self.journal_mode = journal_mode
+        self.max_attempts = max_attempts
+        self.retry_delay = retry_delay
+        self.clock = clock
+        with self._transaction() as conn:
+            for statement in SCHEMA.split(";"):
+                if statement.strip():
+                    conn.execute(statement)
+
+    @contextmanager
+    def _transaction(self) -> Iterator[sqlite3.Connection]:
+        """Connection holding the write lock until the block exits"""
+        conn = sqlite3.connect(self.path, timeout=60, isolation_level=None)
+        try:
+            conn.execute(f"PRAGMA journal_mode={self.journal_mode}")
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield conn
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+            conn.execute("COMMIT")
+        finally:
+            conn.close()
+
+    def submit(self, name: str, spec: Dict, chunk_days: int = 365) -> int:
+        """Record a job & enqueue its units, units already in the queue are kept
+        as they are so resubmitting a job only adds what is missing
+
+        :param name: str
+            Job name
+        :param spec: dict
+            Job spec, see ExportJob.from_dict. api_key isn't stored.
+        :param chunk_days: int
+            Days per Messari range chunk. Default is 365.
+        :return: Number of units added
+        """
+        spec = json.loads(json.dumps(spec))
+        spec.get("messari", {}).pop("api_key", None)
+        job = ExportJob.from_dict(spec)
+        rows = [(name, task.source, task.dataset, task.key, task.method,
+                 json.dumps(task.kwargs), part) for task, part in plan_units(job, chunk_days)]
+        with self._transaction() as conn:
+            conn.execute("INSERT INTO jobs (name, spec) VALUES (?, ?) "
+                         "ON CONFLICT (name) DO UPDATE SET spec = excluded.spec",
+                         (name, json.dumps(spec)))
+            before = conn.total_changes
+            conn.executemany("INSERT OR IGNORE INTO units (job, source, dataset, key, method, "
+                             "kwargs, part) VALUES (?, ?, ?, ?, ?, ?, ?)", rows)
+            return conn.total_changes - before
+
+    def job_spec(self, name: str) -> Dict:
+        """Spec of a submitted job
+
+        :param name: str
+            Job name
+        :return: dict
+        """
+        with self._transaction() as conn:
+            row = conn.execute("SELECT spec FROM jobs WHERE name = ?", (name,)).fetchone()
+        if row is None:
+            raise ValueError(f"Job {name!r} is not in the queue")
+        return json.loads(row[0])
+
+    def acquire(self, owner: str, lease_seconds: float = 600.0) -> BackfillUnit:
+        """Lease the next available unit
+
+        :param owner: str
+            Worker id holding the lease
+        :param lease_seconds: float
+            Seconds until the lease expires without a heartbeat. Default is 600.
+        :return: BackfillUnit, None if no unit is available
+        """
+        now = self.clock()
+        with self._transaction() as conn:
+            # Units whose worker died on their last attempt aren't leased again
+            conn.execute("UPDATE units SET status = ?, error = 'lease expired', owner = NULL "
+                         "WHERE status = ? AND lease_expires < ? AND attempts >= ?",
+                         (FAILED, LEASED, now, self.max_attempts))
+            row = conn.execute(f"SELECT {UNIT_COLUMNS} FROM units "
+                               "WHERE (status = ? AND available_at <= ?) "
+                               "OR (status = ? AND lease_expires < ?) ORDER BY id LIMIT 1",
+                               (PENDING, now, LEASED, now)).fetchone()
+            if row is None:
+                return None
+            conn.execute("UPDATE units SET status = ?, owner = ?, lease_expires = ?, "
+                         "attempts = attempts + 1 WHERE id = ?",
+                         (LEASED, owner, now + lease_seconds, row[0]))
+        unit_id, job, source, dataset, key, method, kwargs, part, attempts = row
+        task = ExportTask(source, dataset, key, method, json.loads(kwargs))
+        return BackfillUnit(unit_id, job, task, part, attempts + 1)
+
+    def heartbeat(self, owner: str, lease_seconds: float = 600.0) -> int:
+        """Extend every lease held by owner
+
+        :param owner: str
+            Worker id
+        :param lease_seconds: float
+            Seconds from now until the leases expire. Default is 600.
+        :return: Number of extended leases
+        """
+        with self._transaction() as conn:
+            return conn.execute("UPDATE units SET lease_expires = ? WHERE status = ? "
+                                "AND owner = ?",
+                                (self.clock() + lease_seconds, LEASED, owner)).rowcount
+
+    def complete(self, unit: BackfillUnit, owner: str, checkpoint: Dict = None) -> bool:
+        """Mark a unit as done & record its checkpoint
+
+        :param unit: BackfillUnit
+            Leased unit
+        :param owner: str
+            Worker id holding the lease
+        :param checkpoint: dict
+            Optional JSON serializable progress (i.e. rows & files written)
+        :return: False if the lease was lost to another worker
+        """
+        with self._transaction() as conn:
+            return conn.execute("UPDATE units SET status = ?, owner = NULL, lease_expires = NULL, "
+                                "error = NULL, checkpoint = ? WHERE id = ? AND owner = ? "
+                                "AND status = ?", (DONE, json.dumps(checkpoint or {}), unit.id,
+                                                   owner, LEASED)).rowcount == 1
+
+    def fail(self, unit: BackfillUnit, owner: str, error: str, retry: bool = True) -> bool:
+        """Release a unit after an error, it is retried after retry_delay
+        until it was attempted max_attempts times
+
+        :param unit: BackfillUnit
+            Leased unit
+        :param owner: str
+            Worker id holding the lease
+        :param error: str
+            Error message
+        :param retry: bool
+            False marks the unit as failed right away, i.e. for invalid requests
+        :return: False if the lease was lost to another worker
+        """
+        status = FAILED if not retry or unit.attempts >= self.max_attempts else PENDING
+        with self._transaction() as conn:
+            return conn.execute("UPDATE units SET status = ?, owner = NULL, lease_expires = NULL, "
+                                "available_at = ?, error = ? WHERE id = ? AND owner = ? "
+                                "AND status = ?", (status, self.clock() + self.retry_delay,
+                                                   error, unit.id, owner, LEASED)).rowcount == 1
+
+    def retry_failed(self, job: str = None) -> int:
+        """Make failed units available again with their attempts reset
+
+        :param job: str
+            Optional job name, default is every job
+        :return: Number of units requeued
+        """
+        query = "UPDATE units SET status = ?, attempts = 0, available_at = 0 WHERE status = ?"
+        params = [PENDING, FAILED]
+        if job is not None:
+            query += " AND job = ?"
+            params.append(job)
+        with self._transaction() as conn:
+            return conn.execute(query, params).rowcount
+
+    def progress(self, job: str = None) -> Dict[str, int]:
+        """Number of units in each state
+
+        :param job: str
+            Optional job name, default is every job
+        :return: dict of counts keyed by state
+        """
+        query = "SELECT status, COUNT(*) FROM units"
+        params = []
+        if job is not None:
+            query += " WHERE job = ?"
+            params.append(job)
+        with self._transaction() as conn:
+            counts = dict(conn.execute(query + " GROUP BY status", params).fetchall())
+        return {status: counts.get(status, 0) for status in (PENDING, LEASED, DONE, FAILED)}
+
+    def errors(self, job: str = None) -> Dict[str, str]:
+        """Last error of every failed unit
+
+        :param job: str
+            Optional job name, default is every job
+        :return: dict of errors keyed by 'job:dataset/key:part'
+        """
+        query = "SELECT job, dataset, key, part, error FROM units WHERE status = ?"
+        params = [FAILED]
+        if job is not None:
+            query += " AND job = ?"
+            params.append(job)
+        with self._transaction() as conn:
+            rows = conn.execute(query, params).fetchall()
+        return {f"{name}:{dataset}/{key}:{part}": error for name, dataset, key, part, error in rows}
+
+
+def worker_id() -> str:
+    """Unique id of a worker, i.e. host:pid:suffix"""
+    return f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+
+class BackfillWorker:
+    """This class pulls units from a BackfillQueue until none is available, fetching
+    each unit & writing it with the export writer of its job. Leases are kept alive
+    by a heartbeat thread while units are processed.
+
+    Run one worker per process, or several with threads, on every machine sharing
+    the queue file. Units are written to part files named after their range chunk,
+    so a unit written twice after a lost lease overwrites the same files.
+
+    Parameters
+    ----------
+       queue: BackfillQueue
+           Work queue
+       clients: dict
+           Optional clients keyed by source ('messari', 'defillama'),
+           missing clients are created from the job spec
+       owner: str
+           Optional worker id, default is host:pid:suffix
+       lease_seconds: float
+           Seconds until a lease expires without a heartbeat. Default is 600.
+       threads: int
+           Units processed concurrently. Default is 1.
+    """
+
+    def __init__(self, queue: BackfillQueue, clients: Dict = None, owner: str = None,
+                 lease_seconds: float = 600.0, threads: int = 1):
+        self.queue = queue
+        self.clients = dict(clients or {})
+        self.owner = owner or worker_id()
+        self.lease_seconds = lease_seconds
+        self.threads = threads
+        self.completed = 0
+        self.failed = 0
+        self._jobs: Dict[str, Tuple[ExportJob, PartitionedWriter, RateLimiter]] = {}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+
+    def _job(self, name: str) -> Tuple[ExportJob, PartitionedWriter, RateLimiter]:
+        """Job, writer & rate limiter of a job name, loaded once per worker"""
+        with self._lock:
+            if name not in self._jobs:
+                job = ExportJob.from_dict(self.queue.job_spec(name))
+                writer = PartitionedWriter(job.output, job.file_format, job.partition)
+                limiter = RateLimiter(job.rate_limit, burst=self.threads) \
+                    if job.rate_limit else None
+                self._jobs[name] = job, writer, limiter
+            return self._jobs[name]
+
+    def _client(self, job: ExportJob, source: str):
+        with self._lock:
+            if source not in self.clients:
+                self.clients[source] = job.client(source)
+            return self.clients[source]
+
+    def process(self, unit: BackfillUnit) -> None:
+        """Fetch & write one unit, then check it in"""
+        try:
+            job, writer, limiter = self._job(unit.job)
+            if limiter is not None:
+                time.sleep(limiter.delay())
+            task = unit.task
+            method = getattr(self._client(job, task.source), task.method)
+            with request_priority(BATCH):
+                frame = flatten_frame(task, method(**task.kwargs))
+            files = writer.write(task.dataset, task.key, frame, part=unit.part)
+        except Exception as e:  # pylint: disable=broad-except
+            logging.warning("Backfill of %r failed: %s", unit, e)
+            # Invalid requests fail the same way on every attempt, malformed
+            # response bodies (JSONDecodeError) may not
+            retry = not isinstance(e, ValueError) or isinstance(e, json.JSONDecodeError)
+            self.queue.fail(unit, self.owner, str(e), retry=retry)
+            with self._lock:
+                self.failed += 1
+            return
+        if not self.queue.complete(unit, self.owner, {"rows": len(frame), "files": files}):
+            logging.warning("Lease of %r was lost before it completed", unit)
+        with self._lock:
+            self.completed += 1
+
+    def run(self, max_units: int = None) -> int:
+        """Process units until none is available, max_units are processed or stop is called
+
+        :param max_units: int
+            Optional maximum units to process
+        :return: Number of units processed
+        """
+        self._stop.clear()
+        remaining = [max_units]
+        heartbeat = threading.Thread(target=self._heartbeat, daemon=True)
+        heartbeat.start()
+
+        def take() -> BackfillUnit:
+            with self._lock:
+                if remaining[0] is not None:
+                    if remaining[0] <= 0:
+                        return None
+                    remaining[0] -= 1
+            return self.queue.acquire(self.owner, self.lease_seconds)
+
+        def loop() -> None:
+            while not self._stop.is_set():
+                unit = take()
+                if unit is None:
+                    return
+                self.process(unit)
+
+        started = self.completed + self.failed
+        threads = [threading.Thread(target=loop) for _ in range(self.threads)]
+        try:
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        finally:
+            self._stop.set()
+            heartbeat.join()
+        return self.completed + self.failed - started
+
+    def stop(self) -> None:
+        """Stop after the units in progress"""
+        self._stop.set()
+
+    def _heartbeat(self) -> None:
+        while not self._stop.wait(self.lease_seconds / 3):
+            self.queue.heartbeat(self.owner, self.lease_seconds)
+
+
+def main(argv: List[str] = None, clients: Dict = None) -> int:
+    """Entry point of the messari-backfill console script
+
+        messari-backfill submit <queue> <job> <spec.json> [--chunk-days N]
+        messari-backfill work <queue> [--threads N] [--max-units N]
+        messari-backfill status <queue> [--job NAME]
+        messari-backfill retry <queue> [--job NAME]
+
+    :param argv: list
+        Command line arguments, default is sys.argv
+    :param clients: dict
+        Optional clients keyed by source, see BackfillWorker
+    :return: Exit code, 1 if status finds failed units
+    """
+    parser = argparse.ArgumentParser(prog="messari-backfill",
+                                     description="Resumable backfills sharing a SQLite queue")
+    commands = parser.add_subparsers(dest="command", required=True)
+    submit = commands.add_parser("submit", help="enqueue the units of a job spec")
+    submit.add_argument("queue")
+    submit.add_argument("job")
+    submit.add_argument("spec", help="JSON job spec, see messari.export.ExportJob.from_dict")
+    submit.add_argument("--chunk-days", type=int, default=365)
+    work = commands.add_parser("work", help="process units until the queue is drained")
+    work.add_argument("queue")
+    work.add_argument("--threads", type=int, default=1)
+    work.add_argument("--max-units", type=int)
+    work.add_argument("--lease-seconds", type=float, default=600.0)
+    for name in ("status", "retry"):
+        command = commands.add_parser(name, help=f"{name} units of the queue")
+        command.add_argument("queue")
+        command.add_argument("--job")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO)
+    queue = BackfillQueue(args.queue)
+    if args.command == "submit":
+        with open(args.spec, "r", encoding="utf-8") as infile:
+            spec = json.load(infile)
+        print(f"Added {queue.submit(args.job, spec, args.chunk_days)} units")
+    elif args.command == "work":
+        worker = BackfillWorker(queue, clients=clients, lease_seconds=args.lease_seconds,
+                                threads=args.threads)
+        worker.run(args.max_units)
+        print(f"Completed {worker.completed} units, {worker.failed} failed")
+    elif args.command == "retry":
+        print(f"Requeued {queue.retry_failed(args.job)} units")
+    else:
+        progress = queue.progress(args.job)
+        print(json.dumps({"units": progress, "errors": queue.errors(args.job)}, indent=2))
+        return 1 if progress[FAILED] else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,192 @@
+"""This module is dedicated to response caching shared by the DataLoader classes"""
+
+import json
+import logging
+import threading
+import time
+from typing import Any, Callable, Dict, Hashable, Tuple, Union
+
+from messari.cache_backends import CacheBackend, MemoryBackend
+
+
+class CachePolicy:
+    """This class describes how long a cached response can be served
+
+    Parameters
+    ----------
+       ttl: float
+           Seconds a cached response is considered fresh
+       stale_ttl: float
+           Additional seconds a stale response is served immediately while it is
+           refreshed in the background (stale-while-revalidate). Default is 0.
+    """
+
+    def __init__(self, ttl: float, stale_ttl: float = 0):
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+
+    def __repr__(self) -> str:
+        return f'CachePolicy(ttl={self.ttl}, stale_ttl={self.stale_ttl})'
+
+
+##########################
+# Endpoint classes
+##########################
+# Asset profiles, metadata & taxonomy change rarely
+STATIC_POLICY = CachePolicy(ttl=24 * 60 * 60, stale_ttl=7 * 24 * 60 * 60)
+# Historical timeseries only change at the most recent point
+TIMESERIES_POLICY = CachePolicy(ttl=60 * 60, stale_ttl=24 * 60 * 60)
+# Listings such as DeFi Llama protocols update every few minutes
+LISTING_POLICY = CachePolicy(ttl=5 * 60, stale_ttl=60 * 60)
+# Market data changes every few seconds
+MARKET_POLICY = CachePolicy(ttl=5, stale_ttl=60)
+
+
+def cache_key(endpoint_url: str, params: Dict = None) -> Tuple:
+    """Build a hashable cache key from an endpoint URL & query parameters.
+
+    :param endpoint_url: str
+        URL API string.
+    :param params: dict
+        Dictionary of query parameters.
+    :return Tuple cache key
+    """
+    if not params:
+        return (endpoint_url,)
+    return (endpoint_url, tuple(sorted((str(k), str(v)) for k, v in params.items())))
+
+
+def backend_key(key: Hashable) -> str:
+    """String form of a cache key stored in a CacheBackend, stable across processes
+
+    :param key: Hashable
+        Cache key, i.e. built by cache_key
+    :return str
+    """
+    return json.dumps(key, default=str)
+
+
+class ResponseCache:
+    """This class is a store of decoded API responses that serves entries according
+    to a CachePolicy & revalidates stale entries in the background. Entries are kept
+    in a CacheBackend, in-process memory by default, or SQLite/Redis so several
+    processes or nodes share one cache. A lock per key lets a single caller fetch a
+    missing key while other callers, in any process sharing the backend, wait for it.
+
+    Cached responses are shared between callers and must be treated as read-only.
+
+    Parameters
+    ----------
+       backend: CacheBackend
+           Storage of the entries. Default is a new MemoryBackend.
+       lock_timeout: float
+           Seconds to wait for another caller fetching the same key before fetching
+           it anyway, also the time to live of the lock. Default is 30.
+    """
+
+    def __init__(self, backend: CacheBackend = None, lock_timeout: float = 30.0):
+        self.backend = backend if backend is not None else MemoryBackend()
+        self.lock_timeout = lock_timeout
+        self._refreshing = set()
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable, policy: CachePolicy,
+            fetch: Callable[[], Any]) -> Any:
+        """Return the cached value for key, fetching it if missing or expired.
+
+        A stale value within policy.stale_ttl is returned right away and a
+        background refresh is started.
+
+        :param key: Hashable
+            Cache key
+        :param policy: CachePolicy
+            Policy for this entry
+        :param fetch: Callable
+            Function retrieving a fresh value
+        :return Cached or fresh value
+        """
+        name = backend_key(key)
+        entry = self.backend.get(name)
+        if entry is not None:
+            stored_at, value = entry
+            age = time.time() - stored_at
+            if age <= policy.ttl:
+                return value
+            if age <= policy.ttl + policy.stale_ttl:
+                self._revalidate(name, policy, fetch)
+                return value
+
+        with self.backend.lock(name, ttl=self.lock_timeout, timeout=self.lock_timeout):
+            # Another caller may have fetched the key while this one waited for the lock
+            entry = self.backend.get(name)
+            if entry is not None and time.time() - entry[0] <= policy.ttl:
+                return entry[1]
+            value = fetch()
+            self._store(name, value, policy)
+        return value
+
+    def set(self, key: Hashable, value: Any) -> None:
+        """Store a value for key
+
+        :param key: Hashable
+            Cache key
+        :param value: Any
+            Value to store
+        """
+        self._store(backend_key(key), value)
+
+    def delete(self, key: Hashable) -> None:
+        """Remove key from the cache
+
+        :param key: Hashable
+            Cache key
+        """
+        self.backend.delete(backend_key(key))
+
+    def clear(self) -> None:
+        """Remove every entry from the cache"""
+        self.backend.clear()
+
+    def _store(self, name: str, value: Any, policy: CachePolicy = None) -> None:
+        """Store an entry until it can no longer be served under policy"""
+        ttl = None if policy is None else policy.ttl + policy.stale_ttl
+        self.backend.set(name, (time.time(), value), ttl=ttl)
+
+    def _revalidate(self, name: str, policy: CachePolicy, fetch: Callable[[], Any]) -> None:
+        """Refresh key on a background thread unless a refresh is already running in
+        this process or in another one sharing the backend"""
+        with self._lock:
+            if name in self._refreshing:
+                return
+            self._refreshing.add(name)
+
+        def refresh():
+            try:
+                with self.backend.lock(name, ttl=self.lock_timeout, timeout=0) as acquired:
+                    if acquired:
+                        self._store(name, fetch(), policy)
+            except Exception as e:  # pylint: disable=broad-except
+                logging.warning('Background refresh failed for %s: %s', name, e)
+            finally:
+                with self._lock:
+                    self._refreshing.discard(name)
+
+        threading.Thread(target=refresh, daemon=True).start()
+
+
+def resolve_cache_policies(defaults: Dict[str, CachePolicy], use_cache: bool,
+                           overrides: Dict[str, Union[CachePolicy, None]] = None) -> Dict:
+    """Combine default per method policies with user overrides.
+
+    :param defaults: dict
+        Default cache policies keyed by method name
+    :param use_cache: bool
+        Enable default policies
+    :param overrides: dict
+        Cache policies keyed by method name, None disables caching for a method
+    :return Dictionary of cache policies keyed by method name
+    """
+    policies = dict(defaults) if use_cache else {}
+    if overrides:
+        policies.update(overrides)
+    return {method: policy for method, policy in policies.items() if policy is not None}
@@ -0,0 +1,350 @@
+"""This module is dedicated to the storage backends of the response cache. Besides
+the default in-process memory backend, SQLite & Redis backends let every process
+on a node, or every node of a fleet, share one response cache."""
+
+import json
+import math
+import sqlite3
+import threading
+import time
+import uuid
+from abc import ABC, abstractmethod
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, Tuple
+
+
+class CacheBackend(ABC):
+    """This class is the interface of response cache storage. Backends store values
+    under string keys with an optional time to live & provide locks with a time to
+    live, so one process fetches a cold key while the others wait for its result.
+
+    Subclasses implement get, set, ttl, delete, clear, _try_lock & release_lock,
+    a backend missing one of them can't be instantiated.
+
+    Parameters
+    ----------
+       clock: Callable
+           Function returning the current unix time. Default is time.time.
+    """
+
+    def __init__(self, clock: Callable[[], float] = time.time):
+        self.clock = clock
+
+    @abstractmethod
+    def get(self, key: str) -> Any:
+        """Stored value of key, None if it is missing or expired
+
+        :param key: str
+            Cache key
+        """
+
+    @abstractmethod
+    def set(self, key: str, value: Any, ttl: float = None) -> None:
+        """Store a value
+
+        :param key: str
+            Cache key
+        :param value: Any
+            Value to store, shared backends require JSON serializable values
+        :param ttl: float
+            Optional seconds until the value expires
+        """
+
+    @abstractmethod
+    def ttl(self, key: str) -> float:
+        """Seconds until key expires, math.inf if it doesn't expire & None if it is missing
+
+        :param key: str
+            Cache key
+        """
+
+    @abstractmethod
+    def delete(self, key: str) -> None:
+        """Remove key
+
+        :param key: str
+            Cache key
+        """
+
+    @abstractmethod
+    def clear(self) -> None:
+        """Remove every key"""
+
+    @abstractmethod
+    def _try_lock(self, key: str, token: str, ttl: float) -> bool:
+        """Take the lock of key for token unless another token holds it"""
+
+    @abstractmethod
+    def release_lock(self, key: str, token: str) -> None:
+        """Release the lock of key if token still holds it
+
+        :param key: str
+            Cache key
+        :param token: str
+            Token returned by acquire_lock
+        """
+
+    def acquire_lock(self, key: str, ttl: float = 30.0, timeout: float = 30.0) -> str:
+        """Take the lock of key, waiting up to timeout seconds for its holder
+
+        :param key: str
+            Cache key
+        :param ttl: float
+            Seconds until the lock is released if its holder never releases it
+        :param timeout: float
+            Seconds to wait for the lock, 0 to give up right away
+        :return: Token to release the lock with, None if the lock wasn't acquired
+        """
+        token = uuid.uuid4().hex
+        deadline = time.monotonic() + timeout
+        delay = 0.005
+        while True:
+            if self._try_lock(key, token, ttl):
+                return token
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return None
+            time.sleep(min(delay, remaining))
+            delay = min(delay * 2, 0.25)
+
+    @contextmanager
+    def lock(self, key: str, ttl: float = 30.0, timeout: float = 30.0) -> Iterator[bool]:
+        """Context manager holding the lock of key, see acquire_lock
+
+        :return: True if the lock was acquired, False if timeout passed first
+        """
+        token = self.acquire_lock(key, ttl=ttl, timeout=timeout)
+        try:
+            yield token is not None
+        finally:
+            if token is not None:
+                self.release_lock(key, token)
+
+
+class MemoryBackend(CacheBackend):
+    """This class stores values in the memory of one process. Values aren't copied,
+    so cached responses are shared between callers & must be treated as read-only.
+
+    Parameters
+    ----------
+       clock: Callable
+           Function returning the current unix time. Default is time.time.
+    """
+
+    def __init__(self, clock: Callable[[], float] = time.time):
+        super().__init__(clock)
+        self._entries: Dict[str, Tuple[float, Any]] = {}
+        self._locks: Dict[str, Tuple[str, float]] = {}
+        self._lock = threading.Lock()
+
+    def _expires(self, ttl: float) -> float:
+        return math.inf if ttl is None else self.clock() + ttl
+
+    def get(self, key: str) -> Any:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry[0] <= self.clock():
+                del self._entries[key]
+                return None
+            return entry[1]
+
+    def set(self, key: str, value: Any, ttl: float = None) -> None:
+        with self._lock:
+            self._entries[key] = (self._expires(ttl), value)
+
+    def ttl(self, key: str) -> float:
+        with self._lock:
+            entry = self._entries.get(key)
+        if entry is None or entry[0] <= self.clock():
+            return None
+        return entry[0] - self.clock()
+
+    def delete(self, key: str) -> None:
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def _try_lock(self, key: str, token: str, ttl: float) -> bool:
+        with self._lock:
+            holder = self._locks.get(key)
+            if holder is not None and holder[1] > self.clock():
+                return False
+            self._locks[key] = (token, self._expires(ttl))
+            return True
+
+    def release_lock(self, key: str, token: str) -> None:
+        with self._lock:
+            if self._locks.get(key, (None,))[0] == token:
+                del self._locks[key]
+
+
+class SQLiteBackend(CacheBackend):
+    """This class stores values in a SQLite file shared by the processes of a node.
+    Values are serialized, JSON by default.
+
+    Parameters
+    ----------
+       path: str
+           Path to the SQLite file, created if missing
+       serializer: module
+           Object with dumps & loads functions. Default is json.
+       clock: Callable
+           Function returning the current unix time. Default is time.time.
+    """
+
+    def __init__(self, path: str, serializer=json, clock: Callable[[], float] = time.time):
+        super().__init__(clock)
+        self.path = path
+        self.serializer = serializer
+        with self._transaction() as conn:
+            conn.execute('CREATE TABLE IF NOT EXISTS cache_entries '
+                         '(key TEXT PRIMARY KEY, value BLOB NOT NULL, expires REAL)')
+            conn.execute('CREATE TABLE IF NOT EXISTS cache_locks '
+                         '(key TEXT PRIMARY KEY, token TEXT NOT NULL, expires REAL NOT NULL)')
+
+    @contextmanager
+    def _transaction(self) -> Iterator[sqlite3.Connection]:
+        """Connection holding the write lock until the block exits"""
+        conn = sqlite3.connect(self.path, timeout=60, isolation_level=None)
+        try:
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('BEGIN IMMEDIATE')
+            try:
+                yield conn
+            except BaseException:
+                conn.execute('ROLLBACK')
+                raise
+            conn.execute('COMMIT')
+        finally:
+            conn.close()
+
+    def _row(self, key: str) -> Tuple:
+        conn = sqlite3.connect(self.path, timeout=60)
+        try:
+            row = conn.execute('SELECT value, expires FROM cache_entries WHERE key = ?',
+                               (key,)).fetchone()
+        finally:
+            conn.close()
+        if row is None or (row[1] is not None and row[1] <= self.clock()):
+            return None
+        return row
+
+    def get(self, key: str) -> Any:
+        row = self._row(key)
+        return None if row is None else self.serializer.loads(row[0])
+
+    def set(self, key: str, value: Any, ttl: float = None) -> None:
+        now = self.clock()
+        expires = None if ttl is None else now + ttl
+        with self._transaction() as conn:
+            conn.execute('INSERT OR REPLACE INTO cache_entries (key, value, expires) '
+                         'VALUES (?, ?, ?)', (key, self.serializer.dumps(value), expires))
+            conn.execute('DELETE FROM cache_entries WHERE expires <= ?', (now,))
+
+    def ttl(self, key: str) -> float:
+        row = self._row(key)
+        if row is None:
+            return None
+        return math.inf if row[1] is None else row[1] - self.clock()
+
+    def delete(self, key: str) -> None:
+        with self._transaction() as conn:
+            conn.execute('DELETE FROM cache_entries WHERE key = ?', (key,))
+
+    def clear(self) -> None:
+        with self._transaction() as conn:
+            conn.execute('DELETE FROM cache_entries')
+
+    def _try_lock(self, key: str, token: str, ttl: float) -> bool:
+        now = self.clock()
+        with self._transaction() as conn:
+            conn.execute('DELETE FROM cache_locks WHERE key = ? AND expires <= ?', (key, now))
+            return conn.execute('INSERT OR IGNORE INTO cache_locks (key, token, expires) '
+                                'VALUES (?, ?, ?)', (key, token, now + ttl)).rowcount == 1
+
+    def release_lock(self, key: str, token: str) -> None:
+        with self._transaction() as conn:
+            conn.execute('DELETE FROM cache_locks WHERE key = ? AND token = ?', (key, token))
+
+
+# Deletes a lock only if it is still held by the releasing token
+RELEASE_LOCK_SCRIPT = """
+if redis.call("get", KEYS[1]) == ARGV[1] then
+    return redis.call("del", KEYS[1])
+end
+return 0
+"""
+
+
+class RedisBackend(CacheBackend):
+    """This class stores values in Redis so a fleet of nodes shares one response cache.
+    Values are serialized, JSON by default, & expire with Redis key expiry. Locks use
+    SET NX PX & are released with a script that checks the holder's token.
+
+    Requires the redis package unless a client is passed in.
+
+    Parameters
+    ----------
+       client: redis.Redis
+           Optional Redis client, or any object with the get, set, pttl, delete,
+           scan_iter & eval methods of one (i.e. a local stand-in in tests)
+       url: str
+           Redis URL used when no client is given. Default is redis://localhost:6379/0.
+       prefix: str
+           Prefix of every key written by the backend. Default is messari:
+       serializer: module
+           Object with dumps & loads functions. Default is json.
+    """
+
+    def __init__(self, client=None, url: str = 'redis://localhost:6379/0',
+                 prefix: str = 'messari:', serializer=json):
+        super().__init__()
+        if client is None:
+            try:
+                import redis  # pylint: disable=import-outside-toplevel
+            except ImportError as e:
+                raise ImportError('The Redis cache backend requires redis, '
+                                  'install it with pip install redis') from e
+            client = redis.Redis.from_url(url)
+        self.client = client
+        self.prefix = prefix
+        self.serializer = serializer
+
+    def get(self, key: str) -> Any:
+        data = self.client.get(self.prefix + key)
+        return None if data is None else self.serializer.loads(data)
+
+    def set(self, key: str, value: Any, ttl: float = None) -> None:
+        data = self.serializer.dumps(value)
+        if ttl is None:
+            self.client.set(self.prefix + key, data)
+        elif ttl > 0:
+            self.client.set(self.prefix + key, data, px=max(1, int(ttl * 1000)))
+        else:
+            self.client.delete(self.prefix + key)
+
+    def ttl(self, key: str) -> float:
+        milliseconds = self.client.pttl(self.prefix + key)
+        if milliseconds == -2:
+            return None
+        return math.inf if milliseconds == -1 else milliseconds / 1000
+
+    def delete(self, key: str) -> None:
+        self.client.delete(self.prefix + key)
+
+    def clear(self) -> None:
+        keys = list(self.client.scan_iter(match=f'{self.prefix}*'))
+        if keys:
+            self.client.delete(*keys)
+
+    def _try_lock(self, key: str, token: str, ttl: float) -> bool:
+        return bool(self.client.set(f'{self.prefix}lock:{key}', token, nx=True,
+                                    px=max(1, int(ttl * 1000))))
+
+    def release_lock(self, key: str, token: str) -> None:
+        self.client.eval(RELEASE_LOCK_SCRIPT, 1, f'{self.prefix}lock:{key}', token)
@@ -1,8 +1,19 @@
 """This module is meant to contain the DataLoader class"""
 
+from __future__ import annotations
 
-from typing import List, Union, Dict
-import requests
+
+from typing import Callable, List, Union, Dict, Tuple
+from urllib.parse import urlsplit
+from messari.lazy import pandas as pd
+from messari.lazy import requests
+from messari.cache import CachePolicy, ResponseCache, cache_key
+from messari.cache_backends import CacheBackend
+from messari.frame_cache import ArrowFrameCache
+from messari.key_pool import ApiKeyPool
+from messari.latency import DEFAULT_TIMEOUT, HedgePolicy, remaining_time, request_timeout
+from messari.priority import RequestScheduler, current_priority
+from messari.taxonomy import Taxonomy, get_taxonomy
 from messari.utils import validate_input
 
 
@@ -10,13 +21,43 @@ class DataLoader:
     """This class is meant to represent a base wrapper around
     a variety of different API's used as data sources
     """
-    def __init__(self, api_dict: Dict, taxonomy_dict: Dict):
+    def __init__(self, api_dict: Dict, taxonomy_dict: Union[Dict, Taxonomy, str],
+                 cache_policies: Dict = None, frame_cache: Union[ArrowFrameCache, str] = None,
+                 cache_backend: CacheBackend = None, key_pool: ApiKeyPool = None,
+                 scheduler: RequestScheduler = None,
+                 timeout: Union[float, Tuple[float, float]] = DEFAULT_TIMEOUT,
+                 hedging: HedgePolicy = None, base_url_overrides: Dict[str, str] = None):
         self.api_dict = api_dict
-        self.taxonomy_dict = taxonomy_dict
-        self.session = requests.Session()
+        # Mapping filenames are resolved to the shared taxonomy on first translate
+        self._taxonomy_source = taxonomy_dict
+        self._taxonomy = None
+        self.cache_policies = dict(cache_policies or {})
+        self.cache = ResponseCache(cache_backend)
+        # A directory path is opened as a frame cache shared with other processes
+        self.frame_cache = ArrowFrameCache(frame_cache) if isinstance(frame_cache, str) \
+            else frame_cache
+        # Requests rotate across the keys of a pool, replacing the key in their headers
+        self.key_pool = key_pool
+        # Requests wait for their turn by priority class within a shared rate budget
+        self.scheduler = scheduler
+        # (connect, read) timeouts, shortened to the deadline set with request_deadline
+        self.timeout = timeout
+        self.hedging = hedging
+        # URL prefixes replaced before sending, i.e. to point a client at a local API stand-in
+        self.base_url_overrides = dict(base_url_overrides or {})
+        self._session = None
 
     def __del__(self):
-        self.session.close()
+        session = getattr(self, '_session', None)
+        if session is not None:
+            session.close()
+
+    @property
+    def session(self) -> requests.Session:
+        """HTTP session shared by every request, created on first use"""
+        if self._session is None:
+            self._session = requests.Session()
+        return self._session
 
     def set_api_dict(self, api_dict: Dict) -> None:
         """Sets a new dictionary to be used as an API key pair
@@ -26,36 +67,214 @@ class DataLoader:
         """
         self.api_dict = api_dict
 
-    def set_taxonomy_dict(self, taxonomy_dict: Dict) -> None:
+    def set_taxonomy_dict(self, taxonomy_dict: Union[Dict, Taxonomy, str]) -> None:
         """Sets a new dictionary to be used for taxonomy translations
 
-        :param taxonomy_dict: Dict
-            New taxonomy dictionary
+        :param taxonomy_dict: Dict, Taxonomy, str
+            New taxonomy dictionary, Taxonomy or packaged mapping filename
+        """
+        self._taxonomy_source = taxonomy_dict
+        self._taxonomy = None
+
+    @property
+    def taxonomy(self) -> Taxonomy:
+        """Taxonomy used for translations, loaded on first use"""
+        if self._taxonomy is None:
+            source = self._taxonomy_source
+            if isinstance(source, Taxonomy):
+                self._taxonomy = source
+            elif isinstance(source, str):
+                self._taxonomy = get_taxonomy(source)
+            else:
+                self._taxonomy = Taxonomy(source)
+        return self._taxonomy
+
+    @property
+    def taxonomy_dict(self) -> Taxonomy:
+        """Read only view of the taxonomy, kept for backwards compatibility"""
+        return self.taxonomy
+
+    def set_cache_policy(self, method_name: str, policy: Union[CachePolicy, None]) -> None:
+        """Sets the cache policy used by a method, None disables caching for it
+
+        :param method_name: str
+            Name of the client method (i.e. get_protocols)
+        :param policy: CachePolicy, None
+            New cache policy
         """
-        self.taxonomy_dict = taxonomy_dict
+        if policy is None:
+            self.cache_policies.pop(method_name, None)
+        else:
+            self.cache_policies[method_name] = policy
 
-    def get_response(self, endpoint_url: str, params: Dict = None, headers: Dict = None) -> Dict:
+    def get_response(self, endpoint_url: str, params: Dict = None, headers: Dict = None,
+                     cache_policy: Union[str, CachePolicy] = None) -> Dict:
         """Gets response from endpoint and checks for HTTP errors when requesting data.
 
         :param endpoint_url: str
             URL API string.
         :param params: dict
             Dictionary of query parameters.
+        :param cache_policy: str, CachePolicy
+            Method name to look up in cache_policies or an explicit CachePolicy.
+            Responses are not cached if no policy applies.
         :return: JSON with requested data
+        :raises SystemError if HTTP error occurs
+        """
+        if isinstance(cache_policy, str):
+            cache_policy = self.cache_policies.get(cache_policy)
+        if cache_policy is None:
+            return self._fetch_response(endpoint_url, params=params, headers=headers)
+        return self.cache.get(cache_key(endpoint_url, params), cache_policy,
+                              lambda: self._fetch_response(endpoint_url, params=params,
+                                                           headers=headers))
+
+    def _fetch_response(self, endpoint_url: str, params: Dict = None,
+                        headers: Dict = None) -> Dict:
+        """Requests endpoint, bypassing the response cache
+
         :raises SystemError if HTTP error occurs
         """
         try:
-            response = self.session.get(endpoint_url, params=params, headers=headers)
+            response = self._send(endpoint_url, params=params, headers=headers)
             response.raise_for_status()
             return response.json()
         except requests.exceptions.HTTPError as e:
             # NOTE if this doesn't work remove 'from e'
             raise SystemError(e) from e
 
+    def _send(self, endpoint_url: str, params: Dict = None, headers: Dict = None,
+              stream: bool = False) -> requests.Response:
+        """Sends a GET request once the scheduler admits it, through the next available
+        key of the key pool if any. A request throttled with 429 is retried on another
+        key while untried keys remain.
+
+        :raises SystemError if the request times out or the deadline passes
+        """
+        attempts = len(self.key_pool) if self.key_pool is not None else 1
+        for attempt in range(attempts):
+            self._admit()
+            response = self._get(endpoint_url, params, headers, stream)
+            if response.status_code != 429 or attempt == attempts - 1:
+                return response
+            response.close()
+        return response
+
+    def _admit(self, priority: str = None) -> None:
+        """Waits for the scheduler to admit a request of priority, by default the
+        current thread's"""
+        if self.scheduler is not None:
+            self.scheduler.admit(priority=priority, timeout=remaining_time())
+
+    def _get(self, endpoint_url: str, params: Dict, headers: Dict,
+             stream: bool) -> requests.Response:
+        """Sends one GET with timeouts bounded by the current deadline, hedged when a
+        hedging policy is set. A hedge is admitted by the scheduler & takes its own key
+        of the key pool like any other request. Streamed requests aren't hedged."""
+        endpoint_url = self._resolve_url(endpoint_url)
+
+        def send() -> requests.Response:
+            if self.key_pool is None:
+                return self.session.get(endpoint_url, params=params, headers=headers,
+                                        stream=stream, timeout=request_timeout(self.timeout))
+            state = self.key_pool.acquire(timeout=remaining_time())
+            try:
+                response = self.session.get(endpoint_url, params=params,
+                                            headers=self.key_pool.headers(state, headers),
+                                            stream=stream, timeout=request_timeout(self.timeout))
+                self.key_pool.update(state, response.status_code, response.headers)
+            finally:
+                self.key_pool.release(state)
+            return response
+
+        # Hedges run in worker threads, which don't share the caller's priority
+        priority = current_priority()
+
+        def hedge() -> requests.Response:
+            self._admit(priority)
+            return send()
+
+        try:
+            if self.hedging is None or stream:
+                return send()
+            return self.hedging.call(send, urlsplit(endpoint_url).netloc, hedge=hedge,
+                                     discard=lambda response: response.close())
+        except requests.exceptions.Timeout as e:
+            raise SystemError(e) from e
+
+    def _resolve_url(self, endpoint_url: str) -> str:
+        """Applies the first matching base URL override to endpoint_url"""
+        for prefix, replacement in self.base_url_overrides.items():
+            if endpoint_url.startswith(prefix):
+                return replacement + endpoint_url[len(prefix):]
+        return endpoint_url
+
+    def get_frame(self, key: Tuple, cache_policy: str,
+                  build: Callable[[], pd.DataFrame]) -> pd.DataFrame:
+        """Gets a DataFrame through the frame cache, or builds it if no frame cache is set
+
+        :param key: tuple
+            Cache key, made of the method name & its normalized arguments
+        :param cache_policy: str
+            Method name to look up in cache_policies, the frame cache's default
+            policy applies if the method has none
+        :param build: Callable
+            Function building the DataFrame
+        :return: pandas DataFrame, read-only when served from the frame cache
+        """
+        if self.frame_cache is None:
+            return build()
+        policy = self.cache_policies.get(cache_policy, self.frame_cache.default_policy)
+        return self.frame_cache.get(key, policy, build)
+
+    def get_content(self, endpoint_url: str, params: Dict = None,
+                    headers: Dict = None) -> bytes:
+        """Gets the undecoded response body from endpoint and checks for HTTP errors,
+        i.e. to decode it in another process. Bypasses the response cache.
+
+        :param endpoint_url: str
+            URL API string.
+        :param params: dict
+            Dictionary of query parameters.
+        :return: bytes of the response body
+        :raises SystemError if HTTP error occurs
+        """
+        try:
+            response = self._send(endpoint_url, params=params, headers=headers)
+            response.raise_for_status()
+            return response.content
+        except requests.exceptions.HTTPError as e:
+            raise SystemError(e) from e
+
+    def get_stream(self, endpoint_url: str, params: Dict = None,
+                   headers: Dict = None) -> requests.Response:
+        """Gets a streamed response from endpoint and checks for HTTP errors, the body
+        is left unread so it can be parsed incrementally from response.raw.
+        Streamed responses bypass the response cache.
+
+        :param endpoint_url: str
+            URL API string.
+        :param params: dict
+            Dictionary of query parameters.
+        :return: requests.Response, use as a context manager to release the connection
+        :raises SystemError if HTTP error occurs
+        """
+        response = self._send(endpoint_url, params=params, headers=headers, stream=True)
+        try:
+            response.raise_for_status()
+        except requests.exceptions.HTTPError as e:
+            response.close()
+            raise SystemError(e) from e
+        response.raw.decode_content = True
+        return response
+
     def translate(self, input_slugs: Union[str, List]) -> Union[List, None]:
         """Wrapper around messari.utils.validate_input,
         validate input & check if it's supported by DeFi Llama
 
+        Slugs are translated as one batch, exact matches first then case insensitive.
+        Slugs missing from the taxonomy are returned unchanged.
+
         Parameters
         ----------
            input_slugs: str, list
@@ -67,11 +286,4 @@ class DataLoader:
                list of validated & translated slugs
         """
         slugs = validate_input(input_slugs)
-
-        translated_slugs = []
-        for slug in slugs:
-            if slug in self.taxonomy_dict.keys():
-                translated_slugs.append(self.taxonomy_dict[slug])
-            else:
-                translated_slugs.append(slug)
-        return translated_slugs
+        return self.taxonomy.translate(slugs)
@@ -1,4 +1,22 @@
 """Module to handle initialization, imports, for DeFiLlama class"""
 
+# Names in __all__ are resolved by the module level __getattr__ (PEP 562)
+# pylint: disable=undefined-all-variable,invalid-name
 
-from .defillama import *
+import importlib
+
+__all__ = ['DeFiLlama']
+
+
+def __getattr__(name: str):
+    # Import the client module on first use so importing the package stays cheap,
+    # any public name of it is still reachable from the package
+    if not name.startswith('_'):
+        module = importlib.import_module('.defillama', __name__)
+        if hasattr(module, name):
+            return getattr(module, name)
+    raise AttributeError(f'module {__name__!r} has no attribute {name!r}')
+
+
+def __dir__():
+    return sorted(list(globals()) + __all__)
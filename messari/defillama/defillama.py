@@ -1,16 +1,30 @@
 """This module is meant to contain the DeFiLlama class"""
 
+from __future__ import annotations
+
 # Global imports
 import datetime
+import logging
 from string import Template
-from typing import Union, List, Dict
+from typing import Union, List, Dict, Tuple
 
-import pandas as pd
+from messari.lazy import pandas as pd
 
+from messari.cache import CachePolicy, STATIC_POLICY, TIMESERIES_POLICY, LISTING_POLICY, \
+    resolve_cache_policies
+from messari.cache_backends import CacheBackend
 from messari.dataloader import DataLoader
+from messari.frame_cache import ArrowFrameCache
+from messari.latency import DEFAULT_TIMEOUT, HedgePolicy
+from messari.parallel import get_process_pool
+from messari.priority import RequestScheduler
 # Local imports
-from messari.utils import validate_input, get_taxonomy_dict, time_filter_df
-from .helpers import format_df
+from messari.taxonomy import DL_TAXONOMY_FILENAME
+from messari.utils import validate_input
+from .helpers import format_df, parse_protocol_tvl, parse_protocol_content, align_blocks, \
+    days_to_index, day_window, window_entries
+from .stream_parser import parse_protocol_stream
+from .protocols import ProtocolIndex, protocols_to_df
 
 ##########################
 # URL Endpoints
@@ -22,18 +36,67 @@ DL_CHAIN_TVL_URL = Template("https://api.llama.fi/charts/$chain")
 DL_GET_PROTOCOL_TVL_URL = Template("https://api.llama.fi/protocol/$slug")
 DL_CHAINS_URL = "https://api.llama.fi/chains/"
 
+# Default cache policies keyed by method, used when caching is enabled
+DL_CACHE_POLICIES = {
+    "get_protocol_tvl_timeseries": TIMESERIES_POLICY,
+    "get_global_tvl_timeseries": TIMESERIES_POLICY,
+    "get_chain_tvl_timeseries": TIMESERIES_POLICY,
+    "get_current_tvl": LISTING_POLICY,
+    "get_protocols": LISTING_POLICY,
+    "get_chains": STATIC_POLICY,
+}
+
 
 class DeFiLlama(DataLoader):
     """This class is a wrapper around the DeFi Llama API
+
+    Parameters
+    ----------
+       use_cache: bool
+           Cache responses using the default policy of each method. Default is False.
+       cache_policies: dict
+           CachePolicy overrides keyed by method name (i.e. get_protocols)
+       frame_cache: ArrowFrameCache, str
+           Optional Arrow frame cache, or its directory, storing protocol tvl DataFrames
+           where every worker process on a node can memory map them. Requires pyarrow.
+       cache_backend: CacheBackend
+           Optional storage of the response cache, i.e. a SQLiteBackend or RedisBackend
+           shared with other processes or nodes. Default is in-process memory.
+       scheduler: RequestScheduler
+           Optional rate budget shared by the client's requests, admitting them by the
+           priority class set with messari.priority.request_priority
+       timeout: float, tuple
+           Seconds to connect & to wait for response data, a (connect, read) tuple or
+           a float for both. Default is DEFAULT_TIMEOUT. Calls made within
+           messari.latency.request_deadline also stop at the deadline.
+       hedging: HedgePolicy
+           Optional policy duplicating requests slower than a latency percentile
+       base_url_overrides: dict
+           Replacement URL prefixes keyed by the prefix they replace, i.e. to send
+           requests to a local API stand-in
     """
 
-    def __init__(self):
-        messari_to_dl_dict = get_taxonomy_dict("messari_to_dl.json")
-        DataLoader.__init__(self, api_dict=None, taxonomy_dict=messari_to_dl_dict)
+    def __init__(self, use_cache: bool = False, cache_policies: Dict = None,
+                 frame_cache: Union[ArrowFrameCache, str] = None,
+                 cache_backend: CacheBackend = None, scheduler: RequestScheduler = None,
+                 timeout: Union[float, Tuple[float, float]] = DEFAULT_TIMEOUT,
+                 hedging: HedgePolicy = None, base_url_overrides: Dict[str, str] = None):
+        policies = resolve_cache_policies(DL_CACHE_POLICIES, use_cache, cache_policies)
+        # The shared taxonomy is only loaded the first time a slug is translated
+        DataLoader.__init__(self, api_dict=None, taxonomy_dict=DL_TAXONOMY_FILENAME,
+                            cache_policies=policies, frame_cache=frame_cache,
+                            cache_backend=cache_backend, scheduler=scheduler,
+                            timeout=timeout, hedging=hedging,
+                            base_url_overrides=base_url_overrides)
+        self._protocol_index = None
 
     def get_protocol_tvl_timeseries(self, asset_slugs: Union[str, List],
                                     start_date: Union[str, datetime.datetime] = None,
-                                    end_date: Union[str, datetime.datetime] = None) -> pd.DataFrame:
+                                    end_date: Union[str, datetime.datetime] = None,
+                                    chains: Union[str, List] = None, include_native: bool = True,
+                                    include_usd: bool = True, top_n_tokens: int = None,
+                                    stream: bool = False,
+                                    processes: Union[int, bool] = None) -> pd.DataFrame:
         """Returns times TVL of a protocol with token amounts as a pandas DataFrame.
         Returned DataFrame is indexed by df[protocol][chain][asset].
 
@@ -48,6 +111,33 @@ class DeFiLlama(DataLoader):
            end_date: str, datetime.datetime
                Optional end date to set filter for tvl timeseries ("YYYY-MM-DD")
 
+           chains: str, list
+               Optional chain or list of chains to return (i.e. Ethereum), use 'all'
+               for the total across chains. Other chains are not parsed. Default is every chain.
+               Names are case-insensitive; a protocol with none of the chains has no columns.
+
+           include_native: bool
+               Include token amounts in native units. Default is True.
+
+           include_usd: bool
+               Include token amounts in USD (asset='tokenName_usd'). Default is True.
+
+           top_n_tokens: int
+               Only include the top_n_tokens tokens of each chain by latest USD value.
+               Default is every token.
+
+           stream: bool
+               Parse responses incrementally while they download instead of decoding
+               the full JSON first, keeping peak memory close to the size of the
+               returned DataFrame. Requires ijson & bypasses the response cache.
+               Default is False.
+
+           processes: int, bool
+               Optional number of worker processes (True for one per CPU) decoding &
+               parsing each protocol while the next one downloads, so many protocols
+               are parsed on every core. Bypasses the response cache & can't be
+               combined with stream.
+
         Returns
         -------
            DataFrame
@@ -55,103 +145,57 @@ class DeFiLlama(DataLoader):
                to look at total tvl across all chains, index with chain='all'
                to look at total tvl across all tokens of a chain, asset='totalLiquidityUSD'
                tokens can be indexed by asset='tokenName' or by asset='tokenName_usd'
+               DataFrames served from the client's frame cache are read-only
         """
+        if stream and processes:
+            raise ValueError("stream & processes can't be combined")
         slugs = self.translate(asset_slugs)
-
-        slug_df_list: List = []
+        if chains is not None:
+            chains = validate_input(chains)
+        # Entries outside the date range are dropped before they are parsed
+        window = day_window(start_date, end_date)
+        options = {"chains": chains, "include_native": include_native,
+                   "include_usd": include_usd, "top_n_tokens": top_n_tokens, "window": window}
+
+        key = ("get_protocol_tvl_timeseries", tuple(slugs), window,
+               tuple(chains) if chains is not None else None, include_native, include_usd,
+               top_n_tokens)
+        return self.get_frame(key, "get_protocol_tvl_timeseries",
+                              lambda: self._get_protocol_tvl_df(slugs, options, stream, processes))
+
+    def _get_protocol_tvl_df(self, slugs: List[str], options: Dict, stream: bool,
+                             processes: Union[int, bool]) -> pd.DataFrame:
+        """Build the DataFrame returned by get_protocol_tvl_timeseries"""
+        pool = get_process_pool(processes) if processes else None
+        slug_results = []
         for slug in slugs:
             endpoint_url = DL_GET_PROTOCOL_TVL_URL.substitute(slug=slug)
-            protocol = self.get_response(endpoint_url)
-
-            ###########################
-            # This portion is basically grabbing tvl metrics on a per chain basis
-
-            # TODO this is gonna be difficult
-            chain_tvls = protocol["chainTvls"]
-            chains = protocol["chains"]
-            chain_list = []
-            chain_df_list = []
-            for chain in chains:
-                chain_list.append(chain)
-
-                # get timeseries
-                chain_tvl = chain_tvls[chain]["tvl"]
-                chain_tvl_tokens = chain_tvls[chain]["tokens"]
-                chain_tvl_tokens_usd = chain_tvls[chain]["tokensInUsd"]
-
-                # convert tokens & tokensInUsd
-                for token in chain_tvl_tokens:
-                    for key, value in token["tokens"].items():
-                        token[key] = value
-                    token.pop("tokens", None)
-
-                for token in chain_tvl_tokens_usd:
-                    for key, value in token["tokens"].items():
-                        token[key] = value
-                    token.pop("tokens", None)
-
-                # convert to df
-                chain_tvl_df = pd.DataFrame(chain_tvl)
-                chain_tvl_tokens_df = pd.DataFrame(chain_tvl_tokens)
-                chain_tvl_tokens_usd_df = pd.DataFrame(chain_tvl_tokens_usd)
-
-                # fix indexes
-                chain_tvl_df = format_df(chain_tvl_df)
-                chain_tvl_tokens_df = format_df(chain_tvl_tokens_df)
-                chain_tvl_tokens_usd_df = format_df(chain_tvl_tokens_usd_df)
-                chain_tvl_tokens_usd_df = chain_tvl_tokens_usd_df.add_suffix("_usd")
-
-                # concat tokens and tokensInUsd
-                joint_tokens_df = pd.concat([chain_tvl_tokens_df, chain_tvl_tokens_usd_df], axis=1)
-                # Join total chain TVL w/ token TVL
-                chain_df = chain_tvl_df.join(joint_tokens_df)
-                chain_df_list.append(chain_df)
-
-            ###########################
-            # This portion is basically grabbing tvl metrics for all chains combined
-
-            ######################################
-            # Get protocol token balances
-
-            ## tokens in native amount
-            tokens = protocol["tokens"]
-            for token in tokens:
-                for key, value in token["tokens"].items():
-                    token[key] = value
-                token.pop("tokens", None)
-            tokens_df = pd.DataFrame(tokens)
-            tokens_df = format_df(tokens_df)
-
-            ## tokens in USD
-            tokens_usd = protocol["tokensInUsd"]
-            for token in tokens_usd:
-                for key, value in token["tokens"].items():
-                    token[key] = value
-                token.pop("tokens", None)
-            tokens_usd_df = pd.DataFrame(tokens_usd)
-            tokens_usd_df = format_df(tokens_usd_df)
-            tokens_usd_df = tokens_usd_df.add_suffix("_usd")
-
-            # Get total tvl across chains
-            tvl = protocol["tvl"]
-            total_tvl_df = pd.DataFrame(tvl)
-            total_tvl_df = format_df(total_tvl_df)
-
-            # Working
-            joint_tokens_df = pd.concat([tokens_df, tokens_usd_df], axis=1)
-            total_df = total_tvl_df.join(joint_tokens_df)
-
-            # Now create multi index
-            chain_list.append("all")
-            chain_df_list.append(total_df)
-
-            slug_df = pd.concat(chain_df_list, keys=chain_list, axis=1)
-            slug_df_list.append(slug_df)
-
-        total_slugs_df = pd.concat(slug_df_list, keys=slugs, axis=1)
-        total_slugs_df.sort_index(inplace=True)
-
-        total_slugs_df = time_filter_df(total_slugs_df, start_date=start_date, end_date=end_date)
+            if stream:
+                with self.get_stream(endpoint_url) as response:
+                    result = parse_protocol_stream(response.raw, **options)
+            elif pool is not None:
+                # A worker decodes & parses the response while the next one downloads
+                result = pool.submit(parse_protocol_content, self.get_content(endpoint_url),
+                                     **options)
+            else:
+                protocol = self.get_response(endpoint_url,
+                                             cache_policy="get_protocol_tvl_timeseries")
+                # Parse every chain's tvl/tokens/tokensInUsd arrays into aligned NumPy blocks
+                result = parse_protocol_tvl(protocol, **options)
+            slug_results.append((slug, result))
+
+        slug_blocks = []
+        for slug, result in slug_results:
+            days, columns, values = result.result() if pool is not None else result
+            if not columns:
+                logging.warning("%s has none of the chains %s", slug, options["chains"])
+            slug_blocks.append((days, [(slug, *column) for column in columns], values))
+
+        days, columns, values = align_blocks(slug_blocks)
+        # Keep the (slug, chain, asset) levels even when no chain matched
+        column_index = pd.MultiIndex.from_tuples(columns) if columns \
+            else pd.MultiIndex.from_arrays([[], [], []])
+        total_slugs_df = pd.DataFrame(values, index=days_to_index(days), columns=column_index)
         return total_slugs_df
 
     def get_global_tvl_timeseries(self, start_date: Union[str, datetime.datetime] = None,
@@ -171,10 +215,10 @@ class DeFiLlama(DataLoader):
            DataFrame
                DataFrame containing timeseries tvl data for every protocol
         """
-        global_tvl = self.get_response(DL_GLOBAL_TVL_URL)
+        global_tvl = self.get_response(DL_GLOBAL_TVL_URL, cache_policy="get_global_tvl_timeseries")
+        global_tvl = window_entries(global_tvl, day_window(start_date, end_date))
         global_tvl_df = pd.DataFrame(global_tvl)
-        global_tvl_df = format_df(global_tvl_df)
-        global_tvl_df = time_filter_df(global_tvl_df, start_date=start_date, end_date=end_date)
+        global_tvl_df = format_df(global_tvl_df).sort_index()
         return global_tvl_df
 
     def get_chain_tvl_timeseries(self, chains_in: Union[str, List],
@@ -199,27 +243,29 @@ class DeFiLlama(DataLoader):
                DataFrame containing timeseries tvl data for each chain
         """
         chains = validate_input(chains_in)
+        window = day_window(start_date, end_date)
 
         chain_df_list = []
         for chain in chains:
             endpoint_url = DL_CHAIN_TVL_URL.substitute(chain=chain)
-            response = self.get_response(endpoint_url)
-            chain_df = pd.DataFrame(response)
+            response = self.get_response(endpoint_url, cache_policy="get_chain_tvl_timeseries")
+            chain_df = pd.DataFrame(window_entries(response, window))
             chain_df = format_df(chain_df)
             chain_df_list.append(chain_df)
 
         # Join DataFrames from each chain & return
-        chains_df = pd.concat(chain_df_list, axis=1)
+        chains_df = pd.concat(chain_df_list, axis=1, keys=chains, sort=True)
 
         # If chains_df is empty, return an empty DataFrame
         if chains_df.empty:
             return pd.DataFrame()
 
-        chains_df.columns = chains
-        chains_df = time_filter_df(chains_df, start_date=start_date, end_date=end_date)
+        # Chains without entries in the window are kept as NaN columns
+        chains_df.columns = chains_df.columns.get_level_values(0)
+        chains_df = chains_df.reindex(columns=chains).sort_index()
         return chains_df
 
-    def get_current_tvl(self, asset_slugs: Union[str, List]) -> Dict:
+    def get_current_tvl(self, asset_slugs: Union[str, List], bulk: bool = False) -> pd.DataFrame:
         """Retrive current protocol tvl for an asset
 
         Parameters
@@ -227,24 +273,48 @@ class DeFiLlama(DataLoader):
            asset_slugs: str, list
                Single asset slug string or list of asset slugs (i.e. bitcoin)
 
+           bulk: bool
+               Read every slug's tvl from one /protocols snapshot, cached with the
+               get_protocols policy (listing policy when caching is disabled), and only
+               request slugs missing from it individually. Default is False.
+
         Returns
         -------
            DataFrame
-               Pandas Series for tvl indexed by each slug {slug: tvl, ...}
+               pandas DataFrame with a tvl column indexed by slug, slugs that failed are
+               left out & their error messages are kept in df.attrs['errors'] {slug: message}
         """
         slugs = validate_input(asset_slugs)
 
-        tvl_dict = {}
-        for slug in slugs:
+        tvl_dict, errors = {}, {}
+        remaining = slugs
+        if bulk:
+            policy = self.cache_policies.get("get_protocols", LISTING_POLICY)
+            protocols_df = self._get_protocol_index(policy).df
+            if "tvl" in protocols_df.columns:
+                snapshot = protocols_df["tvl"].dropna()
+                tvl_dict = {slug: float(snapshot[slug]) for slug in slugs if slug in snapshot.index}
+            remaining = [slug for slug in slugs if slug not in tvl_dict]
+
+        for slug in remaining:
             endpoint_url = DL_CURRENT_PROTOCOL_TVL_URL.substitute(slug=slug)
-            tvl = self.get_response(endpoint_url)
-            if isinstance(tvl, float):
-                tvl_dict[slug] = tvl
+            try:
+                tvl = self.get_response(endpoint_url, cache_policy="get_current_tvl")
+            except SystemError as e:
+                errors[slug] = str(e)
+                continue
+            if isinstance(tvl, (int, float)) and not isinstance(tvl, bool):
+                tvl_dict[slug] = float(tvl)
             else:
-                print(f"ERROR: slug={slug}, MESSAGE: {tvl['message']}")
+                errors[slug] = tvl.get("message", str(tvl)) if isinstance(tvl, dict) else str(tvl)
 
-        tvl_series = pd.Series(tvl_dict)
+        for slug, message in errors.items():
+            logging.warning("Could not get current tvl for slug=%s: %s", slug, message)
+
+        tvl_series = pd.Series({slug: tvl_dict[slug] for slug in slugs if slug in tvl_dict},
+                               dtype=float)
         tvl_df = tvl_series.to_frame("tvl")
+        tvl_df.attrs["errors"] = errors
         return tvl_df
 
     def get_protocols(self) -> pd.DataFrame:
@@ -254,16 +324,29 @@ class DeFiLlama(DataLoader):
         Returns
         -------
         DataFrame
-           DataFrame with one column per DeFi Llama supported protocol
+           DataFrame with one row per DeFi Llama supported protocol, indexed by slug
         """
-        protocols = self.get_response(DL_PROTOCOLS_URL)
+        return self.get_protocol_index().df
+
+    def get_protocol_index(self) -> ProtocolIndex:
+        """Returns the protocols listing with secondary indexes by chain, category & symbol,
+        i.e. get_protocol_index().select(chain="Arbitrum", category="Lending")
 
-        protocol_dict = {}
-        for protocol in protocols:
-            protocol_dict[protocol["slug"]] = protocol
+        The index is rebuilt only when a new /protocols response is fetched.
+
+        Returns
+        -------
+        ProtocolIndex
+           ProtocolIndex over the DataFrame returned by get_protocols
+        """
+        return self._get_protocol_index("get_protocols")
 
-        protocols_df = pd.DataFrame(protocol_dict)
-        return protocols_df
+    def _get_protocol_index(self, cache_policy: Union[str, CachePolicy]) -> ProtocolIndex:
+        """Fetch /protocols with cache_policy, reusing the index built from the same response"""
+        protocols = self.get_response(DL_PROTOCOLS_URL, cache_policy=cache_policy)
+        if self._protocol_index is None or self._protocol_index[0] is not protocols:
+            self._protocol_index = (protocols, ProtocolIndex(protocols_to_df(protocols)))
+        return self._protocol_index[1]
 
     def get_chains(self) -> List[str]:
         """Get the names of all chains supported by Defi Llama
@@ -275,7 +358,7 @@ class DeFiLlama(DataLoader):
         List
             List of chain name strings
         """
-        chains = self.get_response(DL_CHAINS_URL)
+        chains = self.get_response(DL_CHAINS_URL, cache_policy="get_chains")
 
         chain_names = [chain['name'] for chain in chains]
 
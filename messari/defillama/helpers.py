@@ -1,7 +1,16 @@
 """This module is dedicated to helpers for the DeFiLlama class"""
 
+from __future__ import annotations
 
-import pandas as pd
+
+import datetime
+import json
+from typing import Dict, List, Tuple, Union
+
+from messari.lazy import numpy as np
+from messari.lazy import pandas as pd
+
+from messari.utils import validate_datetime
 
 
 def format_df(df_in: pd.DataFrame) -> pd.DataFrame:
@@ -18,12 +27,12 @@ def format_df(df_in: pd.DataFrame) -> pd.DataFrame:
            formated pandas DataFrame
     """
 
-    # set date to index
+    # set date to index, leaving the caller's DataFrame untouched
     df_new = df_in
     if 'date' in df_in.columns:
-        df_new.set_index('date', inplace=True)
-        df_new.index = pd.to_datetime(df_new.index, unit='s', origin='unix')
-        df_new.index = df_new.index.date
+        df_new = df_in.set_index('date')
+        seconds = pd.to_numeric(df_new.index)
+        df_new.index = pd.to_datetime(seconds, unit='s', origin='unix').normalize().rename(None)
 
     # drop duplicates
     # NOTE: sometimes DeFi Llama has duplicate dates, choosing to just keep the last
@@ -31,3 +40,345 @@ def format_df(df_in: pd.DataFrame) -> pd.DataFrame:
     # TODO: Investigate which data should be kept (currently assuming last is more recent
     df_new = df_new[~df_new.index.duplicated(keep='last')]
     return df_new
+
+
+SECONDS_PER_DAY = 86400
+
+
+def day_window(start_date: Union[str, datetime.datetime] = None,
+               end_date: Union[str, datetime.datetime] = None) -> Union[Tuple[int, int], None]:
+    """Convert the start_date/end_date filter of a DeFiLlama method to unix days
+
+    Parameters
+    ----------
+       start_date: str, datetime.datetime
+           Optional start date ("YYYY-MM-DD")
+       end_date: str, datetime.datetime
+           Optional end date ("YYYY-MM-DD")
+
+    Returns
+    -------
+       Tuple
+           inclusive (first day, last day) in unix seconds at midnight,
+           None if neither date is set
+    """
+    if not start_date and not end_date:
+        return None
+    first_day = np.iinfo(np.int64).min
+    last_day = np.iinfo(np.int64).max
+    if start_date:
+        first_day = int(pd.Timestamp(validate_datetime(start_date)).timestamp())
+    if end_date:
+        last_day = int(pd.Timestamp(validate_datetime(end_date)).timestamp())
+    return first_day, last_day
+
+
+def rows_by_day(dates: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Find the last entry for each day of a DeFi Llama timeseries
+
+    Parameters
+    ----------
+       dates: np.ndarray
+           unix timestamps of each entry
+
+    Returns
+    -------
+       Tuple
+           sorted unique days (unix seconds at midnight) & the row each entry maps to,
+           -1 for entries superseded by a later entry on the same day
+    """
+    dates = np.asarray(dates, dtype=np.int64)
+    days = dates - dates % SECONDS_PER_DAY
+    # NOTE: sometimes DeFi Llama has duplicate dates, keep the last entry like format_df
+    unique_days, reversed_first = np.unique(days[::-1], return_index=True)
+    rows = np.full(len(dates), -1, dtype=np.int64)
+    rows[len(dates) - 1 - reversed_first] = np.arange(len(unique_days))
+    return unique_days, rows
+
+
+def _last_per_day(entries: List[Dict]) -> Tuple[np.ndarray, np.ndarray]:
+    """rows_by_day for a list of dictionaries with a unix 'date' key"""
+    return rows_by_day(np.fromiter((int(entry['date']) for entry in entries), dtype=np.int64,
+                                   count=len(entries)))
+
+
+def window_entries(entries: List[Dict], window: Tuple[int, int] = None) -> List[Dict]:
+    """Keep the entries of a DeFi Llama timeseries whose day is inside window,
+    before anything is parsed. Entries are sorted by date, so the window is found
+    with a binary search on the raw timestamps.
+
+    Parameters
+    ----------
+       entries: list
+           list of dictionaries with a unix 'date' key
+       window: tuple
+           inclusive (first day, last day), see day_window
+
+    Returns
+    -------
+       List
+           entries inside window, all entries if window is None
+    """
+    if window is None or not entries:
+        return entries
+    dates = np.fromiter((int(entry['date']) for entry in entries), dtype=np.int64,
+                        count=len(entries))
+    days = dates - dates % SECONDS_PER_DAY
+    if np.all(days[1:] >= days[:-1]):
+        first = np.searchsorted(days, window[0], side='left')
+        last = np.searchsorted(days, window[1], side='right')
+        return entries[first:last]
+    inside = (days >= window[0]) & (days <= window[1])
+    return [entry for entry, keep in zip(entries, inside.tolist()) if keep]
+
+
+def parse_tvl_series(entries: List[Dict]) -> Tuple[np.ndarray, List[str], np.ndarray]:
+    """Parse a DeFi Llama 'tvl' array into a single column block
+
+    Parameters
+    ----------
+       entries: list
+           list of {'date': ..., 'totalLiquidityUSD': ...} dictionaries
+
+    Returns
+    -------
+       Tuple
+           sorted days, ['totalLiquidityUSD'] & (days x 1) values array
+    """
+    days, rows = _last_per_day(entries)
+    kept = rows >= 0
+    tvl = np.array([entry['totalLiquidityUSD'] for entry in entries], dtype=float)
+    values = np.full((len(days), 1), np.nan)
+    values[rows[kept], 0] = tvl[kept]
+    return days, ['totalLiquidityUSD'], values
+
+
+def parse_token_series(entries: List[Dict], suffix: str = '', tokens: List[str] = None) -> \
+        Tuple[np.ndarray, List[str], np.ndarray]:
+    """Parse a DeFi Llama 'tokens' or 'tokensInUsd' array into an aligned block
+    in a single pass, without mutating the decoded JSON
+
+    Parameters
+    ----------
+       entries: list
+           list of {'date': ..., 'tokens': {token: amount, ...}} dictionaries
+       suffix: str
+           suffix appended to every token column name (i.e. '_usd')
+       tokens: list
+           optional tokens to parse, other tokens are skipped
+
+    Returns
+    -------
+       Tuple
+           sorted days, token columns in order of first appearance
+           (or in the order of tokens) & (days x tokens) values
+    """
+    days, rows = _last_per_day(entries)
+    if tokens is not None:
+        kept_entries = [entry for entry, row in zip(entries, rows.tolist()) if row >= 0]
+        ordered_values = np.full((len(days), len(tokens)), np.nan)
+        if tokens and kept_entries:
+            ordered_values[rows[rows >= 0]] = [[entry['tokens'].get(token, np.nan)
+                                                for token in tokens] for entry in kept_entries]
+        return days, [f'{token}{suffix}' for token in tokens], ordered_values
+
+    token_names, amounts, counts = [], [], []
+    for entry in entries:
+        entry_tokens = entry['tokens']
+        token_names.extend(entry_tokens)
+        amounts.extend(entry_tokens.values())
+        counts.append(len(entry_tokens))
+    # factorize keeps first appearance order, matching DataFrame construction from records
+    cell_columns, columns = pd.factorize(np.array(token_names, dtype=object))
+    cell_rows = np.repeat(rows, counts)
+    kept = cell_rows >= 0
+    values = np.full((len(days), len(columns)), np.nan)
+    values[cell_rows[kept], cell_columns[kept]] = np.array(amounts, dtype=float)[kept]
+    return days, [f'{token}{suffix}' for token in columns], values
+
+
+def all_tokens(entries: List[Dict]) -> List[str]:
+    """Names of the tokens of a DeFi Llama 'tokens' or 'tokensInUsd' array
+
+    Parameters
+    ----------
+       entries: list
+           list of {'date': ..., 'tokens': {token: amount, ...}} dictionaries
+
+    Returns
+    -------
+       List
+           token names in order of first appearance, like parse_token_series
+    """
+    return list(dict.fromkeys(token for entry in entries for token in entry['tokens']))
+
+
+def top_tokens(chain_tvl: Dict, top_n: int) -> List[str]:
+    """Rank tokens by their latest USD value, reading only the latest entry
+
+    Parameters
+    ----------
+       chain_tvl: dict
+           dictionary with 'tokens' & 'tokensInUsd' arrays
+       top_n: int
+           number of tokens to return
+
+    Returns
+    -------
+       List
+           top_n token names, most valuable first
+    """
+    entries = chain_tvl.get('tokensInUsd') or chain_tvl.get('tokens') or []
+    if not entries:
+        return []
+    latest = max(reversed(entries), key=lambda entry: int(entry['date']))
+    amounts = {token: amount for token, amount in latest['tokens'].items() if amount is not None}
+    return sorted(amounts, key=amounts.get, reverse=True)[:top_n]
+
+
+def align_blocks(blocks: List[Tuple[np.ndarray, List, np.ndarray]],
+                 days: np.ndarray = None) -> Tuple[np.ndarray, List, np.ndarray]:
+    """Place column blocks side by side on a common set of days
+
+    Parameters
+    ----------
+       blocks: list
+           list of (days, columns, values) blocks
+       days: np.ndarray
+           days of the output, defaults to the union of every block's days
+
+    Returns
+    -------
+       Tuple
+           days, concatenated columns & (days x columns) values
+    """
+    if days is None:
+        days = np.unique(np.concatenate([block[0] for block in blocks])) if blocks \
+            else np.empty(0, dtype=np.int64)
+    columns = [column for block in blocks for column in block[1]]
+    values = np.full((len(days), len(columns)), np.nan)
+    offset = 0
+    for block_days, block_columns, block_values in blocks:
+        positions = np.searchsorted(days, block_days)
+        found = positions < len(days)
+        found[found] = days[positions[found]] == block_days[found]
+        values[positions[found], offset:offset + len(block_columns)] = block_values[found]
+        offset += len(block_columns)
+    return days, columns, values
+
+
+def parse_chain_tvl(chain_tvl: Dict, include_native: bool = True, include_usd: bool = True,
+                    top_n_tokens: int = None, window: Tuple[int, int] = None) -> \
+        Tuple[np.ndarray, List, np.ndarray]:
+    """Parse the tvl, tokens & tokensInUsd arrays of a chain (or protocol total)
+    into one block indexed by the days of the tvl array
+
+    Parameters
+    ----------
+       chain_tvl: dict
+           dictionary with 'tvl', 'tokens' & 'tokensInUsd' arrays
+       include_native: bool
+           parse token amounts in native units
+       include_usd: bool
+           parse token amounts in USD
+       top_n_tokens: int
+           only parse the top_n_tokens tokens by latest USD value
+       window: tuple
+           optional inclusive (first day, last day) to parse, see day_window
+
+    Returns
+    -------
+       Tuple
+           days, ['totalLiquidityUSD', tokens..., tokens_usd...] & values, token columns
+           are the same whatever the window, tokens without entries in it are NaN
+    """
+    tvl_block = parse_tvl_series(window_entries(chain_tvl['tvl'], window))
+    tokens = top_tokens(chain_tvl, top_n_tokens) if top_n_tokens is not None else None
+    blocks = [tvl_block]
+    for key, suffix, included in (('tokens', '', include_native),
+                                  ('tokensInUsd', '_usd', include_usd)):
+        if not included:
+            continue
+        entries = chain_tvl.get(key) or []
+        # Columns come from every entry so they don't change with the window
+        columns = all_tokens(entries) if tokens is None and window is not None else tokens
+        blocks.append(parse_token_series(window_entries(entries, window), suffix=suffix,
+                                         tokens=columns))
+    return align_blocks(blocks, days=tvl_block[0])
+
+
+def parse_protocol_tvl(protocol: Dict, chains: List[str] = None, include_native: bool = True,
+                       include_usd: bool = True, top_n_tokens: int = None,
+                       window: Tuple[int, int] = None) -> \
+        Tuple[np.ndarray, List[Tuple[str, str]], np.ndarray]:
+    """Parse a DeFi Llama /protocol response into one block with a column
+    per (chain, asset), including the 'all' aggregate across chains
+
+    Parameters
+    ----------
+       protocol: dict
+           decoded /protocol/$slug response
+       chains: list
+           optional chains to parse (case-insensitive), 'all' selects the aggregate
+           across chains
+       include_native: bool
+           parse token amounts in native units
+       include_usd: bool
+           parse token amounts in USD
+       top_n_tokens: int
+           only parse the top_n_tokens tokens of each chain by latest USD value
+       window: tuple
+           optional inclusive (first day, last day) to parse, see day_window
+
+    Returns
+    -------
+       Tuple
+           days, (chain, asset) columns & values
+    """
+    options = {'include_native': include_native, 'include_usd': include_usd,
+               'top_n_tokens': top_n_tokens, 'window': window}
+    wanted = {chain.lower() for chain in chains} if chains is not None else None
+    blocks = []
+    for chain in protocol['chains'] + ['all']:
+        if wanted is not None and chain.lower() not in wanted:
+            continue
+        chain_tvl = protocol if chain == 'all' else protocol['chainTvls'][chain]
+        days, columns, values = parse_chain_tvl(chain_tvl, **options)
+        blocks.append((days, [(chain, column) for column in columns], values))
+    return align_blocks(blocks)
+
+
+def parse_protocol_content(content: bytes, **options) -> \
+        Tuple[np.ndarray, List[Tuple[str, str]], np.ndarray]:
+    """Decode a /protocol/$slug response body & parse it like parse_protocol_tvl,
+    run in worker processes so decoding & parsing leave the calling process
+
+    Parameters
+    ----------
+       content: bytes
+           undecoded /protocol/$slug response
+       options: dict
+           keyword arguments of parse_protocol_tvl
+
+    Returns
+    -------
+       Tuple
+           days, (chain, asset) columns & values
+    """
+    return parse_protocol_tvl(json.loads(content), **options)
+
+
+def days_to_index(days: np.ndarray) -> pd.DatetimeIndex:
+    """Convert unix days to the DatetimeIndex used by format_df
+
+    Parameters
+    ----------
+       days: np.ndarray
+           unix seconds at midnight
+
+    Returns
+    -------
+       DatetimeIndex
+           pandas DatetimeIndex of days
+    """
+    return pd.to_datetime(np.asarray(days, dtype=np.int64), unit='s', origin='unix')
@@ -0,0 +1,170 @@
+"""This module is dedicated to the row-per-protocol DeFi Llama /protocols listing
+and the secondary indexes used to filter it without scanning every row"""
+
+from __future__ import annotations
+
+from typing import Dict, List, Union
+
+from messari.lazy import numpy as np
+from messari.lazy import pandas as pd
+
+# Columns of the /protocols listing stored as floats
+NUMERIC_COLUMNS = ["tvl", "change_1h", "change_1d", "change_7d", "mcap", "fdv",
+                   "staking", "pool2", "listedAt"]
+# Low cardinality string columns stored as categoricals
+CATEGORICAL_COLUMNS = ["category", "chain"]
+
+
+def protocols_to_df(protocols: List[Dict]) -> pd.DataFrame:
+    """Build a typed DataFrame with one row per protocol from a /protocols response
+
+    Parameters
+    ----------
+       protocols: list
+           decoded /protocols response
+
+    Returns
+    -------
+       DataFrame
+           pandas DataFrame indexed by slug
+    """
+    protocols_df = pd.DataFrame.from_records(protocols)
+    if "slug" not in protocols_df.columns:
+        return protocols_df.rename_axis("slug")
+    protocols_df = protocols_df.set_index("slug")
+    # NOTE: keep the last listing of a slug, like format_df does for duplicate dates
+    protocols_df = protocols_df[~protocols_df.index.duplicated(keep="last")]
+    for column in NUMERIC_COLUMNS:
+        if column in protocols_df.columns:
+            protocols_df[column] = pd.to_numeric(protocols_df[column], errors="coerce")
+    for column in CATEGORICAL_COLUMNS:
+        if column in protocols_df.columns:
+            protocols_df[column] = protocols_df[column].astype("category")
+    return protocols_df
+
+
+def _build_index(keys: List) -> Dict[str, np.ndarray]:
+    """Map each casefolded key to the sorted row positions it appears in,
+    keys is a list with one key or list of keys per row"""
+    positions: Dict[str, List[int]] = {}
+    for row, row_keys in enumerate(keys):
+        if isinstance(row_keys, str):
+            row_keys = [row_keys]
+        elif not isinstance(row_keys, (list, tuple)):
+            continue
+        for key in row_keys:
+            if isinstance(key, str):
+                positions.setdefault(key.casefold(), []).append(row)
+    return {key: np.unique(rows) for key, rows in positions.items()}
+
+
+class ProtocolIndex:
+    """This class holds the /protocols listing with secondary indexes by chain,
+    category & symbol so filters are dictionary lookups instead of full scans.
+    Lookups are case insensitive.
+
+    Parameters
+    ----------
+       protocols_df: pd.DataFrame
+           DataFrame indexed by slug, as returned by DeFiLlama.get_protocols
+    """
+
+    def __init__(self, protocols_df: pd.DataFrame):
+        self.df = protocols_df
+        self._indexes = {
+            "chain": _build_index(self._column("chains")),
+            "category": _build_index(self._column("category")),
+            "symbol": _build_index(self._column("symbol")),
+        }
+        # Rank of every row by tvl, highest first & missing tvl last
+        tvl = self.df["tvl"].to_numpy(dtype=float) if "tvl" in self.df.columns \
+            else np.full(len(self.df), np.nan)
+        order = np.argsort(np.where(np.isnan(tvl), np.inf, -tvl), kind="stable")
+        self._tvl_rank = np.empty(len(order), dtype=np.int64)
+        self._tvl_rank[order] = np.arange(len(order))
+
+    def __len__(self) -> int:
+        return len(self.df)
+
+    def _column(self, column: str) -> List:
+        """Column values as a list, empty values if the column is missing"""
+        if column not in self.df.columns:
+            return [None] * len(self.df)
+        return self.df[column].tolist()
+
+    def keys(self, index: str) -> List[str]:
+        """Casefolded keys of a secondary index
+
+        Parameters
+        ----------
+           index: str
+               'chain', 'category' or 'symbol'
+
+        Returns
+        -------
+           List
+               sorted list of keys
+        """
+        return sorted(self._get_index(index))
+
+    def _get_index(self, index: str) -> Dict[str, np.ndarray]:
+        if index not in self._indexes:
+            raise ValueError(f"Unsupported index {index!r}. Index options include: "
+                             f"{list(self._indexes)}")
+        return self._indexes[index]
+
+    def positions(self, index: str, keys: Union[str, List]) -> np.ndarray:
+        """Row positions matching any of keys in a secondary index
+
+        Parameters
+        ----------
+           index: str
+               'chain', 'category' or 'symbol'
+           keys: str, list
+               Single key or list of keys
+
+        Returns
+        -------
+           np.ndarray
+               sorted row positions
+        """
+        lookup = self._get_index(index)
+        keys = [keys] if isinstance(keys, str) else keys
+        matches = [lookup.get(key.casefold(), np.empty(0, dtype=np.int64)) for key in keys]
+        if len(matches) == 1:
+            return matches[0]
+        return np.unique(np.concatenate(matches)) if matches else np.empty(0, dtype=np.int64)
+
+    def select(self, chain: Union[str, List] = None, category: Union[str, List] = None,
+               symbol: Union[str, List] = None, sort_by_tvl: bool = True) -> pd.DataFrame:
+        """Protocols matching every given filter (i.e. lending protocols on Arbitrum)
+
+        Parameters
+        ----------
+           chain: str, list
+               Optional chain or list of chains the protocol is deployed on
+           category: str, list
+               Optional category or list of categories (i.e. Lending)
+           symbol: str, list
+               Optional token symbol or list of symbols
+           sort_by_tvl: bool
+               Order rows by current tvl, highest first. Default is True,
+               otherwise rows keep the listing order.
+
+        Returns
+        -------
+           DataFrame
+               pandas DataFrame of matching protocols indexed by slug
+        """
+        rows = None
+        for index, keys in (("chain", chain), ("category", category), ("symbol", symbol)):
+            if keys is None:
+                continue
+            matches = self.positions(index, keys)
+            rows = matches if rows is None else np.intersect1d(rows, matches,
+                                                                assume_unique=True)
+        if rows is None:
+            rows = np.arange(len(self.df))
+        if sort_by_tvl:
+            rows = rows[np.argsort(self._tvl_rank[rows], kind="stable")]
+        return self.df.iloc[rows]
@@ -0,0 +1,243 @@
+"""This module is dedicated to parsing large DeFi Llama /protocol responses
+incrementally, streaming the timeseries arrays straight into column builders
+instead of decoding the whole response into Python objects first"""
+
+from __future__ import annotations
+
+from array import array
+from typing import BinaryIO, Dict, List, Tuple
+
+from messari.lazy import numpy as np
+
+from .helpers import SECONDS_PER_DAY, rows_by_day, align_blocks
+
+SERIES_NAMES = ("tvl", "tokens", "tokensInUsd")
+
+
+class SeriesBuilder:
+    """This class accumulates one tvl, tokens or tokensInUsd array in compact typed
+    arrays, one cell per (entry, token) pair, until it is built into a block
+
+    Parameters
+    ----------
+       latest_only: bool
+           Only keep the most recent entry, used to rank tokens without storing the series
+       window: tuple
+           Optional inclusive (first day, last day) of entries to store, see helpers.day_window
+    """
+
+    def __init__(self, latest_only: bool = False, window: Tuple[int, int] = None):
+        self.latest_only = latest_only
+        self.window = window
+        self.columns: Dict[str, int] = {}
+        self.dates = array("q")
+        self.cell_entries = array("q")
+        self.cell_columns = array("q")
+        self.cell_values = array("d")
+        self._date = None
+        self._cells: List[Tuple[str, float]] = []
+        self._latest_date = None
+        self._latest_cells: List[Tuple[str, float]] = []
+
+    @property
+    def has_entries(self) -> bool:
+        """Check if any entry was parsed, including entries outside window"""
+        return self._latest_date is not None
+
+    def set_date(self, date) -> None:
+        """Set the date of the current entry"""
+        self._date = int(date)
+
+    def add(self, column: str, value) -> None:
+        """Add a value to the current entry"""
+        self._cells.append((column, np.nan if value is None else float(value)))
+
+    def end_entry(self) -> None:
+        """Store the current entry"""
+        cells, self._cells = self._cells, []
+        if self._date is None:
+            return
+        date, self._date = self._date, None
+        # On equal dates the later entry wins, like helpers.top_tokens
+        if self._latest_date is None or date >= self._latest_date:
+            self._latest_date, self._latest_cells = date, cells
+        if self.latest_only:
+            return
+        if self.window is not None:
+            day = date - date % SECONDS_PER_DAY
+            if not self.window[0] <= day <= self.window[1]:
+                # Columns come from every entry so they don't change with the window
+                for column, _ in cells:
+                    self.columns.setdefault(column, len(self.columns))
+                return
+        entry = len(self.dates)
+        self.dates.append(date)
+        for column, value in cells:
+            self.cell_entries.append(entry)
+            self.cell_columns.append(self.columns.setdefault(column, len(self.columns)))
+            self.cell_values.append(value)
+
+    def ranked_columns(self) -> List[str]:
+        """Columns of the latest entry ordered by value, most valuable first"""
+        amounts = {column: value for column, value in self._latest_cells if not np.isnan(value)}
+        return sorted(amounts, key=amounts.get, reverse=True)
+
+    def build(self, suffix: str = "", tokens: List[str] = None) -> \
+            Tuple[np.ndarray, List[str], np.ndarray]:
+        """Build a (days, columns, values) block, keeping the last entry of each day
+
+        Parameters
+        ----------
+           suffix: str
+               suffix appended to every column name (i.e. '_usd')
+           tokens: list
+               optional columns to keep, in this order
+
+        Returns
+        -------
+           Tuple
+               sorted days, columns & (days x columns) values
+        """
+        days, rows = rows_by_day(np.frombuffer(self.dates, dtype=np.int64))
+        cell_rows = rows[np.frombuffer(self.cell_entries, dtype=np.int64)]
+        cell_columns = np.frombuffer(self.cell_columns, dtype=np.int64)
+        cell_values = np.frombuffer(self.cell_values, dtype=np.float64)
+        columns = list(self.columns)
+        if tokens is not None:
+            selected = np.full(len(columns) + 1, -1, dtype=np.int64)
+            for position, token in enumerate(tokens):
+                if token in self.columns:
+                    selected[self.columns[token]] = position
+            cell_columns = selected[cell_columns] if len(cell_columns) else cell_columns
+            columns = list(tokens)
+        kept = (cell_rows >= 0) & (cell_columns >= 0)
+        values = np.full((len(days), len(columns)), np.nan)
+        values[cell_rows[kept], cell_columns[kept]] = cell_values[kept]
+        return days, [f"{column}{suffix}" for column in columns], values
+
+
+def _empty_block(columns: List[str]) -> Tuple[np.ndarray, List[str], np.ndarray]:
+    """Block without any days"""
+    return np.empty(0, dtype=np.int64), columns, np.empty((0, len(columns)))
+
+
+def parse_protocol_stream(stream: BinaryIO, chains: List[str] = None,
+                          include_native: bool = True, include_usd: bool = True,
+                          top_n_tokens: int = None, window: Tuple[int, int] = None) -> \
+        Tuple[np.ndarray, List[Tuple[str, str]], np.ndarray]:
+    """Parse a /protocol/$slug response from a file-like byte stream into one block
+    with a column per (chain, asset), like helpers.parse_protocol_tvl.
+
+    Requires the ijson package.
+
+    Parameters
+    ----------
+       stream: file-like
+           response body (i.e. requests raw response)
+       chains: list
+           optional chains to parse (case-insensitive), 'all' selects the aggregate
+           across chains
+       include_native: bool
+           parse token amounts in native units
+       include_usd: bool
+           parse token amounts in USD
+       top_n_tokens: int
+           only keep the top_n_tokens tokens of each chain by latest USD value
+       window: tuple
+           optional inclusive (first day, last day) to keep, see helpers.day_window
+
+    Returns
+    -------
+       Tuple
+           days, (chain, asset) columns & values
+    """
+    try:
+        import ijson  # pylint: disable=import-outside-toplevel
+    except ImportError as e:
+        raise ImportError("Streaming parsing requires ijson, install it with pip install ijson") \
+            from e
+
+    wanted_chains = {chain.lower() for chain in chains} if chains is not None else None
+
+    def wanted(chain: str, series: str) -> bool:
+        if wanted_chains is not None and chain.lower() not in wanted_chains:
+            return False
+        if listed_chains and chain != "all" and chain not in listed_chains:
+            return False
+        if series == "tokens":
+            return include_native or top_n_tokens is not None
+        if series == "tokensInUsd":
+            return include_usd or top_n_tokens is not None
+        return True
+
+    builders: Dict[Tuple[str, str], SeriesBuilder] = {}
+    listed_chains: List[str] = []
+    chain_order: List[str] = []
+    path: List = []
+    builder, entry_depth = None, 0
+    for _, event, value in ijson.parse(stream, use_float=True):
+        if event == "map_key":
+            path[-1] = value
+        elif event in ("start_map", "start_array"):
+            path.append(None if event == "start_map" else "item")
+            depth = len(path)
+            # Entries of chainTvls.<chain>.<series> & of the top level <series> arrays
+            if event == "start_map" and path[-2:-1] == ["item"]:
+                if depth == 5 and path[0] == "chainTvls" and path[2] in SERIES_NAMES:
+                    key = (path[1], path[2])
+                elif depth == 3 and path[0] in SERIES_NAMES:
+                    key = ("all", path[0])
+                else:
+                    continue
+                builder = builders.get(key)
+                if builder is None and wanted(*key):
+                    if key[0] not in chain_order:
+                        chain_order.append(key[0])
+                    latest_only = (key[1] == "tokensInUsd" and not include_usd) or \
+                                  (key[1] == "tokens" and not include_native)
+                    builder = builders[key] = SeriesBuilder(latest_only=latest_only,
+                                                            window=window)
+                entry_depth = depth
+        elif event in ("end_map", "end_array"):
+            if builder is not None and event == "end_map" and len(path) == entry_depth:
+                builder.end_entry()
+                builder = None
+            path.pop()
+        elif builder is not None:
+            depth = len(path) - entry_depth
+            if depth == 0:
+                if path[-1] == "date":
+                    builder.set_date(value)
+                elif path[-1] != "tokens":
+                    builder.add(path[-1], value)
+            elif depth == 1 and path[-2] == "tokens":
+                builder.add(path[-1], value)
+        elif path == ["chains", "item"]:
+            listed_chains.append(value)
+
+    ordered = [chain for chain in listed_chains if chain in chain_order] or \
+        [chain for chain in chain_order if chain != "all"]
+    if "all" in chain_order:
+        ordered.append("all")
+
+    blocks = []
+    for chain in ordered:
+        tvl_builder = builders.get((chain, "tvl"))
+        tvl_block = tvl_builder.build(tokens=["totalLiquidityUSD"]) if tvl_builder \
+            else _empty_block(["totalLiquidityUSD"])
+        native = builders.get((chain, "tokens"))
+        usd = builders.get((chain, "tokensInUsd"))
+        tokens = None
+        if top_n_tokens is not None:
+            ranking = usd if usd is not None and usd.has_entries else native
+            tokens = ranking.ranked_columns()[:top_n_tokens] if ranking is not None else []
+        chain_blocks = [tvl_block]
+        if include_native:
+            chain_blocks.append(native.build(tokens=tokens) if native is not None
+                                else _empty_block(tokens or []))
+        if include_usd:
+            chain_blocks.append(usd.build(suffix="_usd", tokens=tokens) if usd is not None
+                                else _empty_block([f"{token}_usd" for token in tokens or []]))
+        days, columns, values = align_blocks(chain_blocks, days=tvl_block[0])
+        blocks.append((days, [(chain, column) for column in columns], values))
+    return align_blocks(blocks)
@@ -0,0 +1,451 @@
+"""This module is dedicated to bulk exports of Messari & DeFi Llama timeseries to disk.
+Jobs fetch with bounded concurrency under a rate limit & every result is written
+to date/asset partitioned Parquet or CSV files as soon as it arrives, so the full
+dataset is never held in memory. Run it with the messari-export console script."""
+
+from __future__ import annotations
+
+import argparse
+import json
+import logging
+import os
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from typing import Dict, List, Set, Union
+
+from messari.lazy import pandas as pd
+from messari.priority import BATCH, request_priority
+from messari.scheduler import RateLimiter
+
+FILE_FORMATS = ["parquet", "csv"]
+# strftime format of the date partition for each partition option
+PARTITION_FORMATS = {"year": "%Y", "month": "%Y-%m", "day": "%Y-%m-%d"}
+
+
+class ExportTask:
+    """This class is one fetch of an export job, its result is written to
+    <output>/<dataset>/date=<period>/asset=<key>/
+
+    Parameters
+    ----------
+       source: str
+           'messari' or 'defillama'
+       dataset: str
+           Dataset directory (i.e. price, protocol_tvl)
+       key: str
+           Asset, protocol or chain partition
+       method: str
+           Client method to call
+       kwargs: dict
+           Keyword arguments of the client method
+    """
+
+    def __init__(self, source: str, dataset: str, key: str, method: str, kwargs: Dict):
+        self.source = source
+        self.dataset = dataset
+        self.key = key
+        self.method = method
+        self.kwargs = kwargs
+
+    @property
+    def name(self) -> str:
+        """Task name used in logs & reports (i.e. price/bitcoin)"""
+        return f"{self.dataset}/{self.key}"
+
+    def __repr__(self) -> str:
+        return f"ExportTask({self.source!r}, {self.name!r})"
+
+
+def flatten_frame(task: ExportTask, frame: pd.DataFrame) -> pd.DataFrame:
+    """Shape a client DataFrame into the flat columns written to disk"""
+    if task.method == "get_metric_timeseries":
+        # Drop the asset column level, the asset is in the partition path
+        if isinstance(frame.columns, pd.MultiIndex):
+            return frame.droplevel(0, axis=1)
+        return frame.set_axis([task.dataset] * len(frame.columns), axis=1)
+    if task.method == "get_protocol_tvl_timeseries":
+        # Token columns differ across protocols & time, a long frame keeps one schema
+        tvl_df = frame.droplevel(0, axis=1).rename_axis(["chain", "token"], axis=1)
+        long_df = tvl_df.melt(ignore_index=False, value_name="value")
+        return long_df.dropna(subset=["value"]).sort_index(kind="stable")
+    return frame.set_axis(["tvl"], axis=1) if len(frame.columns) == 1 else frame
+
+
+class ExportJob:
+    """This class describes a bulk export, either built directly or from a JSON job spec.
+
+    Messari tasks cover assets x metrics, DeFi Llama tasks cover protocols, chains &
+    the global tvl. Every task fetches start to end.
+
+    Parameters
+    ----------
+       output: str
+           Output directory
+       assets: list
+           Messari asset slugs (i.e. bitcoin)
+       metrics: list
+           Messari timeseries metrics (i.e. price, mcap.circ)
+       protocols: list
+           DeFi Llama protocol slugs (i.e. aave)
+       chains: list
+           DeFi Llama chains (i.e. Ethereum)
+       global_tvl: bool
+           Export the DeFi Llama global tvl. Default is False.
+       start: str
+           Optional start date ("YYYY-MM-DD")
+       end: str
+           Optional end date ("YYYY-MM-DD")
+       interval: str
+           Messari timeseries interval. Default is 1d.
+       file_format: str
+           'parquet' (requires pyarrow) or 'csv'. Default is parquet.
+       partition: str
+           Date partition size, 'year', 'month' or 'day'. Default is month.
+       concurrency: int
+           Maximum requests in flight. Default is 4.
+       rate_limit: float
+           Optional maximum requests per second
+       retries: int
+           Retries of a failed task, waiting backoff * 2 ** attempt in between. Default is 2.
+       backoff: float
+           Seconds before the first retry. Default is 1.
+       api_key: str, list
+           Optional Messari API key or keys to rotate across, default is the
+           MESSARI_API_KEY environment variable (comma separated for several keys)
+    """
+
+    def __init__(self, output: str, assets: List[str] = None, metrics: List[str] = None,
+                 protocols: List[str] = None, chains: List[str] = None,
+                 global_tvl: bool = False, start: str = None, end: str = None,
+                 interval: str = "1d", file_format: str = "parquet", partition: str = "month",
+                 concurrency: int = 4, rate_limit: float = None, retries: int = 2,
+                 backoff: float = 1.0, api_key: Union[str, List[str]] = None):
+        if file_format not in FILE_FORMATS:
+            raise ValueError(f"Unsupported format {file_format!r}. Format options include: "
+                             f"{FILE_FORMATS}")
+        if partition not in PARTITION_FORMATS:
+            raise ValueError(f"Unsupported partition {partition!r}. Partition options include: "
+                             f"{list(PARTITION_FORMATS)}")
+        if concurrency < 1:
+            raise ValueError("concurrency must be at least 1")
+        if bool(assets) != bool(metrics):
+            raise ValueError("Messari exports need both assets and metrics")
+        if start and not end:
+            raise ValueError("End date must be provided")
+        self.output = output
+        self.assets = list(assets or [])
+        self.metrics = list(metrics or [])
+        self.protocols = list(protocols or [])
+        self.chains = list(chains or [])
+        self.global_tvl = global_tvl
+        self.start = start
+        self.end = end
+        self.interval = interval
+        self.file_format = file_format
+        self.partition = partition
+        self.concurrency = concurrency
+        self.rate_limit = rate_limit
+        self.retries = retries
+        self.backoff = backoff
+        api_key = api_key or os.environ.get("MESSARI_API_KEY")
+        if isinstance(api_key, str) and "," in api_key:
+            api_key = [key.strip() for key in api_key.split(",") if key.strip()]
+        self.api_key = api_key
+
+    @classmethod
+    def from_dict(cls, spec: Dict) -> "ExportJob":
+        """Build a job from a job spec, i.e.
+
+        {"output": "exports", "start": "2021-01-01", "end": "2021-12-31",
+         "messari": {"assets": ["bitcoin"], "metrics": ["price"], "interval": "1d"},
+         "defillama": {"protocols": ["aave"], "chains": ["Ethereum"], "global": true},
+         "format": "csv", "partition": "month", "concurrency": 4, "rate_limit": 5}
+
+        :param spec: dict
+            Job spec
+        :return: ExportJob
+        """
+        spec = dict(spec)
+        messari_spec = dict(spec.pop("messari", None) or {})
+        defillama_spec = dict(spec.pop("defillama", None) or {})
+        if "output" not in spec:
+            raise ValueError("Job spec is missing an output directory")
+        options = {
+            "assets": messari_spec.pop("assets", None),
+            "metrics": messari_spec.pop("metrics", None),
+            "interval": messari_spec.pop("interval", "1d"),
+            "api_key": messari_spec.pop("api_key", None),
+            "protocols": defillama_spec.pop("protocols", None),
+            "chains": defillama_spec.pop("chains", None),
+            "global_tvl": defillama_spec.pop("global", False),
+            "file_format": spec.pop("format", "parquet"),
+        }
+        unknown = list(messari_spec) + list(defillama_spec)
+        if unknown:
+            raise ValueError(f"Unsupported job spec options {unknown}")
+        try:
+            return cls(**spec, **options)
+        except TypeError as e:
+            raise ValueError(f"Invalid job spec: {e}") from e
+
+    @classmethod
+    def from_file(cls, path: str) -> "ExportJob":
+        """Build a job from a JSON job spec file, see from_dict
+
+        :param path: str
+            Path to the job spec
+        :return: ExportJob
+        """
+        with open(path, "r", encoding="utf-8") as infile:
+            return cls.from_dict(json.load(infile))
+
+    def tasks(self) -> List[ExportTask]:
+        """Every fetch of the job
+
+        :return: List of ExportTask
+        """
+        tasks = []
+        for metric in self.metrics:
+            for asset in self.assets:
+                tasks.append(ExportTask("messari", metric, asset, "get_metric_timeseries", {
+                    "asset_slugs": asset, "asset_metric": metric, "start": self.start,
+                    "end": self.end, "interval": self.interval}))
+        dates = {"start_date": self.start, "end_date": self.end}
+        for protocol in self.protocols:
+            tasks.append(ExportTask("defillama", "protocol_tvl", protocol,
+                                    "get_protocol_tvl_timeseries",
+                                    {"asset_slugs": protocol, **dates}))
+        for chain in self.chains:
+            tasks.append(ExportTask("defillama", "chain_tvl", chain, "get_chain_tvl_timeseries",
+                                    {"chains_in": chain, **dates}))
+        if self.global_tvl:
+            tasks.append(ExportTask("defillama", "global_tvl", "global",
+                                    "get_global_tvl_timeseries", dates))
+        return tasks
+
+    def run(self, clients: Dict = None) -> "ExportReport":
+        """Fetch every task & write the results
+
+        :param clients: dict
+            Optional clients keyed by source ('messari', 'defillama'),
+            missing clients are created when a task needs them
+        :return: ExportReport
+        """
+        clients = dict(clients or {})
+        tasks = self.tasks()
+        for source in {task.source for task in tasks} - set(clients):
+            clients[source] = self.client(source)
+        writer = PartitionedWriter(self.output, self.file_format, self.partition)
+        limiter = RateLimiter(self.rate_limit, burst=self.concurrency) \
+            if self.rate_limit else None
+        report = ExportReport()
+
+        def fetch(task: ExportTask) -> pd.DataFrame:
+            method = getattr(clients[task.source], task.method)
+            attempt = 0
+            while True:
+                if limiter is not None:
+                    time.sleep(limiter.delay())
+                try:
+                    # Clients shared with interactive callers serve them first
+                    with request_priority(BATCH):
+                        return method(**task.kwargs)
+                except SystemError as e:
+                    if attempt >= self.retries:
+                        raise
+                    logging.warning("Export of %s failed, retrying: %s", task.name, e)
+                    time.sleep(self.backoff * 2 ** attempt)
+                    attempt += 1
+
+        # At most concurrency tasks are in flight, finished frames are written & released
+        # before more are submitted so memory doesn't grow with the size of the job
+        pending = iter(tasks)
+        running: Dict[Future, ExportTask] = {}
+        with ThreadPoolExecutor(max_workers=self.concurrency) as executor:
+            while True:
+                for task in pending:
+                    running[executor.submit(fetch, task)] = task
+                    if len(running) >= self.concurrency:
+                        break
+                if not running:
+                    break
+                done: Set[Future] = wait(running, return_when=FIRST_COMPLETED)[0]
+                for future in done:
+                    task = running.pop(future)
+                    try:
+                        frame = flatten_frame(task, future.result())
+                        report.add(frame, writer.write(task.dataset, task.key, frame))
+                    except Exception as e:  # pylint: disable=broad-except
+                        logging.warning("Export of %s failed: %s", task.name, e)
+                        report.failures[task.name] = str(e)
+        return report
+
+    def client(self, source: str):
+        """Create the client of a source
+
+        :param source: str
+            'messari' or 'defillama'
+        :return: Messari or DeFiLlama client
+        """
+        # pylint: disable=import-outside-toplevel
+        if source == "messari":
+            from messari.messari import Messari
+            return Messari(api_key=self.api_key)
+        from messari.defillama import DeFiLlama
+        return DeFiLlama()
+
+
+class ExportReport:
+    """This class summarizes an export run"""
+
+    def __init__(self):
+        self.tasks = 0
+        self.rows = 0
+        self.files: List[str] = []
+        self.failures: Dict[str, str] = {}
+
+    def add(self, frame: pd.DataFrame, files: List[str]) -> None:
+        """Record a written task"""
+        self.tasks += 1
+        self.rows += len(frame)
+        self.files.extend(files)
+
+    def to_dict(self) -> Dict:
+        """Report as a JSON serializable dict"""
+        return {"tasks": self.tasks, "rows": self.rows, "files": len(self.files),
+                "failures": self.failures}
+
+
+class PartitionedWriter:
+    """This class writes DataFrames indexed by date into hive style partitions,
+    <output>/<dataset>/date=<period>/asset=<key>/part-0.<format>
+
+    Rerunning an export overwrites the partitions it covers. Files are written
+    to a temporary name first so readers never see partial files.
+
+    Parameters
+    ----------
+       output: str
+           Output directory
+       file_format: str
+           'parquet' (requires pyarrow) or 'csv'
+       partition: str
+           Date partition size, 'year', 'month' or 'day'
+    """
+
+    def __init__(self, output: str, file_format: str = "parquet", partition: str = "month"):
+        if file_format == "parquet":
+            try:
+                import pyarrow  # pylint: disable=import-outside-toplevel,unused-import
+            except ImportError as e:
+                raise ImportError("Parquet exports require pyarrow, install it with "
+                                  "pip install pyarrow or export with format csv") from e
+        self.output = output
+        self.file_format = file_format
+        self.date_format = PARTITION_FORMATS[partition]
+
+    def path(self, dataset: str, period: str, key: str, part: str = "0") -> str:
+        """Path of a partition file"""
+        return os.path.join(self.output, dataset, f"date={period}", f"asset={key}",
+                            f"part-{part}.{self.file_format}")
+
+    def write(self, dataset: str, key: str, frame: pd.DataFrame, part: str = "0") -> List[str]:
+        """Write a DataFrame indexed by date, one file per date partition
+
+        :param dataset: str
+            Dataset directory
+        :param key: str
+            Asset partition
+        :param frame: pd.DataFrame
+            DataFrame with a DatetimeIndex
+        :param part: str
+            File name suffix, frames written with different parts sit side by side
+            in a partition (i.e. range chunks of a backfill)
+        :return: List of written files
+        """
+        if frame.empty:
+            return []
+        frame = frame.rename_axis("date")
+        paths = []
+        for period, period_df in frame.groupby(frame.index.strftime(self.date_format), sort=True):
+            path = self.path(dataset, period, key, part)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            self._write_file(period_df, path)
+            paths.append(path)
+        return paths
+
+    def _write_file(self, frame: pd.DataFrame, path: str) -> None:
+        temporary = f"{path}.tmp"
+        if self.file_format == "parquet":
+            frame.to_parquet(temporary, index=True)
+        else:
+            frame.to_csv(temporary, index=True)
+        os.replace(temporary, path)
+
+
+def parse_args(argv: List[str] = None) -> argparse.Namespace:
+    """Parse messari-export command line arguments"""
+    parser = argparse.ArgumentParser(
+        prog="messari-export",
+        description="Export Messari & DeFi Llama timeseries to partitioned Parquet or CSV")
+    parser.add_argument("spec", nargs="?", help="JSON job spec, see ExportJob.from_dict")
+    parser.add_argument("-o", "--output", help="output directory")
+    parser.add_argument("--assets", nargs="+", help="Messari asset slugs")
+    parser.add_argument("--metrics", nargs="+", help="Messari timeseries metrics")
+    parser.add_argument("--interval", help="Messari timeseries interval")
+    parser.add_argument("--protocols", nargs="+", help="DeFi Llama protocol slugs")
+    parser.add_argument("--chains", nargs="+", help="DeFi Llama chains")
+    parser.add_argument("--global-tvl", action="store_true", default=None,
+                        help="export the DeFi Llama global tvl")
+    parser.add_argument("--start", help="start date (YYYY-MM-DD)")
+    parser.add_argument("--end", help="end date (YYYY-MM-DD)")
+    parser.add_argument("--format", dest="file_format", choices=FILE_FORMATS)
+    parser.add_argument("--partition", choices=list(PARTITION_FORMATS))
+    parser.add_argument("--concurrency", type=int, help="maximum requests in flight")
+    parser.add_argument("--rate-limit", type=float, help="maximum requests per second")
+    parser.add_argument("--retries", type=int, help="retries of a failed fetch")
+    return parser.parse_args(argv)
+
+
+def main(argv: List[str] = None, clients: Dict = None) -> int:
+    """Entry point of the messari-export console script, command line options
+    override the job spec
+
+    :param argv: list
+        Command line arguments, default is sys.argv
+    :param clients: dict
+        Optional clients keyed by source, see ExportJob.run
+    :return: Exit code, 1 if any task failed
+    """
+    args = parse_args(argv)
+    spec = {}
+    if args.spec:
+        with open(args.spec, "r", encoding="utf-8") as infile:
+            spec = json.load(infile)
+    for option in ("output", "start", "end", "partition", "concurrency", "rate_limit",
+                   "retries"):
+        if getattr(args, option) is not None:
+            spec[option] = getattr(args, option)
+    if args.file_format is not None:
+        spec["format"] = args.file_format
+    for section, options in (("messari", ("assets", "metrics", "interval")),
+                             ("defillama", ("protocols", "chains", "global_tvl"))):
+        for option in options:
+            if getattr(args, option) is not None:
+                key = "global" if option == "global_tvl" else option
+                spec.setdefault(section, {})[key] = getattr(args, option)
+
+    logging.basicConfig(level=logging.INFO)
+    try:
+        job = ExportJob.from_dict(spec)
+    except ValueError as e:
+        print(f"messari-export: {e}", file=sys.stderr)
+        return 2
+    report = job.run(clients)
+    print(json.dumps(report.to_dict(), indent=2))
+    return 1 if report.failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
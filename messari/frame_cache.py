@@ -0,0 +1,230 @@
+"""This module is dedicated to a DataFrame cache stored as Arrow IPC files in a shared
+directory. Files are read back with memory mapping, so worker processes on one node
+share a single page cache copy of each frame & warm reads don't copy column data."""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+from typing import Callable, Dict, Hashable, Tuple
+
+from messari.cache import CachePolicy, TIMESERIES_POLICY
+from messari.lazy import numpy as np
+from messari.lazy import pandas as pd
+
+# Schema metadata key holding the column labels & index name of a frame
+FRAME_METADATA_KEY = b"messari.frame"
+
+
+def _import_pyarrow():
+    """Import pyarrow, which is an optional dependency"""
+    try:
+        import pyarrow  # pylint: disable=import-outside-toplevel
+        import pyarrow.ipc  # pylint: disable=import-outside-toplevel,unused-import
+    except ImportError as e:
+        raise ImportError("The Arrow frame cache requires pyarrow, "
+                          "install it with pip install pyarrow") from e
+    return pyarrow
+
+
+def frame_to_table(frame: pd.DataFrame):
+    """Convert a DataFrame indexed by date into an Arrow table with one column per
+    DataFrame column. Float NaN is stored as a value rather than as null, so
+    numeric columns can be read back without copying.
+
+    :param frame: pd.DataFrame
+        DataFrame with a DatetimeIndex & string or tuple column labels
+    :return: pyarrow.Table
+    """
+    pa = _import_pyarrow()
+    if not isinstance(frame.index, pd.DatetimeIndex) or frame.index.tz is not None:
+        raise ValueError("Only DataFrames with a timezone naive DatetimeIndex can be cached")
+    # Dates are stored as integers in the index's own resolution
+    unit = np.datetime_data(frame.index.values.dtype)[0]
+    dates = frame.index.values.view(np.int64)
+    arrays, names = [pa.array(dates)], ["__index__"]
+    for position in range(frame.shape[1]):
+        values = frame.iloc[:, position].to_numpy()
+        # Object columns (i.e. strings) keep None/NaN as null, numeric NaN stays a value
+        arrays.append(pa.array(values, from_pandas=values.dtype == object))
+        names.append(f"c{position}")
+    labels = [list(label) if isinstance(label, tuple) else label for label in frame.columns]
+    metadata = {"columns": labels, "column_names": list(frame.columns.names),
+                "index_name": frame.index.name, "index_unit": unit}
+    return pa.Table.from_arrays(arrays, names=names).replace_schema_metadata(
+        {FRAME_METADATA_KEY: json.dumps(metadata).encode()})
+
+
+def _column_values(column) -> np.ndarray:
+    """NumPy values of a table column, primitive single chunk columns without
+    nulls are returned as zero-copy views"""
+    if column.num_chunks == 1:
+        return column.chunk(0).to_numpy(zero_copy_only=False)
+    return column.to_numpy()
+
+
+def table_to_frame(table) -> pd.DataFrame:
+    """Convert a table written by frame_to_table back into a DataFrame. Numeric
+    columns without nulls are views of the table's buffers, so DataFrames read
+    from memory mapped files must be treated as read-only.
+
+    :param table: pyarrow.Table
+        Table written by frame_to_table
+    :return: pd.DataFrame
+    """
+    metadata = json.loads(table.schema.metadata[FRAME_METADATA_KEY])
+    dates = _column_values(table.column(0)).astype(np.int64, copy=False)
+    index = pd.DatetimeIndex(dates.view(f"datetime64[{metadata['index_unit']}]"),
+                             name=metadata["index_name"])
+    columns = {position - 1: _column_values(table.column(position))
+               for position in range(1, table.num_columns)}
+    frame = pd.DataFrame(columns, index=index, copy=False)
+    labels = [tuple(label) if isinstance(label, list) else label
+              for label in metadata["columns"]]
+    if labels and isinstance(labels[0], tuple):
+        frame.columns = pd.MultiIndex.from_tuples(labels, names=metadata["column_names"])
+    else:
+        frame.columns = pd.Index(labels, name=metadata["column_names"][0])
+    return frame
+
+
+class ArrowFrameCache:
+    """This class caches DataFrames as Arrow IPC files in a directory shared by the
+    worker processes of a node (i.e. on /dev/shm or a local disk). Reads memory map
+    the files, so every process shares the page cache copy of a frame & numeric
+    columns aren't copied. Frames are also kept per process until their file changes,
+    so warm lookups only cost a stat call.
+
+    Entries expire by file age following a CachePolicy: fresh frames are returned,
+    frames within stale_ttl are returned while a background thread rebuilds them &
+    older frames are rebuilt before returning. Files are replaced atomically, readers
+    of an older file keep a valid mapping.
+
+    Requires the pyarrow package. Returned frames must be treated as read-only.
+
+    Parameters
+    ----------
+       directory: str
+           Directory holding the cache files, created if missing
+       default_policy: CachePolicy
+           Policy of methods without a cache policy of their own. Default is TIMESERIES_POLICY.
+    """
+
+    def __init__(self, directory: str, default_policy: CachePolicy = TIMESERIES_POLICY):
+        _import_pyarrow()
+        self.directory = directory
+        self.default_policy = default_policy
+        os.makedirs(directory, exist_ok=True)
+        self._frames: Dict[str, Tuple[int, pd.DataFrame]] = {}
+        self._refreshing = set()
+        self._lock = threading.Lock()
+
+    def path(self, key: Hashable) -> str:
+        """Cache file of a key
+
+        :param key: Hashable
+            Cache key, its repr must be stable across processes (i.e. tuples of strings)
+        :return: str
+        """
+        digest = hashlib.sha1(repr(key).encode()).hexdigest()
+        return os.path.join(self.directory, f"{digest}.arrow")
+
+    def get(self, key: Hashable, policy: CachePolicy,
+            build: Callable[[], pd.DataFrame]) -> pd.DataFrame:
+        """Return the cached frame for key, building it if missing or expired
+
+        :param key: Hashable
+            Cache key
+        :param policy: CachePolicy
+            Policy for this entry
+        :param build: Callable
+            Function building a fresh DataFrame
+        :return: Cached or fresh DataFrame
+        """
+        path = self.path(key)
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            stat = None
+        if stat is not None:
+            age = time.time() - stat.st_mtime
+            if age <= policy.ttl + policy.stale_ttl:
+                frame = self._read(path, stat.st_mtime_ns)
+                if age > policy.ttl:
+                    self._revalidate(key, build)
+                return frame
+
+        frame = build()
+        self.set(key, frame)
+        return frame
+
+    def set(self, key: Hashable, frame: pd.DataFrame) -> None:
+        """Write a frame for key, replacing the file atomically
+
+        :param key: Hashable
+            Cache key
+        :param frame: pd.DataFrame
+            DataFrame with a DatetimeIndex
+        """
+        pa = _import_pyarrow()
+        table = frame_to_table(frame)
+        descriptor, temporary = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        try:
+            with os.fdopen(descriptor, "wb") as sink:
+                with pa.ipc.new_file(sink, table.schema) as writer:
+                    writer.write_table(table)
+            os.replace(temporary, self.path(key))
+        except BaseException:
+            os.unlink(temporary)
+            raise
+
+    def delete(self, key: Hashable) -> None:
+        """Remove key from the cache
+
+        :param key: Hashable
+            Cache key
+        """
+        path = self.path(key)
+        with self._lock:
+            self._frames.pop(path, None)
+        try:
+            os.unlink(path)
+        except FileNotFoundError:
+            pass
+
+    def _read(self, path: str, mtime_ns: int) -> pd.DataFrame:
+        """Memory map a cache file, reusing the frame read last time it was unchanged"""
+        with self._lock:
+            entry = self._frames.get(path)
+        if entry is not None and entry[0] == mtime_ns:
+            return entry[1]
+        pa = _import_pyarrow()
+        # Buffers of the table hold the mapping, it is released with the last frame using it
+        table = pa.ipc.open_file(pa.memory_map(path, "r")).read_all()
+        frame = table_to_frame(table)
+        with self._lock:
+            self._frames[path] = (mtime_ns, frame)
+        return frame
+
+    def _revalidate(self, key: Hashable, build: Callable[[], pd.DataFrame]) -> None:
+        """Rebuild key on a background thread unless a rebuild is already running"""
+        with self._lock:
+            if key in self._refreshing:
+                return
+            self._refreshing.add(key)
+
+        def refresh():
+            try:
+                self.set(key, build())
+            except Exception as e:  # pylint: disable=broad-except
+                logging.warning("Background rebuild failed for %s: %s", key, e)
+            finally:
+                with self._lock:
+                    self._refreshing.discard(key)
+
+        threading.Thread(target=refresh, daemon=True).start()
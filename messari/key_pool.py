@@ -0,0 +1,202 @@
+"""This module is dedicated to spreading requests across several API keys, tracking
+the rate limit & quota of each key from response headers so throttled or exhausted
+keys are skipped until they recover"""
+
+import threading
+import time
+from typing import Callable, Dict, List, Mapping
+
+# Reset headers above this value are unix timestamps rather than seconds from now
+_EPOCH_THRESHOLD = 1e9
+
+
+class ApiKeyState:
+    """This class holds the rate limit & quota accounting of one API key
+
+    Parameters
+    ----------
+       key: str
+           API key
+    """
+
+    def __init__(self, key: str):
+        self.key = key
+        self.limit = None
+        self.remaining = None
+        self.reset_at = None
+        self.throttled_until = 0.0
+        self.next_slot = 0.0
+        self.in_flight = 0
+        self.requests = 0
+        self.throttles = 0
+        self.consecutive_throttles = 0
+
+    def available_at(self) -> float:
+        """Time at which the key can send its next request"""
+        return max(self.throttled_until, self.next_slot)
+
+    def to_dict(self) -> Dict:
+        """Accounting of the key, without the key itself"""
+        return {"key": f"...{self.key[-4:]}", "limit": self.limit, "remaining": self.remaining,
+                "requests": self.requests, "throttles": self.throttles,
+                "in_flight": self.in_flight}
+
+    def __repr__(self) -> str:
+        return f"ApiKeyState(key=...{self.key[-4:]}, remaining={self.remaining})"
+
+
+class ApiKeyPool:
+    """This class rotates requests across several API keys. Each response updates its
+    key's state from the x-ratelimit-limit, x-ratelimit-remaining & x-ratelimit-reset
+    headers; a key with no remaining requests, or answered with 429 Too Many Requests,
+    is skipped until its window resets (or Retry-After passes). Requests go to the
+    available key with the fewest requests in flight & the most remaining requests,
+    so throughput grows with the number of keys.
+
+    Parameters
+    ----------
+       keys: list
+           API keys
+       header: str
+           Request header carrying the key. Default is x-messari-api-key.
+       rate: float
+           Optional requests per second allowed per key, spaced locally before any
+           response header is seen
+       backoff: float
+           Seconds a throttled key is skipped when the response says nothing about
+           its reset, doubled on each consecutive 429 up to 60. Default is 1.
+       clock: Callable
+           Function returning the current time in seconds. Default is time.monotonic.
+    """
+
+    def __init__(self, keys: List[str], header: str = "x-messari-api-key", rate: float = None,
+                 backoff: float = 1.0, clock: Callable[[], float] = time.monotonic):
+        keys = [keys] if isinstance(keys, str) else list(dict.fromkeys(keys))
+        if not keys:
+            raise ValueError("ApiKeyPool requires at least one key")
+        if rate is not None and rate <= 0:
+            raise ValueError("rate must be positive")
+        self.header = header
+        self.rate = rate
+        self.backoff = backoff
+        self.clock = clock
+        self.states = [ApiKeyState(key) for key in keys]
+        self._lock = threading.Lock()
+
+    @property
+    def keys(self) -> List[str]:
+        """API keys of the pool"""
+        return [state.key for state in self.states]
+
+    def __len__(self) -> int:
+        return len(self.states)
+
+    def acquire(self, timeout: float = None) -> ApiKeyState:
+        """Reserve the next available key, waiting until one recovers if every key
+        is throttled. Call release once the request is done.
+
+        :param timeout: float
+            Optional maximum seconds to wait for a key
+        :return: ApiKeyState
+        :raises SystemError if no key recovers within timeout
+        """
+        with self._lock:
+            now = self.clock()
+            state = min(self.states, key=lambda s: (max(s.available_at(), now), s.in_flight,
+                                                    -(s.remaining if s.remaining is not None
+                                                      else float("inf")), s.requests))
+            start = max(state.available_at(), now)
+            if timeout is not None and start - now > timeout:
+                raise SystemError(f"Every API key is throttled for the next {start - now:.1f}s")
+            if self.rate is not None:
+                state.next_slot = start + 1 / self.rate
+            if state.remaining is not None and state.remaining > 0:
+                # Count the request against the window until its response updates it
+                state.remaining -= 1
+            state.in_flight += 1
+            state.requests += 1
+        if start > now:
+            time.sleep(start - now)
+        return state
+
+    def release(self, state: ApiKeyState) -> None:
+        """Return a key reserved by acquire
+
+        :param state: ApiKeyState
+            Key returned by acquire
+        """
+        with self._lock:
+            state.in_flight -= 1
+
+    def headers(self, state: ApiKeyState, headers: Mapping = None) -> Dict:
+        """Request headers with the header of a key, replacing any key already set
+
+        :param state: ApiKeyState
+            Key returned by acquire
+        :param headers: dict
+            Other request headers
+        :return: dict
+        """
+        merged = dict(headers or {})
+        merged[self.header] = state.key
+        return merged
+
+    def update(self, state: ApiKeyState, status_code: int, headers: Mapping) -> None:
+        """Update a key from the status & headers of its response
+
+        :param state: ApiKeyState
+            Key returned by acquire
+        :param status_code: int
+            HTTP status of the response
+        :param headers: Mapping
+            Response headers
+        """
+        headers = {name.lower(): value for name, value in (headers or {}).items()}
+        with self._lock:
+            now = self.clock()
+            limit = _parse_number(headers.get("x-ratelimit-limit"))
+            remaining = _parse_number(headers.get("x-ratelimit-remaining"))
+            reset = _parse_number(headers.get("x-ratelimit-reset"))
+            if limit is not None:
+                state.limit = int(limit)
+            if remaining is not None:
+                state.remaining = int(remaining)
+            if reset is not None:
+                if reset > _EPOCH_THRESHOLD:
+                    reset -= time.time()
+                state.reset_at = now + max(reset, 0.0)
+            elif state.reset_at is not None and state.reset_at <= now:
+                state.reset_at = None
+
+            if status_code == 429:
+                state.throttles += 1
+                state.consecutive_throttles += 1
+                retry_after = _parse_number(headers.get("retry-after"))
+                if retry_after is not None:
+                    state.throttled_until = now + retry_after
+                elif state.reset_at is not None and state.reset_at > now:
+                    state.throttled_until = state.reset_at
+                else:
+                    backoff = min(self.backoff * 2 ** (state.consecutive_throttles - 1), 60.0)
+                    state.throttled_until = now + backoff
+                return
+            state.consecutive_throttles = 0
+            if remaining == 0:
+                # Exhausted keys wait for their window to reset
+                state.throttled_until = state.reset_at if state.reset_at is not None \
+                    else now + self.backoff
+
+    def to_dict(self) -> List[Dict]:
+        """Accounting of every key"""
+        with self._lock:
+            return [state.to_dict() for state in self.states]
+
+
+def _parse_number(value) -> float:
+    """Number of a header value, None if it is missing or malformed"""
+    if value is None:
+        return None
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
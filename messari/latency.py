@@ -0,0 +1,236 @@
+"""This module is dedicated to bounding request latency: connect & read timeouts, a
+deadline shared by every request of a call & hedged requests, which send a duplicate
+of a slow idempotent GET & use whichever response arrives first."""
+
+import collections
+import math
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterator, Tuple, Union
+
+# Threads running hedged requests, shared by every client
+_EXECUTOR = None
+_EXECUTOR_LOCK = threading.Lock()
+
+# Seconds to establish a connection & to wait between bytes of a response
+DEFAULT_TIMEOUT = (3.05, 30.0)
+
+_CONTEXT = threading.local()
+
+
+def current_deadline() -> float:
+    """time.monotonic() value by which the current thread's requests must finish,
+    None if no deadline is set"""
+    return getattr(_CONTEXT, "deadline", None)
+
+
+@contextmanager
+def request_deadline(seconds: float) -> Iterator[float]:
+    """Context manager bounding the total time of every request sent by the current
+    thread, i.e. all the requests of one multi-slug call. Nested deadlines keep the
+    earliest one.
+
+    The deadline shortens the connect & read timeouts of each request when it starts,
+    the read timeout bounds the wait between bytes rather than the whole body. A body
+    trickling in, or a streamed response read after it returns, can outlast it.
+
+    :param seconds: float
+        Seconds from now by which requests must finish
+    """
+    previous = current_deadline()
+    deadline = time.monotonic() + seconds
+    _CONTEXT.deadline = deadline if previous is None else min(previous, deadline)
+    try:
+        yield _CONTEXT.deadline
+    finally:
+        _CONTEXT.deadline = previous
+
+
+def remaining_time() -> float:
+    """Seconds left before the current thread's deadline, None if no deadline is set
+
+    :raises SystemError if the deadline has passed
+    """
+    deadline = current_deadline()
+    if deadline is None:
+        return None
+    remaining = deadline - time.monotonic()
+    if remaining <= 0:
+        raise SystemError("Request deadline exceeded")
+    return remaining
+
+
+def request_timeout(timeout: Union[float, Tuple[float, float]]) -> Tuple[float, float]:
+    """Connect & read timeouts of the next request, shortened to the current
+    thread's deadline
+
+    :param timeout: float, tuple
+        Timeout applied to both phases or (connect, read) timeouts, None for no timeout
+    :return: tuple (connect, read), entries are None when unbounded
+    :raises SystemError if the deadline has passed
+    """
+    connect, read = timeout if isinstance(timeout, tuple) else (timeout, timeout)
+    remaining = remaining_time()
+    if remaining is not None:
+        connect = remaining if connect is None else min(connect, remaining)
+        read = remaining if read is None else min(read, remaining)
+    return connect, read
+
+
+class HedgePolicy:
+    """This class decides when a slow request is duplicated. Latencies of recent
+    responses are kept per host; once min_samples are known, a request still running
+    after the given percentile of them gets a hedge, a second identical request, and
+    the first response of the two is used. Hedges are capped at max_ratio of the
+    requests so a slow API doesn't see its load doubled.
+
+    Only use hedging for idempotent requests (every DataLoader request is a GET).
+
+    Parameters
+    ----------
+       percentile: float
+           Latency percentile after which a hedge is sent. Default is 95.
+       min_samples: int
+           Responses needed before hedging starts. Default is 20.
+       window: int
+           Number of recent latencies kept per host. Default is 200.
+       max_ratio: float
+           Maximum share of requests that get a hedge. Default is 0.1.
+       min_delay: float
+           Minimum seconds before a hedge is sent. Default is 0.01.
+    """
+
+    def __init__(self, percentile: float = 95.0, min_samples: int = 20, window: int = 200,
+                 max_ratio: float = 0.1, min_delay: float = 0.01):
+        if not 0 < percentile < 100:
+            raise ValueError("percentile must be between 0 & 100")
+        self.percentile = percentile
+        self.min_samples = min_samples
+        self.window = window
+        self.max_ratio = max_ratio
+        self.min_delay = min_delay
+        self.requests = 0
+        self.hedges = 0
+        self.hedge_wins = 0
+        self._latencies: Dict[str, collections.deque] = {}
+        self._lock = threading.Lock()
+
+    def record(self, host: str, seconds: float) -> None:
+        """Add the latency of a response
+
+        :param host: str
+            Host of the request
+        :param seconds: float
+            Latency of the response
+        """
+        with self._lock:
+            latencies = self._latencies.get(host)
+            if latencies is None:
+                latencies = self._latencies[host] = collections.deque(maxlen=self.window)
+            latencies.append(seconds)
+
+    def threshold(self, host: str) -> float:
+        """Seconds after which a request to host gets a hedge, None while too few
+        latencies are known
+
+        :param host: str
+            Host of the request
+        """
+        with self._lock:
+            latencies = sorted(self._latencies.get(host, ()))
+        if len(latencies) < self.min_samples:
+            return None
+        # Nearest rank percentile
+        position = max(math.ceil(len(latencies) * self.percentile / 100) - 1, 0)
+        return max(latencies[position], self.min_delay)
+
+    def call(self, send: Callable, host: str, discard: Callable = None,
+             hedge: Callable = None):
+        """Run send, running hedge if the first call is still pending after the host's
+        threshold, & return the first result. A failed call waits for the other one,
+        the error is raised only if both fail.
+
+        :param send: Callable
+            Function sending the request, called from worker threads
+        :param host: str
+            Host of the request
+        :param discard: Callable
+            Optional function receiving the unused result (i.e. to close a response)
+        :param hedge: Callable
+            Optional function sending the duplicate request, i.e. once a rate limiter
+            admits it. Default is send.
+        :return: First result of send or hedge
+        """
+        with self._lock:
+            self.requests += 1
+        executor = _hedge_executor()
+        # Deadlines are thread-local, worker threads take over the caller's deadline
+        deadline = current_deadline()
+
+        def timed(function: Callable) -> Tuple[float, object]:
+            _CONTEXT.deadline = deadline
+            try:
+                start = time.monotonic()
+                result = function()
+                return time.monotonic() - start, result
+            finally:
+                _CONTEXT.deadline = None
+
+        primary = executor.submit(timed, send)
+        pending = {primary}
+        threshold = self.threshold(host)
+        if threshold is not None:
+            remaining = remaining_time()
+            done, _ = wait(pending, timeout=threshold if remaining is None
+                           else min(threshold, remaining))
+            if not done and self._allow_hedge():
+                pending.add(executor.submit(timed, send if hedge is None else hedge))
+
+        error = None
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            winners = [future for future in done if future.exception() is None]
+            if not winners:
+                error = next(iter(done)).exception()
+                continue
+            seconds, result = winners[0].result()
+            self.record(host, seconds)
+            if winners[0] is not primary:
+                with self._lock:
+                    self.hedge_wins += 1
+            if discard is not None:
+                for other in (done | pending) - {winners[0]}:
+                    other.add_done_callback(lambda future: _discard(future, discard))
+            return result
+        raise error
+
+    def _allow_hedge(self) -> bool:
+        """Count a hedge if the hedge budget allows one"""
+        with self._lock:
+            if self.hedges + 1 > self.max_ratio * self.requests:
+                return False
+            self.hedges += 1
+            return True
+
+    def to_dict(self) -> Dict:
+        """Counts of requests, hedges sent & hedges that answered first"""
+        with self._lock:
+            return {"requests": self.requests, "hedges": self.hedges,
+                    "hedge_wins": self.hedge_wins}
+
+
+def _hedge_executor() -> ThreadPoolExecutor:
+    """Shared thread pool of hedged requests, created on first use"""
+    global _EXECUTOR  # pylint: disable=global-statement
+    with _EXECUTOR_LOCK:
+        if _EXECUTOR is None:
+            _EXECUTOR = ThreadPoolExecutor(max_workers=32, thread_name_prefix="messari-hedge")
+        return _EXECUTOR
+
+
+def _discard(future: Future, discard: Callable) -> None:
+    """Hand the result of a call that lost the race to discard"""
+    if future.exception() is None:
+        discard(future.result()[1])
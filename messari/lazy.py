@@ -0,0 +1,48 @@
+"""This module is dedicated to deferring heavy imports (pandas, numpy, requests)
+until they are first used, keeping `import messari` fast for short-lived jobs"""
+
+import importlib
+import threading
+import types
+from typing import List
+
+
+class LazyModule(types.ModuleType):
+    """This class stands in for a module & imports it on first attribute access.
+    Once loaded, the module's attributes are copied over so later lookups are direct.
+
+    Parameters
+    ----------
+       name: str
+           Name of the module to import (i.e. pandas)
+    """
+
+    def __init__(self, name: str):
+        super().__init__(name)
+        self.__dict__['_lazy_lock'] = threading.Lock()
+        self.__dict__['_lazy_module'] = None
+
+    def _load(self) -> types.ModuleType:
+        """Import the module if it isn't loaded yet"""
+        if self.__dict__['_lazy_module'] is None:
+            with self.__dict__['_lazy_lock']:
+                if self.__dict__['_lazy_module'] is None:
+                    module = importlib.import_module(self.__name__)
+                    self.__dict__.update(module.__dict__)
+                    self.__dict__['_lazy_module'] = module
+        return self.__dict__['_lazy_module']
+
+    def __getattr__(self, name: str):
+        return getattr(self._load(), name)
+
+    def __dir__(self) -> List[str]:
+        return dir(self._load())
+
+    def __repr__(self) -> str:
+        state = 'loaded' if self.__dict__['_lazy_module'] is not None else 'not loaded'
+        return f'<lazy module {self.__name__!r} ({state})>'
+
+
+pandas = LazyModule('pandas')
+numpy = LazyModule('numpy')
+requests = LazyModule('requests')
@@ -0,0 +1,443 @@
+"""This module is dedicated to load testing the clients end to end. A local HTTP server
+stands in for the Messari & DeFi Llama APIs with configurable latency, errors & 429s,
+real client methods are driven against it from concurrent callers & throughput &
+latency percentiles are reported as JSON."""
+
+import argparse
+import json
+import math
+import random
+import re
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Dict, List
+
+from messari.key_pool import ApiKeyPool
+from messari.latency import HedgePolicy
+from messari.priority import RequestScheduler
+
+DAY = 86400
+LATENCY_KINDS = ("constant", "uniform", "exponential", "lognormal")
+SCENARIOS = ("asset_metrics", "protocol_tvl")
+
+
+class LatencyDistribution:
+    """This class draws the latency of fake API responses
+
+    Parameters
+    ----------
+       kind: str
+           One of constant, uniform, exponential & lognormal
+       params: float
+           Parameters of the distribution in seconds: constant (value), uniform
+           (low, high), exponential (mean) & lognormal (median, sigma)
+    """
+
+    def __init__(self, kind: str = "constant", /, *params: float):
+        if kind not in LATENCY_KINDS:
+            raise ValueError(f"Unknown latency distribution {kind}, "
+                             f"expected one of {LATENCY_KINDS}")
+        expected = {"constant": 1, "uniform": 2, "exponential": 1, "lognormal": 2}[kind]
+        if len(params) != expected:
+            raise ValueError(f"{kind} latency takes {expected} parameters")
+        self.kind = kind
+        self.params = params
+
+    @classmethod
+    def from_spec(cls, spec: str) -> "LatencyDistribution":
+        """Parse a distribution such as constant:0.01, uniform:0.005:0.05,
+        exponential:0.02 or lognormal:0.02:0.8
+
+        :param spec: str
+            Kind & parameters separated by colons
+        :return: LatencyDistribution
+        :raises ValueError if spec is invalid
+        """
+        kind, *params = spec.split(":")
+        try:
+            return cls(kind, *(float(param) for param in params))
+        except ValueError as e:
+            raise ValueError(f"Invalid latency distribution {spec}: {e}") from e
+
+    def sample(self, rng: random.Random) -> float:
+        """Draw a latency in seconds
+
+        :param rng: random.Random
+            Random number generator
+        """
+        if self.kind == "constant":
+            return self.params[0]
+        if self.kind == "uniform":
+            return rng.uniform(*self.params)
+        if self.kind == "exponential":
+            return rng.expovariate(1 / self.params[0]) if self.params[0] > 0 else 0.0
+        return self.params[0] * rng.lognormvariate(0, self.params[1])
+
+    def to_dict(self) -> Dict:
+        """Kind & parameters of the distribution"""
+        return {"kind": self.kind, "params": list(self.params)}
+
+
+def protocol_payload(slug: str, days: int = 365, chains: int = 2, tokens: int = 5) -> Dict:
+    """Synthetic DeFi Llama /protocol response with daily tvl, tokens & tokensInUsd
+
+    :param slug: str
+        Protocol slug, seeds the values
+    :param days: int
+        Days of history
+    :param chains: int
+        Number of chains
+    :param tokens: int
+        Number of tokens per chain
+    :return: dict
+    """
+    rng = random.Random(slug)
+    start = 1600000000 - 1600000000 % DAY
+    names = [f"TOKEN{i}" for i in range(tokens)]
+
+    def chain_tvl():
+        tvl, amounts, usd = [], [], []
+        for day in range(days):
+            date = start + day * DAY
+            holdings = {name: rng.uniform(1, 1e6) for name in names}
+            tvl.append({"date": date, "totalLiquidityUSD": sum(holdings.values())})
+            amounts.append({"date": date, "tokens": holdings})
+            usd.append({"date": date, "tokens": holdings})
+        return {"tvl": tvl, "tokens": amounts, "tokensInUsd": usd}
+
+    chain_names = [f"Chain{i}" for i in range(chains)]
+    chain_tvls = {name: chain_tvl() for name in chain_names}
+    return {"name": slug, "chains": chain_names, "chainTvls": chain_tvls,
+            **chain_tvls[chain_names[0]]}
+
+
+def asset_metrics_payload(slug: str) -> Dict:
+    """Synthetic Messari /assets/$slug/metrics response
+
+    :param slug: str
+        Asset slug, seeds the values
+    :return: dict
+    """
+    rng = random.Random(slug)
+    return {"status": {"elapsed": 1, "timestamp": "2021-01-01T00:00:00Z"},
+            "data": {"id": slug, "symbol": slug[:4].upper(), "slug": slug,
+                     "market_data": {"price_usd": rng.uniform(0.01, 1e4),
+                                     "volume_last_24_hours": rng.uniform(1e3, 1e9)},
+                     "marketcap": {"current_marketcap_usd": rng.uniform(1e6, 1e11)},
+                     "supply": {"circulating": rng.uniform(1e6, 1e10)}}}
+
+
+# Fake API routes, matched against the path without the /messari or /llama prefix
+ROUTES = [
+    (re.compile(r"^/messari/api/v1/assets/([^/]+)/metrics$"), asset_metrics_payload),
+    (re.compile(r"^/llama/protocol/([^/]+)$"), protocol_payload),
+]
+
+
+class FakeApiServer:
+    """This class runs a local HTTP server standing in for the Messari & DeFi Llama
+    APIs. Every response waits for a latency drawn from a LatencyDistribution, then
+    fails with 500 at error_rate, is throttled with 429 at throttle_rate or returns a
+    synthetic payload. Payloads are built once per slug & reused.
+
+    Use as a context manager, clients are pointed at it with base_url_overrides().
+
+    Parameters
+    ----------
+       latency: LatencyDistribution
+           Latency of responses. Default is no latency.
+       error_rate: float
+           Share of requests answered with 500. Default is 0.
+       throttle_rate: float
+           Share of requests answered with 429. Default is 0.
+       retry_after: float
+           Retry-After seconds of 429 responses. Default is 0.1.
+       seed: int
+           Optional seed of latencies & failures
+    """
+
+    def __init__(self, latency: LatencyDistribution = None, error_rate: float = 0.0,
+                 throttle_rate: float = 0.0, retry_after: float = 0.1, seed: int = None):
+        self.latency = latency or LatencyDistribution("constant", 0.0)
+        self.error_rate = error_rate
+        self.throttle_rate = throttle_rate
+        self.retry_after = retry_after
+        self.status_counts: Dict[int, int] = {}
+        self._rng = random.Random(seed)
+        self._payloads: Dict[str, bytes] = {}
+        self._lock = threading.Lock()
+        self._server = None
+        self._thread = None
+
+    @property
+    def url(self) -> str:
+        """Base URL of the running server"""
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def base_url_overrides(self) -> Dict[str, str]:
+        """base_url_overrides pointing both APIs at the server"""
+        return {"https://data.messari.io": f"{self.url}/messari",
+                "https://api.llama.fi": f"{self.url}/llama"}
+
+    def start(self) -> "FakeApiServer":
+        """Start serving on a free local port"""
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            """Request handler of the fake API"""
+            protocol_version = "HTTP/1.1"
+            # Headers & body go out in one write, so delayed ACKs don't add latency
+            wbufsize = -1
+            disable_nagle_algorithm = True
+
+            def do_GET(self):  # pylint: disable=invalid-name
+                status, body, headers = fake.respond(self.path.split("?", 1)[0])
+                self.send_response(status)
+                for name, value in headers.items():
+                    self.send_header(name, value)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):  # pylint: disable=arguments-differ
+                pass
+
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self._server.daemon_threads = True
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        """Stop the server"""
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+    def __enter__(self) -> "FakeApiServer":
+        return self.start()
+
+    def __exit__(self, *exc) -> None:
+        self.stop()
+
+    def respond(self, path: str):
+        """Status, body & headers of the response to path, after its latency"""
+        with self._lock:
+            latency = self.latency.sample(self._rng)
+            draw = self._rng.random()
+        time.sleep(latency)
+        headers = {}
+        if draw < self.error_rate:
+            status, body = 500, b'{"error": "internal error"}'
+        elif draw < self.error_rate + self.throttle_rate:
+            status, body = 429, b'{"error": "too many requests"}'
+            headers = {"Retry-After": str(self.retry_after), "x-ratelimit-remaining": "0"}
+        else:
+            status, body = self._payload(path)
+        with self._lock:
+            self.status_counts[status] = self.status_counts.get(status, 0) + 1
+        return status, body, headers
+
+    def _payload(self, path: str):
+        """Status & cached body of a successful response"""
+        with self._lock:
+            body = self._payloads.get(path)
+        if body is not None:
+            return 200, body
+        for pattern, build in ROUTES:
+            match = pattern.match(path)
+            if match:
+                body = json.dumps(build(match.group(1))).encode()
+                with self._lock:
+                    self._payloads[path] = body
+                return 200, body
+        return 404, b'{"error": "not found"}'
+
+    def reset_counts(self) -> None:
+        """Clear the status counts"""
+        with self._lock:
+            self.status_counts = {}
+
+
+def percentiles(values: List[float]) -> Dict:
+    """p50, p90, p99 & max of latencies in milliseconds, nearest rank
+
+    :param values: list
+        Latencies in seconds
+    :return: dict, empty if values is empty
+    """
+    if not values:
+        return {}
+    ordered = sorted(values)
+
+    def rank(percentile):
+        return ordered[max(math.ceil(len(ordered) * percentile / 100) - 1, 0)] * 1000
+
+    return {"p50_ms": rank(50), "p90_ms": rank(90), "p99_ms": rank(99),
+            "max_ms": ordered[-1] * 1000}
+
+
+def run_scenario(name: str, client, call: Callable, server: FakeApiServer,
+                 *, concurrency: int = 4, calls: int = 8) -> Dict:
+    """Run call concurrently & measure it
+
+    :param name: str
+        Scenario name
+    :param client: DataLoader
+        Client used by call, its response latencies are measured
+    :param call: Callable
+        Function making one client call
+    :param server: FakeApiServer
+        Server the client sends requests to
+    :param concurrency: int
+        Number of concurrent callers
+    :param calls: int
+        Total number of calls
+    :return: dict report of the scenario
+    """
+    call_latencies, request_latencies, errors = [], [], {}
+    lock = threading.Lock()
+    remaining = iter(range(calls))
+
+    def record_response(response, *args, **kwargs):  # pylint: disable=unused-argument
+        with lock:
+            request_latencies.append(response.elapsed.total_seconds())
+
+    def caller():
+        while True:
+            with lock:
+                if next(remaining, None) is None:
+                    return
+            start = time.perf_counter()
+            try:
+                call()
+            except Exception as e:  # pylint: disable=broad-except
+                with lock:
+                    errors[type(e).__name__] = errors.get(type(e).__name__, 0) + 1
+                continue
+            with lock:
+                call_latencies.append(time.perf_counter() - start)
+
+    client.session.hooks["response"].append(record_response)
+    server.reset_counts()
+    threads = [threading.Thread(target=caller) for _ in range(concurrency)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+    client.session.hooks["response"].remove(record_response)
+
+    report = {"scenario": name, "concurrency": concurrency, "calls": calls,
+              "succeeded": len(call_latencies), "errors": errors,
+              "seconds": elapsed, "calls_per_second": len(call_latencies) / elapsed,
+              "requests": len(request_latencies),
+              "requests_per_second": len(request_latencies) / elapsed,
+              "status_counts": {str(status): count for status, count
+                                in sorted(server.status_counts.items())},
+              "call_latency": percentiles(call_latencies),
+              "request_latency": percentiles(request_latencies)}
+    if getattr(client, "hedging", None) is not None:
+        report["hedging"] = client.hedging.to_dict()
+    if getattr(client, "key_pool", None) is not None:
+        report["keys"] = client.key_pool.to_dict()
+    return report
+
+
+def build_clients(server: FakeApiServer, args: argparse.Namespace) -> Dict:
+    """Messari & DeFi Llama clients sending requests to server"""
+    # pylint: disable=import-outside-toplevel
+    from messari.defillama import DeFiLlama
+    from messari.messari import Messari
+    options = {"base_url_overrides": server.base_url_overrides(), "timeout": args.timeout}
+    if args.rate_limit:
+        options["scheduler"] = RequestScheduler(args.rate_limit, burst=args.concurrency)
+    api_key = ApiKeyPool([f"key-{i}" for i in range(args.keys)]) if args.keys > 1 \
+        else "key-0"
+    # Each client tracks the latencies of its own API
+    return {"messari": Messari(api_key=api_key, hedging=hedge_policy(args), **options),
+            "defillama": DeFiLlama(hedging=hedge_policy(args), **options)}
+
+
+def hedge_policy(args: argparse.Namespace) -> HedgePolicy:
+    """Hedging policy of a client, None unless --hedge is set"""
+    return HedgePolicy(percentile=args.hedge) if args.hedge else None
+
+
+def scenarios(clients: Dict, args: argparse.Namespace) -> Dict[str, tuple]:
+    """Client & call of each scenario"""
+    assets = [f"asset-{i}" for i in range(args.assets)]
+    protocols = [f"protocol-{i}" for i in range(args.protocols)]
+    return {
+        "asset_metrics": (clients["messari"],
+                          lambda: clients["messari"].get_asset_metrics(assets)),
+        "protocol_tvl": (clients["defillama"],
+                         lambda: clients["defillama"].get_protocol_tvl_timeseries(protocols)),
+    }
+
+
+def parse_args(argv: List[str] = None) -> argparse.Namespace:
+    """Parse messari-loadtest command line arguments"""
+    parser = argparse.ArgumentParser(
+        prog="messari-loadtest",
+        description="Load test the clients against a local Messari & DeFi Llama stand-in")
+    parser.add_argument("--scenarios", nargs="+", choices=SCENARIOS, default=list(SCENARIOS))
+    parser.add_argument("--assets", type=int, default=500,
+                        help="asset slugs per get_asset_metrics call")
+    parser.add_argument("--protocols", type=int, default=50,
+                        help="protocols per get_protocol_tvl_timeseries call")
+    parser.add_argument("--concurrency", type=int, default=4, help="concurrent callers")
+    parser.add_argument("--calls", type=int, default=8, help="calls per scenario")
+    parser.add_argument("--latency", type=LatencyDistribution.from_spec,
+                        default=LatencyDistribution("lognormal", 0.005, 0.8),
+                        help="response latency, i.e. constant:0.01 or lognormal:0.02:0.8")
+    parser.add_argument("--error-rate", type=float, default=0.0,
+                        help="share of requests answered with 500")
+    parser.add_argument("--throttle-rate", type=float, default=0.0,
+                        help="share of requests answered with 429")
+    parser.add_argument("--keys", type=int, default=1, help="Messari API keys in the pool")
+    parser.add_argument("--rate-limit", type=float, help="client requests per second")
+    parser.add_argument("--hedge", type=float, help="hedge requests after this percentile")
+    parser.add_argument("--timeout", type=float, default=10.0, help="request timeout")
+    parser.add_argument("--seed", type=int, default=0, help="seed of latencies & failures")
+    parser.add_argument("-o", "--output", help="JSON report file, default is stdout")
+    return parser.parse_args(argv)
+
+
+def main(argv: List[str] = None) -> int:
+    """Entry point of the messari-loadtest console script
+
+    :param argv: list
+        Command line arguments, default is sys.argv
+    :return: Exit code
+    """
+    args = parse_args(argv)
+    with FakeApiServer(args.latency, error_rate=args.error_rate,
+                       throttle_rate=args.throttle_rate, seed=args.seed) as server:
+        clients = build_clients(server, args)
+        available = scenarios(clients, args)
+        results = [run_scenario(name, *available[name], server, concurrency=args.concurrency,
+                                calls=args.calls)
+                   for name in args.scenarios]
+    report = {"config": {"latency": args.latency.to_dict(), "error_rate": args.error_rate,
+                         "throttle_rate": args.throttle_rate, "keys": args.keys,
+                         "rate_limit": args.rate_limit, "hedge": args.hedge,
+                         "assets": args.assets, "protocols": args.protocols},
+              "scenarios": results}
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as outfile:
+            json.dump(report, outfile, indent=2)
+    else:
+        json.dump(report, sys.stdout, indent=2)
+        print()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
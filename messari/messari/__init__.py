@@ -1,4 +1,22 @@
 """Module to handle initialization, imports, for Messari class"""
 
+# Names in __all__ are resolved by the module level __getattr__ (PEP 562)
+# pylint: disable=undefined-all-variable,invalid-name
 
-from .messari import *
+import importlib
+
+__all__ = ['Messari']
+
+
+def __getattr__(name: str):
+    # Import the client module on first use so importing the package stays cheap,
+    # any public name of it is still reachable from the package
+    if not name.startswith('_'):
+        module = importlib.import_module('.messari', __name__)
+        if hasattr(module, name):
+            return getattr(module, name)
+    raise AttributeError(f'module {__name__!r} has no attribute {name!r}')
+
+
+def __dir__():
+    return sorted(list(globals()) + __all__)
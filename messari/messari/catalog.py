@@ -0,0 +1,229 @@
+"""This module is dedicated to the local catalog of Messari metrics, profile sections
+and timeseries metric IDs used to validate requests before they hit the network"""
+
+import copy
+import datetime
+import json
+import logging
+import os
+from typing import Union, List, Dict
+
+CATALOG_FILENAME = 'messari_metrics.json'
+CATALOG_PATH = os.path.join(os.path.dirname(__file__), '..', 'mappings', CATALOG_FILENAME)
+
+
+def _parse_time(time_input: Union[str, datetime.date, datetime.datetime]) -> \
+        Union[datetime.datetime, None]:
+    """Best effort conversion of a start/end argument to datetime.datetime.
+
+    :param time_input: str, datetime.date, datetime.datetime
+        ISO formatted string ("YYYY-MM-DD" or "YYYY-MM-DDTHH:MM:SS") or date object
+    :return datetime.datetime, or None if input can't be parsed locally
+    """
+    if isinstance(time_input, datetime.datetime):
+        return time_input.replace(tzinfo=None)
+    if isinstance(time_input, datetime.date):
+        return datetime.datetime.combine(time_input, datetime.time())
+    if isinstance(time_input, str):
+        try:
+            return datetime.datetime.fromisoformat(time_input.rstrip('Z')).replace(tzinfo=None)
+        except ValueError:
+            return None
+    return None
+
+
+def _infer_aggregation(description: str) -> Union[str, None]:
+    """Guess how a metric should be rolled up to coarser intervals from its description.
+
+    :param description: str
+        Metric description returned by the API
+    :return Aggregation name ('sum', 'mean' or 'last'), None if the metric can't be
+        rolled up (distinct counts & medians)
+    """
+    description = (description or '').lower()
+    # Distinct counts aren't additive across buckets & medians of medians aren't medians
+    if 'unique' in description or 'distinct' in description or 'median' in description:
+        return None
+    # Means are also described over 'that interval', so they are matched first
+    if 'mean' in description or 'average' in description:
+        return 'mean'
+    if description.startswith('the sum') or 'that interval' in description:
+        return 'sum'
+    return 'last'
+
+
+def _reject(message: str, strict: bool) -> None:
+    """Raise ValueError with message, or only log it as a warning if not strict"""
+    if strict:
+        raise ValueError(message)
+    logging.warning('%s The request is sent anyway and may fail.', message)
+
+
+class MetricCatalog:
+    """This class is a machine-readable catalog of the fields, metrics and intervals
+    supported by the Messari API. Validation can be made non strict to let fields &
+    metrics added to the API after the catalog was refreshed through with a warning.
+    """
+
+    def __init__(self, catalog_dict: Dict):
+        self.catalog_dict = catalog_dict
+        self.asset_fields = frozenset(catalog_dict['asset_fields'])
+        self.asset_metrics = frozenset(catalog_dict['asset_metrics'])
+        self.profile_metrics = frozenset(catalog_dict['profile_metrics'])
+        self.intervals = dict(catalog_dict['intervals'])
+        self.max_points = int(catalog_dict['max_points'])
+        self.timeseries_metrics = dict(catalog_dict['timeseries_metrics'])
+
+    @classmethod
+    def from_file(cls, path: str = CATALOG_PATH) -> 'MetricCatalog':
+        """Load catalog from a JSON file
+
+        :param path: str
+            Path to catalog JSON, defaults to the packaged catalog
+        :return MetricCatalog
+        """
+        with open(path, 'r', encoding='utf-8') as file:
+            return cls(json.load(file))
+
+    def to_file(self, path: str = CATALOG_PATH) -> None:
+        """Write catalog to a JSON file
+
+        :param path: str
+            Path to catalog JSON, defaults to the packaged catalog
+        """
+        with open(path, 'w', encoding='utf-8') as file:
+            json.dump(self.catalog_dict, file, indent=4)
+
+    def updated_from_response(self, response: Dict) -> 'MetricCatalog':
+        """Return a new catalog with timeseries metrics taken from the
+        /assets/metrics API response. Known aggregations are preserved.
+
+        :param response: dict
+            JSON response of the metrics listing endpoint
+        :return MetricCatalog
+        """
+        catalog_dict = copy.deepcopy(self.catalog_dict)
+        metrics = {}
+        for metric in response['data']['metrics']:
+            metric_id = metric['metric_id']
+            known = self.timeseries_metrics.get(metric_id)
+            if known:
+                metrics[metric_id] = known
+            else:
+                metrics[metric_id] = {
+                    'aggregation': _infer_aggregation(metric.get('description'))}
+        catalog_dict['timeseries_metrics'] = metrics
+        return MetricCatalog(catalog_dict)
+
+    def aggregation(self, asset_metric: str) -> Union[str, Dict, None]:
+        """Aggregation used to roll up a timeseries metric to a coarser interval.
+
+        :param asset_metric: str
+            Timeseries metric ID
+        :return Aggregation name or dictionary of aggregation name keyed by column,
+            None if the metric can't be rolled up (i.e. distinct counts & medians)
+        """
+        metric = self.timeseries_metrics.get(asset_metric, {})
+        return metric.get('aggregation', 'last')
+
+    def validate_asset_fields(self, asset_fields: List, strict: bool = True) -> None:
+        """Check every asset field is supported.
+
+        :param asset_fields: list
+            List of asset fields
+        :param strict: bool
+            Raise for fields missing from the catalog, otherwise log a warning. Default is True.
+        :raises ValueError if a field is not in the catalog
+        """
+        invalid = [field for field in asset_fields if field not in self.asset_fields]
+        if invalid:
+            _reject(f'Unsupported asset field(s) {invalid}. '
+                    f'Available fields include: {sorted(self.asset_fields)}', strict)
+
+    def validate_asset_metric(self, asset_metric: str, strict: bool = True) -> None:
+        """Check asset metric is supported.
+
+        :param asset_metric: str
+            Single metric string
+        :param strict: bool
+            Raise for metrics missing from the catalog, otherwise log a warning. Default is True.
+        :raises ValueError if metric is not in the catalog
+        """
+        if asset_metric not in self.asset_metrics:
+            _reject(f'Unsupported asset metric {asset_metric!r}. '
+                    f'Available metrics include: {sorted(self.asset_metrics)}', strict)
+
+    def validate_profile_metric(self, asset_profile_metric: str, strict: bool = True) -> None:
+        """Check asset profile metric is supported.
+
+        :param asset_profile_metric: str
+            Single profile metric string
+        :param strict: bool
+            Raise for metrics missing from the catalog, otherwise log a warning. Default is True.
+        :raises ValueError if profile metric is not in the catalog
+        """
+        if asset_profile_metric not in self.profile_metrics:
+            _reject(f'Unsupported profile metric {asset_profile_metric!r}. '
+                    f'Available metrics include: {sorted(self.profile_metrics)}', strict)
+
+    def validate_timeseries(self, asset_metric: str, interval: str,
+                            start: Union[str, datetime.datetime] = None,
+                            end: Union[str, datetime.datetime] = None,
+                            strict: bool = True) -> None:
+        """Check timeseries metric and interval are supported and that the
+        requested range doesn't exceed the maximum number of points per request.
+
+        :param asset_metric: str
+            Timeseries metric ID
+        :param interval: str
+            Interval of timeseries data
+        :param start: str, datetime.datetime
+            Optional starting date
+        :param end: str, datetime.datetime
+            Optional ending date
+        :param strict: bool
+            Raise for metrics missing from the catalog, otherwise log a warning. Unsupported
+            intervals & ranges always raise. Default is True.
+        :raises ValueError if the request can't be served by the API
+        """
+        if asset_metric not in self.timeseries_metrics:
+            _reject(f'Unsupported timeseries metric {asset_metric!r}. '
+                    f'Available metrics include: {sorted(self.timeseries_metrics)}', strict)
+        if interval not in self.intervals:
+            raise ValueError(f'Unsupported interval {interval!r}. '
+                             f'Interval options include: {list(self.intervals)}')
+        if start and end:
+            start_time, end_time = _parse_time(start), _parse_time(end)
+            if start_time is None or end_time is None:
+                return
+            if end_time < start_time:
+                raise ValueError('End date must be after start date')
+            points = (end_time - start_time).total_seconds() // self.intervals[interval] + 1
+            if points > self.max_points:
+                raise ValueError(f'Requested range spans {int(points)} points at interval '
+                                 f'{interval}, at most {self.max_points} can be returned. '
+                                 f'Reduce the date range or use a coarser interval.')
+
+
+_CATALOG = None
+
+
+def get_catalog() -> MetricCatalog:
+    """Return the process-wide catalog, loading the packaged file on first use.
+
+    :return MetricCatalog
+    """
+    global _CATALOG  # pylint: disable=global-statement
+    if _CATALOG is None:
+        _CATALOG = MetricCatalog.from_file()
+    return _CATALOG
+
+
+def set_catalog(catalog: MetricCatalog) -> None:
+    """Replace the process-wide catalog.
+
+    :param catalog: MetricCatalog
+        New catalog
+    """
+    global _CATALOG  # pylint: disable=global-statement
+    _CATALOG = catalog
@@ -1,11 +1,16 @@
 """This module is dedicated to helpers for the Messari class"""
 
+from __future__ import annotations
 
+
+import json
 import logging
-from typing import Union, List, Dict
-import pandas as pd
+from typing import Union, List, Dict, Tuple
+from messari.lazy import numpy as np
+from messari.lazy import pandas as pd
 
-from messari.utils import validate_input, validate_asset_fields_list_order, find_and_update_asset_field
+from messari.utils import validate_input, validate_asset_fields_list_order, \
+    find_and_update_asset_field, time_window, convert_flatten
 
 
 def fields_payload(asset_fields: Union[str, List],
@@ -43,25 +48,82 @@ def fields_payload(asset_fields: Union[str, List],
     return ','.join(asset_fields)
 
 
-def timeseries_to_dataframe(response: Dict) -> pd.DataFrame:
+def timeseries_to_dataframe(response: Dict, start: str = None, end: str = None) -> pd.DataFrame:
     """Convert timeseries data to pandas dataframe
 
     :param response: dict
         Dictionary of asset time series data keyed by symbol
+    :param start: str
+        Optional inclusive start, points before it are dropped before building the DataFrame
+    :param end: str
+        Optional inclusive end, points after it are dropped before building the DataFrame
     :return: pandas dataframe
     """
     df_list, key_list = [], []
     for key, value in response.items():
-        key_list.append(key)
         if isinstance(value['values'], list):
             df_columns=[f'{name}' for name in value['parameters_columns']]
-            values_df = pd.DataFrame.from_records(value['values'], columns=df_columns)
+            records = value['values']
+            if start or end:
+                position = df_columns.index('timestamp')
+                timestamps = np.fromiter((record[position] for record in records),
+                                         dtype=np.int64, count=len(records))
+                records = [records[i] for i in time_window(timestamps, start, end, unit='ms')]
+            values_df = pd.DataFrame.from_records(records, columns=df_columns)
             values_df.set_index('timestamp', inplace=True)
             values_df.index = pd.to_datetime(values_df.index, unit='ms', origin='unix')  # noqa
             df_list.append(values_df)
+            key_list.append(key)
         else:
             logging.warning('Missing timeseries data for %s', key)
             continue
     # Create multindex DataFrame using list of dataframes & keys
     metric_data_df = pd.concat(df_list, keys=key_list, axis=1)
     return metric_data_df
+
+
+def timeseries_block(content: bytes, start: str = None, end: str = None) -> \
+        Union[Tuple[np.ndarray, List[str], np.ndarray], None]:
+    """Decode a timeseries response body into NumPy arrays, run in worker processes
+    so decoding & conversion leave the calling process
+
+    :param content: bytes
+        Undecoded timeseries response
+    :param start: str
+        Optional inclusive start, points before it are dropped
+    :param end: str
+        Optional inclusive end, points after it are dropped
+    :return: Tuple of ms timestamps, value columns & values, None if data is missing
+    """
+    data = convert_flatten(json.loads(content)['data'])
+    if not isinstance(data['values'], list):
+        return None
+    columns = [f'{name}' for name in data['parameters_columns']]
+    position = columns.index('timestamp')
+    records = np.array(data['values'], dtype=np.float64).reshape(-1, len(columns))
+    timestamps = records[:, position].astype(np.int64)
+    if start or end:
+        rows = time_window(timestamps, start, end, unit='ms')
+        records, timestamps = records[rows], timestamps[rows]
+    return timestamps, columns[:position] + columns[position + 1:], \
+        np.delete(records, position, axis=1)
+
+
+def blocks_to_dataframe(blocks: Dict) -> pd.DataFrame:
+    """Build the DataFrame of timeseries_to_dataframe from timeseries_block blocks
+
+    :param blocks: dict
+        Dictionary of timeseries_block results keyed by symbol
+    :return: pandas dataframe
+    """
+    df_list, key_list = [], []
+    for key, block in blocks.items():
+        if block is None:
+            logging.warning('Missing timeseries data for %s', key)
+            continue
+        timestamps, columns, values = block
+        index = pd.to_datetime(timestamps, unit='ms', origin='unix').rename('timestamp')
+        df_list.append(pd.DataFrame(values, index=index, columns=columns))
+        key_list.append(key)
+    # Create multindex DataFrame using list of dataframes & keys
+    return pd.concat(df_list, keys=key_list, axis=1)
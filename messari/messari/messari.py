@@ -1,26 +1,122 @@
 """This module is meant to contain the Messari class"""
 
+from __future__ import annotations
+
+import logging
 from string import Template
-from typing import Union, List, Dict
-import pandas as pd
+from typing import Union, List, Dict, Tuple
+from messari.lazy import pandas as pd
 
+from messari.cache import (STATIC_POLICY, TIMESERIES_POLICY, LISTING_POLICY, MARKET_POLICY,
+                           resolve_cache_policies)
+from messari.cache_backends import CacheBackend
 from messari.dataloader import DataLoader
+from messari.frame_cache import ArrowFrameCache
+from messari.key_pool import ApiKeyPool
+from messari.latency import DEFAULT_TIMEOUT, HedgePolicy
+from messari.parallel import get_process_pool
+from messari.priority import RequestScheduler
 from messari.utils import validate_input, convert_flatten, unpack_list_of_dicts
-from .helpers import fields_payload, timeseries_to_dataframe
+from .helpers import fields_payload, timeseries_to_dataframe, timeseries_block, \
+    blocks_to_dataframe
+from .catalog import get_catalog, set_catalog
+from .pyramid import TimeseriesPyramid
+from .streaming import MarketStream
 
 BASE_URL = 'https://data.messari.io/api/v1/assets'
 BASE_URL_V1 = 'https://data.messari.io/api/v1/assets'
 BASE_URL_V2 = 'https://data.messari.io/api/v2/assets'
 BASE_URL_MARKETS = 'https://data.messari.io/api/v1/markets'
+BASE_URL_METRICS = 'https://data.messari.io/api/v1/assets/metrics'
+
+# Default cache policies keyed by method, used when caching is enabled
+MESSARI_CACHE_POLICIES = {
+    'get_all_markets': LISTING_POLICY,
+    'get_all_assets': LISTING_POLICY,
+    'get_asset': STATIC_POLICY,
+    'get_asset_profile': STATIC_POLICY,
+    'get_asset_metrics': MARKET_POLICY,
+    'get_asset_market_data': MARKET_POLICY,
+    'get_metric_timeseries': TIMESERIES_POLICY,
+}
 
 
 class Messari(DataLoader):
     """This class is a wrapper around the Messari API
+
+    Parameters
+    ----------
+       api_key: str, list, ApiKeyPool
+           Optional Messari API key, or several keys to rotate requests across,
+           each with its own rate limit & quota tracked from response headers
+       use_cache: bool
+           Cache responses using the default policy of each method. Default is False.
+       cache_policies: dict
+           CachePolicy overrides keyed by method name (i.e. get_asset_profile)
+       frame_cache: ArrowFrameCache, str
+           Optional Arrow frame cache, or its directory, storing timeseries DataFrames
+           where every worker process on a node can memory map them. Requires pyarrow.
+       cache_backend: CacheBackend
+           Optional storage of the response cache, i.e. a SQLiteBackend or RedisBackend
+           shared with other processes or nodes. Default is in-process memory.
+       scheduler: RequestScheduler
+           Optional rate budget shared by the client's requests, admitting them by the
+           priority class set with messari.priority.request_priority
+       timeout: float, tuple
+           Seconds to connect & to wait for response data, a (connect, read) tuple or
+           a float for both. Default is DEFAULT_TIMEOUT. Calls made within
+           messari.latency.request_deadline also stop at the deadline.
+       hedging: HedgePolicy
+           Optional policy duplicating requests slower than a latency percentile
+       base_url_overrides: dict
+           Replacement URL prefixes keyed by the prefix they replace, i.e. to send
+           requests to a local API stand-in
+       strict: bool
+           Reject fields & metrics missing from the metric catalog before any request.
+           False only logs a warning, i.e. for metrics added to the API after the catalog
+           was refreshed. Default is True.
     """
-    def __init__(self, api_key=None):
+    def __init__(self, api_key: Union[str, List[str], ApiKeyPool] = None,
+                 use_cache: bool = False, cache_policies: Dict = None,
+                 frame_cache: Union[ArrowFrameCache, str] = None,
+                 cache_backend: CacheBackend = None, scheduler: RequestScheduler = None,
+                 timeout: Union[float, Tuple[float, float]] = DEFAULT_TIMEOUT,
+                 hedging: HedgePolicy = None, base_url_overrides: Dict[str, str] = None,
+                 strict: bool = True):
+        key_pool = None
+        if isinstance(api_key, (list, tuple)):
+            key_pool = ApiKeyPool(api_key)
+        elif isinstance(api_key, ApiKeyPool):
+            key_pool = api_key
+        if key_pool is not None:
+            # Single key consumers (i.e. market_stream) use the first key of the pool
+            api_key = key_pool.keys[0]
         messari_api_key = {'x-messari-api-key': api_key}
-        DataLoader.__init__(self, api_dict=messari_api_key, taxonomy_dict=None)
+        policies = resolve_cache_policies(MESSARI_CACHE_POLICIES, use_cache, cache_policies)
+        DataLoader.__init__(self, api_dict=messari_api_key, taxonomy_dict=None,
+                            cache_policies=policies, frame_cache=frame_cache,
+                            cache_backend=cache_backend, scheduler=scheduler,
+                            timeout=timeout, hedging=hedging,
+                            base_url_overrides=base_url_overrides, key_pool=key_pool)
         # TODO, look into super() for __init__
+        self.catalog = get_catalog()
+        self.pyramid = TimeseriesPyramid(self.catalog)
+        self.strict = strict
+
+    def refresh_catalog(self, save: bool = False) -> None:
+        """Refresh the local metric catalog from the API.
+
+        Parameters
+        ----------
+            save: bool
+                Persist the refreshed catalog to the packaged JSON file. Default is False.
+        """
+        response = self.get_response(BASE_URL_METRICS, headers=self.api_dict)
+        self.catalog = self.catalog.updated_from_response(response)
+        self.pyramid.catalog = self.catalog
+        set_catalog(self.catalog)
+        if save:
+            self.catalog.to_file()
 
     #######################
     # markets
@@ -45,11 +141,32 @@ class Messari(DataLoader):
                 List of dictionaries or pandas DataFrame of markets indexed by exchange slug.
         """
         payload = {'page': page, 'limit': limit}
-        response_data = self.get_response(BASE_URL_MARKETS, params=payload, headers=self.api_dict)
+        response_data = self.get_response(BASE_URL_MARKETS, params=payload, headers=self.api_dict,
+                                          cache_policy='get_all_markets')
         if to_dataframe:
             return pd.DataFrame(response_data['data']).set_index('exchange_slug')
         return response_data['data']
 
+    def stream_markets(self, url: str, markets: Union[str, List], **kwargs) -> MarketStream:
+        """Create a real-time trades & quotes stream for markets listed by get_all_markets.
+
+        Parameters
+        ----------
+            url: str
+                WebSocket URL of the real-time market data API.
+            markets: str, list
+                Single market or list of markets.
+            kwargs:
+                Additional MarketStream options (capacity, backfill, connection_factory...).
+
+        Returns
+        -------
+            MarketStream
+                Stream storing trades & quotes in ring buffers, call start() to connect.
+        """
+        return MarketStream(url, markets, api_key=self.api_dict.get('x-messari-api-key'),
+                            **kwargs)
+
     #######################
     # assets
     #######################
@@ -124,6 +241,13 @@ class Messari(DataLoader):
             dict, DataFrame
                 Dictionary or pandas DataFrame of asset data.
         """
+        if asset_fields:
+            self.catalog.validate_asset_fields(validate_input(asset_fields), strict=self.strict)
+        if asset_metric:
+            self.catalog.validate_asset_metric(asset_metric, strict=self.strict)
+        if asset_profile_metric:
+            self.catalog.validate_profile_metric(asset_profile_metric, strict=self.strict)
+
         payload = {'page': page, 'limit': limit}
         if asset_fields:
             payload['fields'] = fields_payload(asset_fields=asset_fields, asset_metric=asset_metric,
@@ -153,12 +277,14 @@ class Messari(DataLoader):
                 raise ValueError(
                     'Only asset metrics can be returned as DataFrame. Make sure only '
                     'metrics is specified in asset fields.')
-            response_data = self.get_response(BASE_URL_V2, params=payload, headers=self.api_dict)
+            response_data = self.get_response(BASE_URL_V2, params=payload, headers=self.api_dict,
+                                              cache_policy='get_all_assets')
             response_data = unpack_list_of_dicts(response_data['data'])
             for key, value in response_data.items():
                 response_data[key] = convert_flatten(value)
             return pd.DataFrame.from_dict(response_data, orient='index')
-        response_data = self.get_response(BASE_URL_V2, params=payload, headers=self.api_dict)
+        response_data = self.get_response(BASE_URL_V2, params=payload, headers=self.api_dict,
+                                          cache_policy='get_all_assets')
         return unpack_list_of_dicts(response_data['data'])
 
     def get_asset(self, asset_slugs: Union[str, List], asset_fields: Union[str, List] = None,
@@ -194,7 +320,8 @@ class Messari(DataLoader):
         response_data = {}
         for asset in asset_slugs:
             url = base_url_template.substitute(asset_key=asset)
-            response = self.get_response(url, params=payload, headers=self.api_dict)
+            response = self.get_response(url, params=payload, headers=self.api_dict,
+                                         cache_policy='get_asset')
             response_flat = convert_flatten(response['data'])
             response_data[asset] = response_flat
 
@@ -234,13 +361,15 @@ class Messari(DataLoader):
         asset_slugs = validate_input(asset_slugs)
         payload = {}
         if asset_profile_metric:
+            self.catalog.validate_profile_metric(asset_profile_metric, strict=self.strict)
             payload['fields'] = fields_payload(asset_fields='id',
                                                asset_profile_metric=asset_profile_metric)
         base_url_template = Template(f'{BASE_URL_V2}/$asset_key/profile')
         response_data = {}
         for asset in asset_slugs:
             url = base_url_template.substitute(asset_key=asset)
-            response = self.get_response(url, params=payload, headers=self.api_dict)
+            response = self.get_response(url, params=payload, headers=self.api_dict,
+                                         cache_policy='get_asset_profile')
             response_flat = convert_flatten(response['data'])
             response_data[asset] = response_flat
         return response_data
@@ -290,15 +419,20 @@ class Messari(DataLoader):
         asset_slugs = validate_input(asset_slugs)
         payload = {}
         if asset_metric:
+            self.catalog.validate_asset_metric(asset_metric, strict=self.strict)
             # Using fields payload function will work once API is fixed.
             # See inconsistent API usage example note.
             # payload['fields'] = fields_payload(asset_fields='id', asset_metric=asset_metric)
             payload['fields'] = f'id,symbol,{asset_metric}'
         base_url_template = Template(f'{BASE_URL_V1}/$asset_key/metrics')
+        # Market data changes far more often than other metrics
+        cache_policy = 'get_asset_market_data' if asset_metric == 'market_data' \
+            else 'get_asset_metrics'
         response_data = {}
         for asset in asset_slugs:
             url = base_url_template.substitute(asset_key=asset)
-            response = self.get_response(url, params=payload, headers=self.api_dict)
+            response = self.get_response(url, params=payload, headers=self.api_dict,
+                                         cache_policy=cache_policy)
             response_flat = convert_flatten(response['data'])
             response_data[asset] = response_flat
         if to_dataframe:
@@ -329,7 +463,8 @@ class Messari(DataLoader):
     ##############################
     def get_metric_timeseries(self, asset_slugs: Union[str, List], asset_metric: str,
                               start: str = None, end: str = None, interval: str = '1d',
-                              to_dataframe: bool = True) -> Union[Dict, pd.DataFrame]:
+                              to_dataframe: bool = True, base_interval: str = None,
+                              processes: Union[int, bool] = None) -> Union[Dict, pd.DataFrame]:
         """Retrieve historical timeseries data for an asset.
 
         Parameters
@@ -517,35 +652,147 @@ class Messari(DataLoader):
                     - 5m
                     - 15m
                     - 30m
-                    - 1hr
+                    - 1h
                     - 1d
                     - 1w
             to_dataframe: bool
                 Return data as DataFrame or JSON. Default is set to DataFrame.
+            base_interval: str
+                Optional finer interval to fetch once & derive interval from locally.
+                Data fetched at base_interval is kept on the client, so later requests
+                for any coarser interval over a covered range don't go to the network.
+                Metrics that can't be rolled up (distinct counts such as act.addr.cnt &
+                medians) are fetched at interval instead.
+                Ranges exceeding the point limit at base_interval are fetched in chunks.
+                Only available when returning a DataFrame.
+            processes: int, bool
+                Optional number of worker processes (True for one per CPU) decoding
+                responses & building each asset's arrays while the next asset downloads.
+                Responses are fetched bypassing the response cache & values are returned
+                as floats. Only available when returning a DataFrame without base_interval.
 
         Returns
         -------
             dict, DataFrame
-                Dictionary or pandas DataFrame of asset data.
+                Dictionary or pandas DataFrame of asset data. DataFrames served from
+                the client's frame cache are read-only.
         """
         asset_slugs = validate_input(asset_slugs)
-        payload = {'interval': interval}
         if start:
             if not end:
                 raise ValueError('End date must be provided')
+        if not to_dataframe:
+            if base_interval:
+                raise ValueError('Locally derived intervals can only be returned as DataFrame.')
+            if processes:
+                raise ValueError('Worker processes can only be used when returning a DataFrame.')
+            # Fail fast on unsupported metrics/intervals & ranges exceeding the point limit
+            self.catalog.validate_timeseries(asset_metric, interval, start=start, end=end,
+                                             strict=self.strict)
+            return {asset: self._get_timeseries_response(asset, asset_metric, start, end, interval)
+                    for asset in asset_slugs}
+
+        key = ('get_metric_timeseries', tuple(asset_slugs), asset_metric, start, end, interval,
+               base_interval)
+        return self.get_frame(key, 'get_metric_timeseries',
+                              lambda: self._get_timeseries_df(asset_slugs, asset_metric, start,
+                                                              end, interval, base_interval,
+                                                              processes))
+
+    def _get_timeseries_df(self, asset_slugs: List, asset_metric: str, start: str, end: str,
+                           interval: str, base_interval: str,
+                           processes: Union[int, bool]) -> pd.DataFrame:
+        """Build the DataFrame returned by get_metric_timeseries"""
+        if base_interval:
+            return self._get_derived_timeseries(asset_slugs, asset_metric, start, end,
+                                                interval, base_interval)
+
+        # Fail fast on unsupported metrics/intervals & ranges exceeding the point limit
+        self.catalog.validate_timeseries(asset_metric, interval, start=start, end=end,
+                                         strict=self.strict)
+        if processes:
+            pool = get_process_pool(processes)
+            futures = {}
+            for asset in asset_slugs:
+                url, payload = self._timeseries_request(asset, asset_metric, start, end, interval)
+                content = self.get_content(url, params=payload, headers=self.api_dict)
+                futures[asset] = pool.submit(timeseries_block, content)
+            timeseries_df = blocks_to_dataframe({asset: future.result()
+                                                 for asset, future in futures.items()})
+        else:
+            response_data = {}
+            for asset in asset_slugs:
+                response_data[asset] = self._get_timeseries_response(asset, asset_metric,
+                                                                     start, end, interval)
+            timeseries_df = timeseries_to_dataframe(response_data)
+        if asset_metric != 'price':
+            col_name = timeseries_df.columns[0][1]
+            timeseries_df = timeseries_df.xs(col_name, axis=1, level=1)
+        return timeseries_df
+
+    @staticmethod
+    def _timeseries_request(asset: str, asset_metric: str, start: str, end: str,
+                            interval: str) -> Tuple[str, Dict]:
+        """URL & query parameters of a single asset timeseries"""
+        payload = {'interval': interval}
+        if start:
             payload['start'] = start
             payload['end'] = end
         base_url_template = Template(f'{BASE_URL}/$asset_key/metrics/{asset_metric}/time-series')
-        response_data = {}
+        return base_url_template.substitute(asset_key=asset), payload
+
+    def _get_timeseries_response(self, asset: str, asset_metric: str, start: str, end: str,
+                                 interval: str) -> Dict:
+        """Request a single asset timeseries & return the flattened response data"""
+        url, payload = self._timeseries_request(asset, asset_metric, start, end, interval)
+        response = self.get_response(url, params=payload, headers=self.api_dict,
+                                     cache_policy='get_metric_timeseries')
+        return convert_flatten(response['data'])
+
+    def _get_derived_timeseries(self, asset_slugs: List, asset_metric: str, start: str, end: str,
+                                interval: str, base_interval: str) -> pd.DataFrame:
+        """Serve timeseries at interval from base_interval data held in the pyramid,
+        fetching base_interval data for assets that aren't covered yet"""
+        self.catalog.validate_timeseries(asset_metric, interval, strict=self.strict)
+        self.catalog.validate_timeseries(asset_metric, base_interval, strict=self.strict)
+        self.pyramid.validate_intervals(base_interval, interval)
+        if not self.pyramid.derivable(asset_metric, base_interval, interval):
+            # Distinct counts & medians of coarser buckets only come from the API
+            logging.info('%s can not be derived from %s data, fetching it at %s',
+                         asset_metric, base_interval, interval)
+            return self._get_timeseries_df(asset_slugs, asset_metric, start, end, interval,
+                                           None, None)
+        if start:
+            windows = self.pyramid.chunk_range(base_interval, start, end)
+        else:
+            windows = [(None, None)]
+
+        # Recent points & the API default range are refetched once older than the policy TTL
+        policy = self.cache_policies.get('get_metric_timeseries')
+        ttl = policy.ttl if policy else 0
+
+        asset_df_list, key_list = [], []
         for asset in asset_slugs:
-            url = base_url_template.substitute(asset_key=asset)
-            response = self.get_response(url, params=payload, headers=self.api_dict)
-            response_flat = convert_flatten(response['data'])
-            response_data[asset] = response_flat
-        if to_dataframe:
-            timeseries_df = timeseries_to_dataframe(response_data)
-            if asset_metric != 'price':
-                col_name = timeseries_df.columns[0][1]
-                timeseries_df = timeseries_df.xs(col_name, axis=1, level=1)
-            return timeseries_df
-        return response_data
+            if not self.pyramid.covers(asset, asset_metric, base_interval, start, end, ttl=ttl):
+                for window_start, window_end in windows:
+                    response_flat = self._get_timeseries_response(asset, asset_metric, window_start,
+                                                                  window_end, base_interval)
+                    if not isinstance(response_flat['values'], list):
+                        continue
+                    # Only keep points inside the chunk so overlapping edges aren't stored twice
+                    window_df = timeseries_to_dataframe({asset: response_flat}, start=window_start,
+                                                        end=window_end)[asset]
+                    self.pyramid.store(asset, asset_metric, base_interval, window_df,
+                                       start=window_start, end=window_end)
+            if not self.pyramid.stored(asset, asset_metric, base_interval):
+                logging.warning('Missing timeseries data for %s', asset)
+                continue
+            asset_df_list.append(self.pyramid.rollup(asset, asset_metric, base_interval, interval,
+                                                     start=start, end=end))
+            key_list.append(asset)
+
+        timeseries_df = pd.concat(asset_df_list, keys=key_list, axis=1)
+        if asset_metric != 'price':
+            col_name = timeseries_df.columns[0][1]
+            timeseries_df = timeseries_df.xs(col_name, axis=1, level=1)
+        return timeseries_df
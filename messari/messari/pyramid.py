@@ -0,0 +1,241 @@
+"""This module is dedicated to deriving coarser metric timeseries locally
+from a single fetch of the finest interval"""
+
+from __future__ import annotations
+
+import datetime
+import time
+from typing import Callable, Dict, List, Tuple, Union
+
+from messari.lazy import pandas as pd
+
+from .catalog import MetricCatalog
+
+# pandas resample rules for each Messari interval
+INTERVAL_RULES = {
+    '1m': '1min',
+    '5m': '5min',
+    '15m': '15min',
+    '30m': '30min',
+    '1h': '1h',
+    '1d': '1D',
+    '1w': 'W-MON',
+}
+
+
+def _to_timestamp(time_input: Union[str, datetime.datetime, None]) -> Union[pd.Timestamp, None]:
+    """Convert start/end argument to a naive pandas Timestamp"""
+    if time_input is None:
+        return None
+    timestamp = pd.Timestamp(time_input)
+    if timestamp.tzinfo is not None:
+        timestamp = timestamp.tz_convert(None)
+    return timestamp
+
+
+class TimeseriesPyramid:
+    """This class stores metric timeseries at their finest fetched interval
+    and rolls them up to coarser intervals using each metric's aggregation.
+
+    Parameters
+    ----------
+       catalog: MetricCatalog
+           Catalog providing interval lengths & per metric aggregations
+       clock: Callable
+           Function returning the current unix time, used to tell completed points
+           from points that can still change. Default is time.time.
+    """
+
+    def __init__(self, catalog: MetricCatalog, clock: Callable[[], float] = time.time):
+        self.catalog = catalog
+        self.clock = clock
+        self._levels: Dict[Tuple, pd.DataFrame] = {}
+        # Ranges of completed points, these never change once fetched
+        self._coverage: Dict[Tuple, List[Tuple]] = {}
+        # (start, end, fetched at) of fetches reaching past the last completed point
+        self._recent: Dict[Tuple, List[Tuple]] = {}
+        # Fetch time of keys fetched without a range, i.e. over the API default range
+        self._unbounded: Dict[Tuple, pd.Timestamp] = {}
+
+    def store(self, asset: str, asset_metric: str, interval: str, timeseries_df: pd.DataFrame,
+              start: Union[str, datetime.datetime] = None,
+              end: Union[str, datetime.datetime] = None) -> None:
+        """Store fetched timeseries for an asset, merging with previously stored rows.
+
+        :param asset: str
+            Asset slug
+        :param asset_metric: str
+            Timeseries metric ID
+        :param interval: str
+            Interval the data was fetched at
+        :param timeseries_df: pd.DataFrame
+            DataFrame indexed by timestamp
+        :param start: str, datetime.datetime
+            Start of the requested range, None if the API default range was used
+        :param end: str, datetime.datetime
+            End of the requested range, None if the API default range was used
+        """
+        key = (asset, asset_metric, interval)
+        now = self._now()
+        if start is None or end is None:
+            if timeseries_df.empty:
+                return
+            # Only the fetched rows are covered, not gaps to rows stored earlier
+            self._unbounded[key] = now
+            start, end = timeseries_df.index.min(), timeseries_df.index.max()
+
+        stored_df = self._levels.get(key)
+        if stored_df is not None:
+            timeseries_df = pd.concat([stored_df, timeseries_df])
+            timeseries_df = timeseries_df[~timeseries_df.index.duplicated(keep='last')]
+        self._levels[key] = timeseries_df.sort_index()
+
+        start, end = _to_timestamp(start), _to_timestamp(end)
+        # A point is final once its whole interval has passed, later points may still change
+        completed_end = min(end, now - pd.Timedelta(seconds=self.catalog.intervals[interval]))
+        if start <= completed_end:
+            self._add_coverage(key, start, completed_end)
+        if end > completed_end:
+            self._recent.setdefault(key, []).append((start, end, now))
+
+    def stored(self, asset: str, asset_metric: str, interval: str) -> bool:
+        """Check if any data is stored at interval
+
+        :return bool
+        """
+        return (asset, asset_metric, interval) in self._levels
+
+    def covers(self, asset: str, asset_metric: str, interval: str,
+               start: Union[str, datetime.datetime] = None,
+               end: Union[str, datetime.datetime] = None, ttl: float = 0) -> bool:
+        """Check if stored data at interval covers the requested range.
+
+        Requests without a range are only covered by a fetch without a range made
+        less than ttl seconds ago, as data fetched for a narrower range doesn't cover the
+        API default range, which moves forward with time. Likewise, ranges reaching past
+        the last completed point are only covered by a fetch made less than ttl seconds ago.
+
+        :return bool
+        """
+        key = (asset, asset_metric, interval)
+        if not self.stored(asset, asset_metric, interval):
+            return False
+        fresh_after = self._now() - pd.Timedelta(seconds=ttl)
+        if start is None or end is None:
+            return key in self._unbounded and self._unbounded[key] > fresh_after
+        # Drop recent fetches older than ttl as their last points may have changed since
+        recent = [(range_start, range_end, fetched_at)
+                  for range_start, range_end, fetched_at in self._recent.get(key, [])
+                  if fetched_at > fresh_after]
+        self._recent[key] = recent
+        ranges = self._coverage.get(key, [])
+        if recent:
+            ranges = self._merge_ranges(key, ranges + [(range_start, range_end)
+                                                       for range_start, range_end, _ in recent])
+        start, end = _to_timestamp(start), _to_timestamp(end)
+        return any(range_start <= start and end <= range_end for range_start, range_end in ranges)
+
+    def rollup(self, asset: str, asset_metric: str, base_interval: str, interval: str,
+               start: Union[str, datetime.datetime] = None,
+               end: Union[str, datetime.datetime] = None) -> pd.DataFrame:
+        """Derive a coarser interval from stored base interval data.
+
+        :param asset: str
+            Asset slug
+        :param asset_metric: str
+            Timeseries metric ID
+        :param base_interval: str
+            Interval the data was stored at
+        :param interval: str
+            Requested interval, equal to or coarser than base_interval
+        :param start: str, datetime.datetime
+            Optional start of the returned range
+        :param end: str, datetime.datetime
+            Optional end of the returned range, inclusive. A date without a time is
+            midnight, so the last bucket of a coarser interval only aggregates the
+            points up to midnight.
+        :return pandas DataFrame indexed by timestamp
+        """
+        self.validate_intervals(base_interval, interval)
+        base_df = self._levels[(asset, asset_metric, base_interval)]
+        # Slice before resampling so edge buckets only aggregate points inside the range
+        base_df = base_df.loc[_to_timestamp(start):_to_timestamp(end)]
+        if interval == base_interval:
+            return base_df
+        return self._resample(base_df, asset_metric, interval)
+
+    def validate_intervals(self, base_interval: str, interval: str) -> None:
+        """Check interval can be derived from base_interval.
+
+        :raises ValueError if interval is finer than base_interval
+        """
+        for name in (base_interval, interval):
+            if name not in INTERVAL_RULES:
+                raise ValueError(f'Unsupported interval {name!r}. '
+                                 f'Interval options include: {list(INTERVAL_RULES)}')
+        if self.catalog.intervals[interval] < self.catalog.intervals[base_interval]:
+            raise ValueError(f'Interval {interval} is finer than base interval {base_interval} '
+                             f'and can not be derived locally')
+
+    def derivable(self, asset_metric: str, base_interval: str, interval: str) -> bool:
+        """Check if interval can be rolled up from base_interval data of a metric,
+        distinct counts & medians can only be fetched at interval.
+
+        :return bool
+        """
+        return interval == base_interval or self.catalog.aggregation(asset_metric) is not None
+
+    def _resample(self, base_df: pd.DataFrame, asset_metric: str, interval: str) -> pd.DataFrame:
+        """Aggregate base_df into interval buckets using the metric aggregation"""
+        aggregation = self.catalog.aggregation(asset_metric)
+        if aggregation is None:
+            raise ValueError(f'{asset_metric} can not be rolled up to interval {interval}, '
+                             f'fetch it at that interval instead')
+        if isinstance(aggregation, str):
+            aggregation = {column: aggregation for column in base_df.columns}
+        else:
+            aggregation = {column: aggregation.get(column, 'last') for column in base_df.columns}
+        resampler = base_df.resample(INTERVAL_RULES[interval], label='left', closed='left')
+        level_df = resampler.agg(aggregation)
+        # Buckets without any base points would otherwise report 0 for sums
+        counts = resampler.count()
+        level_df = level_df.where(counts > 0)
+        return level_df.dropna(how='all')
+
+    def _now(self) -> pd.Timestamp:
+        """Current time as a naive UTC Timestamp"""
+        return pd.Timestamp(self.clock(), unit='s')
+
+    def _add_coverage(self, key: Tuple, start: pd.Timestamp, end: pd.Timestamp) -> None:
+        """Merge a fetched range into the coverage list for key"""
+        self._coverage[key] = self._merge_ranges(key, self._coverage.get(key, []) + [(start, end)])
+
+    def _merge_ranges(self, key: Tuple, ranges: List[Tuple]) -> List[Tuple]:
+        """Merge overlapping & adjacent ranges at the interval of key"""
+        step = pd.Timedelta(seconds=self.catalog.intervals[key[2]])
+        ranges = sorted(ranges)
+        merged = [ranges[0]]
+        for range_start, range_end in ranges[1:]:
+            last_start, last_end = merged[-1]
+            # Consecutive request windows are one base interval apart
+            if range_start <= last_end + step:
+                merged[-1] = (last_start, max(last_end, range_end))
+            else:
+                merged.append((range_start, range_end))
+        return merged
+
+    def chunk_range(self, interval: str, start: Union[str, datetime.datetime],
+                    end: Union[str, datetime.datetime]) -> List[Tuple[str, str]]:
+        """Split a range into consecutive request windows of at most max_points points.
+
+        :return List of (start, end) strings
+        """
+        step = pd.Timedelta(seconds=self.catalog.intervals[interval])
+        chunk_start, end = _to_timestamp(start), _to_timestamp(end)
+        chunks = []
+        while chunk_start <= end:
+            chunk_end = min(chunk_start + step * (self.catalog.max_points - 1), end)
+            chunks.append((chunk_start.strftime('%Y-%m-%dT%H:%M:%SZ'),
+                           chunk_end.strftime('%Y-%m-%dT%H:%M:%SZ')))
+            chunk_start = chunk_end + step
+        return chunks
@@ -0,0 +1,313 @@
+"""This module is dedicated to streaming real-time market trades & quotes
+into fixed-size NumPy ring buffers"""
+
+from __future__ import annotations
+
+import json
+import logging
+import threading
+import time
+from typing import Callable, Dict, Iterable, List, Tuple, Union
+
+from messari.lazy import numpy as np
+
+# Fields stored for each channel, timestamps are stored separately in ms
+CHANNEL_FIELDS = {
+    'trades': ('price', 'size'),
+    'quotes': ('bid', 'ask', 'bid_size', 'ask_size'),
+}
+# Message type sent by the stream for each channel
+MESSAGE_CHANNELS = {'trade': 'trades', 'quote': 'quotes'}
+
+
+class RingBuffer:
+    """This class is a fixed-size buffer of timestamped rows backed by NumPy arrays.
+    Once full, the oldest rows are overwritten.
+
+    Parameters
+    ----------
+       capacity: int
+           Maximum number of rows kept
+       fields: tuple
+           Names of the float columns stored for each row
+    """
+
+    def __init__(self, capacity: int, fields: Tuple[str, ...]):
+        self.capacity = capacity
+        self.fields = tuple(fields)
+        self._timestamps = np.zeros(capacity, dtype=np.int64)
+        self._values = np.full((capacity, len(self.fields)), np.nan)
+        self._count = 0
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return min(self._count, self.capacity)
+
+    @property
+    def last_timestamp(self) -> Union[int, None]:
+        """Timestamp in ms of the most recent row, None if empty"""
+        with self._lock:
+            if not self._count:
+                return None
+            return int(self._timestamps[(self._count - 1) % self.capacity])
+
+    def append(self, timestamp: int, values: Iterable[float]) -> None:
+        """Append a single row
+
+        :param timestamp: int
+            Timestamp in ms
+        :param values: iterable
+            Row values ordered as fields
+        """
+        with self._lock:
+            position = self._count % self.capacity
+            self._timestamps[position] = timestamp
+            self._values[position] = values
+            self._count += 1
+
+    def snapshot(self) -> Tuple[np.ndarray, np.ndarray]:
+        """Copy of stored rows ordered oldest to newest
+
+        :return Tuple of timestamps array & values array (rows x fields)
+        """
+        with self._lock:
+            if self._count <= self.capacity:
+                return self._timestamps[:self._count].copy(), self._values[:self._count].copy()
+            start = self._count % self.capacity
+            order = np.r_[start:self.capacity, 0:start]
+            return self._timestamps[order], self._values[order]
+
+    def window(self, since: int) -> Tuple[np.ndarray, np.ndarray]:
+        """Rows with timestamp >= since, ordered oldest to newest
+
+        :param since: int
+            Timestamp in ms
+        :return Tuple of timestamps array & values array (rows x fields)
+        """
+        timestamps, values = self.snapshot()
+        start = np.searchsorted(timestamps, since, side='left')
+        return timestamps[start:], values[start:]
+
+
+class MarketStream:
+    """This class subscribes to a real-time market data WebSocket and stores
+    trades & quotes per market in ring buffers. The connection is re-established
+    with exponential backoff when it drops, and an optional backfill function is
+    used to fill the gap missed while disconnected.
+
+    Messages are expected as JSON objects with a type ('trade' or 'quote'), a market
+    and a timestamp in ms, plus the channel fields ('price', 'size' for trades &
+    'bid', 'ask', 'bid_size', 'ask_size' for quotes) & an optional id. Messages at
+    the latest timestamp are told apart by their id, or by their fields without one.
+
+    Parameters
+    ----------
+       url: str
+           WebSocket URL of the real-time market data API
+       markets: str, list
+           Single market or list of markets (i.e. coinbase-btc-usd)
+       api_key: str
+           Optional Messari API key sent as the x-messari-api-key header
+       capacity: int
+           Rows kept per market & channel. Default is 10000.
+       connection_factory: Callable
+           Function taking (url, headers) & returning an object with send, recv & close.
+           Defaults to websocket-client's create_connection.
+       backfill: Callable
+           Optional function taking (market, since_ms) & returning an iterable of
+           messages missed while disconnected
+       reconnect_delay: float
+           Initial seconds to wait before reconnecting. Default is 1.
+       max_reconnect_delay: float
+           Maximum seconds to wait before reconnecting. Default is 30.
+    """
+
+    def __init__(self, url: str, markets: Union[str, List], api_key: str = None,
+                 capacity: int = 10000, connection_factory: Callable = None,
+                 backfill: Callable = None, reconnect_delay: float = 1,
+                 max_reconnect_delay: float = 30):
+        self.url = url
+        self.markets = [markets] if isinstance(markets, str) else list(markets)
+        self.headers = {'x-messari-api-key': api_key} if api_key else {}
+        self.connection_factory = connection_factory or _create_connection
+        self.backfill = backfill
+        self.reconnect_delay = reconnect_delay
+        self.max_reconnect_delay = max_reconnect_delay
+        self.buffers: Dict[Tuple[str, str], RingBuffer] = {
+            (market, channel): RingBuffer(capacity, fields)
+            for market in self.markets for channel, fields in CHANNEL_FIELDS.items()}
+        # Ids of the messages stored at the latest timestamp of each buffer
+        self._latest_ids: Dict[Tuple[str, str], set] = {key: set() for key in self.buffers}
+        self.connected = threading.Event()
+        self._stop = threading.Event()
+        self._connection = None
+        self._thread = None
+
+    def start(self) -> None:
+        """Start streaming on a background thread"""
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float = None) -> None:
+        """Stop streaming & close the connection
+
+        :param timeout: float
+            Seconds to wait for the streaming thread to exit
+        """
+        self._stop.set()
+        connection = self._connection
+        if connection is not None:
+            try:
+                connection.close()
+            except Exception:  # pylint: disable=broad-except
+                pass
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def handle_message(self, message: Union[str, bytes, Dict]) -> None:
+        """Store a single stream message in its ring buffer, older or
+        duplicate messages (i.e. overlapping backfill) are dropped
+
+        :param message: str, bytes, dict
+            JSON encoded or decoded message
+        """
+        if isinstance(message, (str, bytes)):
+            message = json.loads(message)
+        key = (message.get('market'), MESSAGE_CHANNELS.get(message.get('type')))
+        buffer = self.buffers.get(key)
+        if buffer is None:
+            return
+        timestamp = int(message['timestamp'])
+        message_id = message.get('id', tuple(message.get(field) for field in buffer.fields))
+        last_timestamp = buffer.last_timestamp
+        latest_ids = self._latest_ids[key]
+        if last_timestamp is not None:
+            if timestamp < last_timestamp:
+                return
+            # Backfills start at the last timestamp, so its messages are sent again
+            if timestamp == last_timestamp and message_id in latest_ids:
+                return
+        if timestamp != last_timestamp:
+            latest_ids.clear()
+        latest_ids.add(message_id)
+        buffer.append(timestamp, [float(message.get(field, np.nan)) for field in buffer.fields])
+
+    def snapshot(self, market: str, channel: str = 'trades', to_dataframe: bool = False):
+        """Return every row stored for a market & channel
+
+        :param market: str
+            Market name
+        :param channel: str
+            'trades' or 'quotes'
+        :param to_dataframe: bool
+            Return a pandas DataFrame indexed by timestamp instead of a dict of arrays
+        :return dict of NumPy arrays keyed by field, or DataFrame
+        """
+        buffer = self.buffers[(market, channel)]
+        timestamps, values = buffer.snapshot()
+        return _to_output(buffer.fields, timestamps, values, to_dataframe)
+
+    def aggregate(self, market: str, window_seconds: float, channel: str = 'trades',
+                  now: float = None) -> Dict:
+        """Aggregate rows received in the last window_seconds.
+
+        Trades return count, volume, vwap, high, low & last price.
+        Quotes return count, mean spread & last bid/ask.
+
+        :param market: str
+            Market name
+        :param window_seconds: float
+            Length of the window in seconds
+        :param channel: str
+            'trades' or 'quotes'
+        :param now: float
+            Optional end of the window as unix seconds, default is current time
+        :return dict of aggregates
+        """
+        now = time.time() if now is None else now
+        since = int((now - window_seconds) * 1000)
+        timestamps, values = self.buffers[(market, channel)].window(since)
+        if channel == 'trades':
+            price, size = values[:, 0], values[:, 1]
+            volume = np.nansum(size)
+            return {
+                'count': len(timestamps),
+                'volume': float(volume),
+                'vwap': float(np.nansum(price * size) / volume) if volume else np.nan,
+                'high': float(np.nanmax(price)) if len(price) else np.nan,
+                'low': float(np.nanmin(price)) if len(price) else np.nan,
+                'last': float(price[-1]) if len(price) else np.nan,
+            }
+        bid, ask = values[:, 0], values[:, 1]
+        return {
+            'count': len(timestamps),
+            'spread': float(np.nanmean(ask - bid)) if len(bid) else np.nan,
+            'bid': float(bid[-1]) if len(bid) else np.nan,
+            'ask': float(ask[-1]) if len(ask) else np.nan,
+        }
+
+    def _run(self) -> None:
+        """Connect, subscribe & receive until stopped, reconnecting on failures"""
+        delay = self.reconnect_delay
+        first_connection = True
+        while not self._stop.is_set():
+            try:
+                self._connection = self.connection_factory(self.url, self.headers)
+                self._connection.send(json.dumps({'type': 'subscribe',
+                                                  'channels': list(CHANNEL_FIELDS),
+                                                  'markets': self.markets}))
+                if not first_connection:
+                    self._backfill()
+                first_connection = False
+                delay = self.reconnect_delay
+                self.connected.set()
+                while not self._stop.is_set():
+                    message = self._connection.recv()
+                    if not message:
+                        raise ConnectionError('Market stream closed by server')
+                    self.handle_message(message)
+            except Exception as e:  # pylint: disable=broad-except
+                self.connected.clear()
+                if self._stop.is_set():
+                    break
+                logging.warning('Market stream disconnected: %s, reconnecting in %ss', e, delay)
+                self._stop.wait(delay)
+                delay = min(delay * 2, self.max_reconnect_delay)
+        self.connected.clear()
+
+    def _backfill(self) -> None:
+        """Fill the gap since the last stored row of each market"""
+        if self.backfill is None:
+            return
+        for market in self.markets:
+            last_timestamps = [self.buffers[(market, channel)].last_timestamp
+                               for channel in CHANNEL_FIELDS]
+            last_timestamps = [ts for ts in last_timestamps if ts is not None]
+            since = min(last_timestamps) if last_timestamps else None
+            for message in self.backfill(market, since):
+                self.handle_message(message)
+
+
+def _create_connection(url: str, headers: Dict):
+    """Open a WebSocket connection using websocket-client"""
+    try:
+        import websocket  # pylint: disable=import-outside-toplevel
+    except ImportError as e:
+        raise ImportError('Streaming requires websocket-client, '
+                          'install it with pip install websocket-client') from e
+    return websocket.create_connection(url, header=[f'{k}: {v}' for k, v in headers.items()])
+
+
+def _to_output(fields: Tuple[str, ...], timestamps: np.ndarray, values: np.ndarray,
+               to_dataframe: bool):
+    """Format buffer contents as dict of arrays or DataFrame"""
+    if to_dataframe:
+        import pandas as pd  # pylint: disable=import-outside-toplevel
+        index = pd.to_datetime(timestamps, unit='ms', origin='unix')
+        return pd.DataFrame(values, index=index, columns=list(fields))
+    output = {'timestamp': timestamps}
+    output.update({field: values[:, i] for i, field in enumerate(fields)})
+    return output
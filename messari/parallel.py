@@ -0,0 +1,65 @@
+"""This module is dedicated to offloading CPU-bound response decoding & frame building
+to worker processes, so calls covering many assets or protocols use every core
+instead of serializing on the GIL. Workers return NumPy blocks, which pickle as
+raw buffers, and the parent merges them into one DataFrame."""
+
+import os
+import threading
+from concurrent.futures import Executor
+from typing import Dict, Union
+
+# Process pools shared by every client, keyed by number of workers
+_POOLS: Dict[int, Executor] = {}
+_POOLS_LOCK = threading.Lock()
+
+
+def _max_workers(processes: Union[int, bool]) -> int:
+    """Number of workers of a processes option"""
+    if processes is True:
+        return os.cpu_count() or 1
+    return int(processes)
+
+
+def get_process_pool(processes: Union[int, bool] = True) -> Executor:
+    """Shared process pool, created on first use & reused by later calls
+
+    :param processes: int, bool
+        Number of worker processes, True for one per CPU
+    :return: Executor
+    """
+    # pylint: disable=import-outside-toplevel
+    from concurrent.futures import ProcessPoolExecutor
+    max_workers = _max_workers(processes)
+    if max_workers < 1:
+        raise ValueError("processes must be at least 1")
+    with _POOLS_LOCK:
+        pool = _POOLS.get(max_workers)
+        if pool is None or getattr(pool, "_broken", False):
+            pool = _POOLS[max_workers] = ProcessPoolExecutor(max_workers=max_workers)
+        return pool
+
+
+def set_process_pool(processes: Union[int, bool], pool: Executor) -> None:
+    """Replace the shared pool used for a number of processes (i.e. with an executor
+    using another start method), None removes it
+
+    :param processes: int, bool
+        Number of worker processes, True for one per CPU
+    :param pool: Executor
+        New pool
+    """
+    max_workers = _max_workers(processes)
+    with _POOLS_LOCK:
+        if pool is None:
+            _POOLS.pop(max_workers, None)
+        else:
+            _POOLS[max_workers] = pool
+
+
+def shutdown_process_pools() -> None:
+    """Shut down every shared pool, later calls create new ones"""
+    with _POOLS_LOCK:
+        pools = list(_POOLS.values())
+        _POOLS.clear()
+    for pool in pools:
+        pool.shutdown()
@@ -0,0 +1,148 @@
+"""This module is dedicated to sharing one request rate budget between interactive
+calls & long-running batch work. Requests wait in a queue per priority class &
+classes are served by weighted fair queuing, so interactive calls jump ahead of a
+backlog of batch requests without starving it."""
+
+import collections
+import itertools
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterator
+
+INTERACTIVE = "interactive"
+DEFAULT = "default"
+BATCH = "batch"
+
+# Share of the rate budget of each class while every class has requests waiting
+DEFAULT_WEIGHTS = {INTERACTIVE: 16, DEFAULT: 4, BATCH: 1}
+
+_CONTEXT = threading.local()
+
+
+def current_priority() -> str:
+    """Priority class of requests sent by the current thread"""
+    return getattr(_CONTEXT, "priority", DEFAULT)
+
+
+@contextmanager
+def request_priority(priority: str) -> Iterator[str]:
+    """Context manager setting the priority class of requests sent by the current
+    thread, i.e. with request_priority(BATCH): messari.get_metric_timeseries(...)
+
+    :param priority: str
+        Priority class, one of interactive, default & batch unless the scheduler
+        was created with other weights
+    """
+    previous = current_priority()
+    _CONTEXT.priority = priority
+    try:
+        yield priority
+    finally:
+        _CONTEXT.priority = previous
+
+
+class RequestScheduler:
+    """This class admits requests at a fixed rate, ordering waiting requests by
+    priority class. Each class has a FIFO queue & classes share the rate by weighted
+    fair queuing: every admission advances its class' virtual time by 1 / weight
+    and the waiting class with the lowest virtual time goes next. A class returning
+    from idle starts at the current virtual time, so it can't bank credit.
+
+    Parameters
+    ----------
+       rate: float
+           Requests admitted per second across every class
+       burst: int
+           Requests admitted back to back before waiting. Default is 1.
+       weights: dict
+           Weight of each priority class. Default is DEFAULT_WEIGHTS.
+       clock: Callable
+           Function returning the current time in seconds. Default is time.monotonic.
+    """
+
+    def __init__(self, rate: float, burst: int = 1, weights: Dict[str, float] = None,
+                 clock: Callable[[], float] = time.monotonic):
+        if rate <= 0:
+            raise ValueError("rate must be positive")
+        weights = dict(weights or DEFAULT_WEIGHTS)
+        if any(weight <= 0 for weight in weights.values()):
+            raise ValueError("weights must be positive")
+        self.rate = rate
+        self.burst = burst
+        self.weights = weights
+        self.clock = clock
+        self._tokens = float(burst)
+        self._updated = clock()
+        self._queues = {priority: collections.deque() for priority in weights}
+        self._virtual = {priority: 0.0 for priority in weights}
+        self._now = 0.0
+        self._tickets = itertools.count()
+        self._condition = threading.Condition()
+        self.admitted = collections.Counter()
+
+    def _refill(self) -> None:
+        now = self.clock()
+        self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def _next_class(self) -> str:
+        """Waiting class with the lowest virtual time, None if none is waiting"""
+        waiting = [priority for priority, queue in self._queues.items() if queue]
+        if not waiting:
+            return None
+        return min(waiting, key=lambda priority: (self._virtual[priority],
+                                                  self._queues[priority][0]))
+
+    def admit(self, priority: str = None, timeout: float = None) -> None:
+        """Wait for the turn of a request
+
+        :param priority: str
+            Priority class, default is the current thread's (see request_priority)
+        :param timeout: float
+            Optional maximum seconds to wait
+        :raises ValueError if the priority class is unknown
+        :raises SystemError if the request isn't admitted within timeout
+        """
+        priority = current_priority() if priority is None else priority
+        if priority not in self._queues:
+            raise ValueError(f"Unknown priority class {priority}, "
+                             f"expected one of {list(self._queues)}")
+        deadline = None if timeout is None else self.clock() + timeout
+        with self._condition:
+            queue = self._queues[priority]
+            if not queue:
+                self._virtual[priority] = max(self._virtual[priority], self._now)
+            ticket = next(self._tickets)
+            queue.append(ticket)
+            try:
+                while True:
+                    self._refill()
+                    if self._next_class() == priority and queue[0] == ticket \
+                            and self._tokens >= 1:
+                        queue.popleft()
+                        self._tokens -= 1
+                        self._now = self._virtual[priority]
+                        self._virtual[priority] += 1 / self.weights[priority]
+                        self.admitted[priority] += 1
+                        # The next request in line may be able to go right away
+                        self._condition.notify_all()
+                        return
+                    wait = (1 - self._tokens) / self.rate if self._tokens < 1 else None
+                    if deadline is not None:
+                        remaining = deadline - self.clock()
+                        if remaining <= 0:
+                            raise SystemError(f"{priority} request wasn't admitted "
+                                              f"within {timeout}s")
+                        wait = remaining if wait is None else min(wait, remaining)
+                    self._condition.wait(wait)
+            except BaseException:
+                if ticket in queue:
+                    queue.remove(ticket)
+                    self._condition.notify_all()
+                raise
+
+    def waiting(self) -> Dict[str, int]:
+        """Number of requests waiting in each class"""
+        with self._condition:
+            return {priority: len(queue) for priority, queue in self._queues.items()}
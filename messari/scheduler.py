@@ -0,0 +1,286 @@
+"""This module is dedicated to refreshing recurring feeds (i.e. DeFiLlama.get_protocols)
+on fixed cadences from one long-lived process, keeping clients & caches warm"""
+
+import heapq
+import itertools
+import logging
+import random
+import threading
+import time
+from typing import Any, Callable, Dict, List, Tuple
+
+
+class RateLimiter:
+    """This class is a token bucket limiting how often feeds are fetched
+
+    Parameters
+    ----------
+       rate: float
+           Fetches allowed per second
+       burst: int
+           Fetches allowed back to back before waiting. Default is 1.
+       clock: Callable
+           Function returning the current time in seconds. Default is time.monotonic.
+    """
+
+    def __init__(self, rate: float, burst: int = 1, clock: Callable[[], float] = time.monotonic):
+        if rate <= 0:
+            raise ValueError("rate must be positive")
+        self.rate = rate
+        self.burst = burst
+        self.clock = clock
+        self._tokens = float(burst)
+        self._updated = clock()
+        self._lock = threading.Lock()
+
+    def delay(self) -> float:
+        """Take a token, returning the seconds to wait before using it"""
+        with self._lock:
+            now = self.clock()
+            self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            self._tokens -= 1
+            if self._tokens >= 0:
+                return 0.0
+            return -self._tokens / self.rate
+
+
+class Feed:
+    """This class is a recurring fetch registered with a RefreshScheduler
+
+    Parameters
+    ----------
+       name: str
+           Unique feed name
+       fetch: Callable
+           Function called with args & kwargs to refresh the feed
+       cadence: float
+           Seconds between refreshes
+       jitter: float
+           Random seconds (0 to jitter) added to each due time to spread load
+       priority: int
+           Feeds with higher priority run first when several are due
+       args: tuple
+           Positional arguments passed to fetch
+       kwargs: dict
+           Keyword arguments passed to fetch
+    """
+
+    def __init__(self, name: str, fetch: Callable, cadence: float, jitter: float = 0.0,
+                 priority: int = 0, args: Tuple = (), kwargs: Dict = None):
+        if cadence <= 0:
+            raise ValueError("cadence must be positive")
+        self.name = name
+        self.fetch = fetch
+        self.cadence = cadence
+        self.jitter = jitter
+        self.priority = priority
+        self.args = tuple(args)
+        self.kwargs = dict(kwargs or {})
+        self.subscribers: List[Callable[[str, Any], None]] = []
+        self.last_result = None
+        self.last_run = None
+        self.last_error = None
+        self.runs = 0
+        self.failures = 0
+
+
+class RefreshScheduler:
+    """This class refreshes registered feeds on their cadence & hands each result
+    to the feed's subscribers. Due feeds run in priority order, a shared rate limit
+    spreads fetches out & per feed jitter keeps feeds with the same cadence apart.
+
+    Fetch functions should be bound methods of long-lived clients, i.e.
+    scheduler.register("protocols", dl.get_protocols, cadence=300), so sessions &
+    response caches stay warm between refreshes.
+
+    Parameters
+    ----------
+       rate_limit: float
+           Optional maximum fetches per second across every feed
+       burst: int
+           Fetches allowed back to back under rate_limit. Default is 1.
+       clock: Callable
+           Function returning the current time in seconds. Default is time.monotonic.
+       seed: int
+           Optional seed of the jitter random generator
+    """
+
+    def __init__(self, rate_limit: float = None, burst: int = 1,
+                 clock: Callable[[], float] = time.monotonic, seed: int = None):
+        self.clock = clock
+        self.limiter = RateLimiter(rate_limit, burst=burst, clock=clock) if rate_limit else None
+        self.feeds: Dict[str, Feed] = {}
+        self._queue: List[Tuple[float, int, int, Feed]] = []
+        self._counter = itertools.count()
+        self._random = random.Random(seed)
+        self._lock = threading.RLock()
+        self._wakeup = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def register(self, name: str, fetch: Callable, cadence: float, jitter: float = 0.0,
+                 priority: int = 0, args: Tuple = (), kwargs: Dict = None,
+                 subscribers: List[Callable[[str, Any], None]] = None,
+                 run_immediately: bool = True) -> Feed:
+        """Register a feed, replacing any feed with the same name
+
+        :param name: str
+            Unique feed name
+        :param fetch: Callable
+            Function called with args & kwargs to refresh the feed
+        :param cadence: float
+            Seconds between refreshes
+        :param jitter: float
+            Random seconds (0 to jitter) added to each due time. Default is 0.
+        :param priority: int
+            Feeds with higher priority run first when several are due. Default is 0.
+        :param args: tuple
+            Positional arguments passed to fetch
+        :param kwargs: dict
+            Keyword arguments passed to fetch
+        :param subscribers: list
+            Callbacks taking (name, result) called after every successful refresh
+        :param run_immediately: bool
+            Make the first refresh due now (plus jitter) instead of after one cadence
+        :return: Feed
+        """
+        feed = Feed(name, fetch, cadence, jitter=jitter, priority=priority, args=args,
+                    kwargs=kwargs)
+        feed.subscribers.extend(subscribers or [])
+        with self._lock:
+            self.feeds[name] = feed
+            delay = 0.0 if run_immediately else cadence
+            self._schedule(feed, self.clock() + delay)
+        self._wakeup.set()
+        return feed
+
+    def unregister(self, name: str) -> None:
+        """Remove a feed, queued refreshes of it are skipped
+
+        :param name: str
+            Feed name
+        """
+        with self._lock:
+            self.feeds.pop(name, None)
+
+    def subscribe(self, name: str, callback: Callable[[str, Any], None]) -> None:
+        """Add a callback taking (name, result) to a registered feed
+
+        :param name: str
+            Feed name
+        :param callback: Callable
+            Function called after every successful refresh
+        :raises ValueError if the feed isn't registered
+        """
+        with self._lock:
+            if name not in self.feeds:
+                raise ValueError(f"Feed {name!r} is not registered")
+            self.feeds[name].subscribers.append(callback)
+
+    def latest(self, name: str) -> Any:
+        """Most recent result of a feed, None before its first refresh
+
+        :param name: str
+            Feed name
+        """
+        return self.feeds[name].last_result
+
+    def next_due(self) -> float:
+        """Clock time the next feed is due, None if no feed is registered"""
+        with self._lock:
+            self._discard_stale()
+            return self._queue[0][0] if self._queue else None
+
+    def _schedule(self, feed: Feed, due: float) -> None:
+        """Queue the next refresh of feed"""
+        if feed.jitter:
+            due += self._random.uniform(0, feed.jitter)
+        # Queue entries hold the feed so replaced or removed feeds can be recognized
+        heapq.heappush(self._queue, (due, -feed.priority, next(self._counter), feed))
+
+    def _discard_stale(self) -> None:
+        """Drop queue entries of feeds that were removed or replaced"""
+        while self._queue and self.feeds.get(self._queue[0][3].name) is not self._queue[0][3]:
+            heapq.heappop(self._queue)
+
+    def run_pending(self) -> List[str]:
+        """Refresh every feed that is due, highest priority first
+
+        :return: List of refreshed feed names
+        """
+        now = self.clock()
+        due = []
+        with self._lock:
+            while True:
+                self._discard_stale()
+                if not self._queue or self._queue[0][0] > now:
+                    break
+                due.append(heapq.heappop(self._queue)[3])
+        # When several feeds are due the highest priority runs first
+        due.sort(key=lambda feed: -feed.priority)
+
+        refreshed = []
+        for feed in due:
+            if self._stop.is_set():
+                with self._lock:
+                    self._schedule(feed, now)
+                continue
+            if self.limiter is not None:
+                delay = self.limiter.delay()
+                if delay:
+                    self._stop.wait(delay)
+            self._refresh(feed)
+            refreshed.append(feed.name)
+        return refreshed
+
+    def _refresh(self, feed: Feed) -> None:
+        """Fetch a feed, notify subscribers & queue its next refresh"""
+        started = self.clock()
+        try:
+            result = feed.fetch(*feed.args, **feed.kwargs)
+        except Exception as e:  # pylint: disable=broad-except
+            feed.failures += 1
+            feed.last_error = e
+            logging.warning("Refreshing feed %s failed: %s", feed.name, e)
+        else:
+            feed.runs += 1
+            feed.last_result = result
+            feed.last_error = None
+            for callback in list(feed.subscribers):
+                try:
+                    callback(feed.name, result)
+                except Exception:  # pylint: disable=broad-except
+                    logging.exception("Subscriber of feed %s failed", feed.name)
+        feed.last_run = started
+        with self._lock:
+            if self.feeds.get(feed.name) is feed:
+                self._schedule(feed, started + feed.cadence)
+
+    def start(self) -> None:
+        """Run the scheduler on a background thread"""
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float = None) -> None:
+        """Stop the background thread after the refresh in progress
+
+        :param timeout: float
+            Seconds to wait for the thread to exit
+        """
+        self._stop.set()
+        self._wakeup.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def _run(self) -> None:
+        """Sleep until the next feed is due, refresh & repeat until stopped"""
+        while not self._stop.is_set():
+            self._wakeup.clear()
+            self.run_pending()
+            next_due = self.next_due()
+            wait = None if next_due is None else max(0.0, next_due - self.clock())
+            self._wakeup.wait(wait)
@@ -0,0 +1,405 @@
+"""This module is dedicated to the taxonomy mappings used to translate Messari
+asset slugs & symbols to the slugs of other data sources (i.e. DeFi Llama)"""
+
+import json
+import logging
+import os
+import threading
+import time
+from collections.abc import Mapping
+from concurrent.futures import ThreadPoolExecutor
+from types import MappingProxyType
+from typing import Callable, Dict, Iterable, Iterator, List, Tuple, Union
+
+MAPPINGS_PATH = os.path.join(os.path.dirname(__file__), 'mappings')
+DL_TAXONOMY_FILENAME = 'messari_to_dl.json'
+DL_HARDCODE_FILENAME = 'messari_to_dl_hardcode.json'
+
+
+def _normalize(slug: str) -> str:
+    """Normalized form used for case insensitive lookups"""
+    return slug.strip().casefold()
+
+
+class Taxonomy(Mapping):
+    """This class is an immutable Messari to data source mapping with a reverse index
+    and case insensitive lookups. Instances are safe to share between clients & threads.
+
+    Parameters
+    ----------
+       mapping: dict
+           Messari slug or symbol to data source slug
+    """
+
+    def __init__(self, mapping: Mapping = None):
+        mapping = dict(mapping or {})
+        self._mapping = MappingProxyType(mapping)
+        normalized: Dict[str, str] = {}
+        reverse: Dict[str, List[str]] = {}
+        for key, value in mapping.items():
+            normalized.setdefault(_normalize(key), value)
+            reverse.setdefault(value, []).append(key)
+        self._normalized = MappingProxyType(normalized)
+        self._reverse = MappingProxyType({value: tuple(keys) for value, keys in reverse.items()})
+
+    def __getitem__(self, key: str) -> str:
+        return self._mapping[key]
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._mapping)
+
+    def __len__(self) -> int:
+        return len(self._mapping)
+
+    def __repr__(self) -> str:
+        return f'Taxonomy({len(self)} entries)'
+
+    @classmethod
+    def from_file(cls, path: str) -> 'Taxonomy':
+        """Load a taxonomy from a JSON file
+
+        :param path: str
+            Path to mapping JSON
+        :return Taxonomy
+        """
+        with open(path, 'r', encoding='utf-8') as file:
+            return cls(json.load(file))
+
+    def lookup(self, slug: str, default: str = None) -> Union[str, None]:
+        """Translate a single slug, exact matches first then case insensitive
+
+        :param slug: str
+            Messari slug or symbol (i.e. UNI)
+        :param default: str
+            Returned when the slug isn't mapped
+        :return Data source slug or default
+        """
+        if slug in self._mapping:
+            return self._mapping[slug]
+        return self._normalized.get(_normalize(slug), default)
+
+    def translate(self, slugs: List[str]) -> List[str]:
+        """Translate a batch of slugs, unmapped slugs are returned unchanged
+
+        :param slugs: list
+            Messari slugs or symbols
+        :return List of data source slugs
+        """
+        mapping, normalized = self._mapping, self._normalized
+        return [mapping[slug] if slug in mapping else normalized.get(_normalize(slug), slug)
+                for slug in slugs]
+
+    def reverse(self, target: str) -> Tuple[str, ...]:
+        """Messari slugs & symbols mapped to a data source slug
+
+        :param target: str
+            Data source slug (i.e. uniswap)
+        :return Tuple of Messari keys, empty if the slug isn't mapped
+        """
+        return self._reverse.get(target, ())
+
+    def targets(self) -> List[str]:
+        """Every data source slug in the mapping
+
+        :return List of data source slugs
+        """
+        return list(self._reverse)
+
+
+_TAXONOMIES: Dict[str, Taxonomy] = {}
+_TAXONOMIES_LOCK = threading.Lock()
+
+
+def mapping_path(filename: str) -> Union[str, None]:
+    """Find a packaged mapping file, None if it's missing
+
+    :param filename: str
+        Mapping filename (i.e. messari_to_dl.json)
+    :return Path to the mapping file
+    """
+    for path in (os.path.join(MAPPINGS_PATH, filename),
+                 # this file is being called from an install with flattened package data
+                 os.path.join(os.path.dirname(__file__), '..', filename)):
+        if os.path.exists(path):
+            return path
+    return None
+
+
+def get_taxonomy(filename: str = DL_TAXONOMY_FILENAME) -> Taxonomy:
+    """Return the process-wide taxonomy for a mapping file, loading it on first use.
+
+    :param filename: str
+        Mapping filename. Default is messari_to_dl.json.
+    :return Taxonomy, empty if the file can't be found
+    """
+    taxonomy = _TAXONOMIES.get(filename)
+    if taxonomy is not None:
+        return taxonomy
+    with _TAXONOMIES_LOCK:
+        if filename not in _TAXONOMIES:
+            path = mapping_path(filename)
+            if path is None:
+                logging.warning('Cannot find taxonomy mapping %s, translations are disabled',
+                                filename)
+                _TAXONOMIES[filename] = Taxonomy()
+            else:
+                _TAXONOMIES[filename] = Taxonomy.from_file(path)
+        return _TAXONOMIES[filename]
+
+
+def set_taxonomy(taxonomy: Union[Taxonomy, Mapping],
+                 filename: str = DL_TAXONOMY_FILENAME) -> None:
+    """Replace the process-wide taxonomy for a mapping file.
+
+    :param taxonomy: Taxonomy, dict
+        New taxonomy
+    :param filename: str
+        Mapping filename. Default is messari_to_dl.json.
+    """
+    if not isinstance(taxonomy, Taxonomy):
+        taxonomy = Taxonomy(taxonomy)
+    with _TAXONOMIES_LOCK:
+        _TAXONOMIES[filename] = taxonomy
+
+
+class TaxonomyDiff:
+    """This class holds the changes between a current mapping and a rebuilt one
+
+    Parameters
+    ----------
+       added: dict
+           New keys & their targets
+       changed: dict
+           Existing keys mapped to a different target, {key: (old, new)}
+       removed: dict
+           Keys dropped from the mapping & their old targets
+       overridden: dict
+           Generated entries replaced by hardcoded overrides, {key: (generated, hardcoded)}
+    """
+
+    def __init__(self, added: Dict[str, str] = None, changed: Dict[str, Tuple[str, str]] = None,
+                 removed: Dict[str, str] = None,
+                 overridden: Dict[str, Tuple[str, str]] = None):
+        self.added = dict(added or {})
+        self.changed = dict(changed or {})
+        self.removed = dict(removed or {})
+        self.overridden = dict(overridden or {})
+
+    def __bool__(self) -> bool:
+        return bool(self.added or self.changed or self.removed)
+
+    def __repr__(self) -> str:
+        return (f'TaxonomyDiff(added={len(self.added)}, changed={len(self.changed)}, '
+                f'removed={len(self.removed)})')
+
+    def apply(self, mapping: Mapping) -> Dict[str, str]:
+        """Apply the changes to a mapping, keeping the order of existing keys
+
+        :param mapping: dict, Taxonomy
+            Current mapping
+        :return Dictionary of the updated mapping
+        """
+        updated = {key: value for key, value in mapping.items() if key not in self.removed}
+        for key, (_, new) in self.changed.items():
+            updated[key] = new
+        updated.update(self.added)
+        return updated
+
+
+def diff_taxonomy(current: Mapping, messari_assets: Iterable[Dict], dl_slugs: Iterable[str],
+                  hardcode: Mapping = None) -> TaxonomyDiff:
+    """Diff a mapping against the current Messari & DeFi Llama universes.
+
+    Messari assets whose slug is a DeFi Llama slug are mapped by lowercased slug &
+    symbol, then hardcoded overrides are applied on top. Current entries are only
+    removed when their target is no longer listed by DeFi Llama & no override keeps them.
+
+    :param current: dict, Taxonomy
+        Current mapping
+    :param messari_assets: iterable
+        Messari assets with 'slug' & 'symbol' keys
+    :param dl_slugs: iterable
+        Every DeFi Llama protocol slug
+    :param hardcode: dict
+        Overrides always applied to the mapping
+    :return TaxonomyDiff
+    """
+    dl_slugs = set(dl_slugs)
+    hardcode = dict(hardcode or {})
+    generated: Dict[str, str] = {}
+    for asset in messari_assets:
+        slug = asset.get('slug')
+        if slug not in dl_slugs:
+            continue
+        # Messari is case insensitive & DeFi Llama is always lowercase so drop to lower()
+        generated[str(slug).lower()] = slug
+        if asset.get('symbol'):
+            generated[str(asset['symbol']).lower()] = slug
+
+    overridden = {key: (generated[key], value) for key, value in hardcode.items()
+                  if key in generated and generated[key] != value}
+    desired = {**generated, **hardcode}
+
+    added = {key: value for key, value in desired.items() if key not in current}
+    changed = {key: (current[key], value) for key, value in desired.items()
+               if key in current and current[key] != value}
+    removed = {key: value for key, value in current.items()
+               if key not in desired and value not in dl_slugs}
+    return TaxonomyDiff(added=added, changed=changed, removed=removed, overridden=overridden)
+
+
+def _is_rate_limited(error: Exception) -> bool:
+    """Check if a client error was caused by an HTTP 429 response"""
+    response = getattr(error.__cause__, 'response', None)
+    return getattr(response, 'status_code', None) == 429
+
+
+def _retry_after(error: Exception, default: float) -> float:
+    """Seconds to wait from the Retry-After header of a 429 response"""
+    response = getattr(error.__cause__, 'response', None)
+    try:
+        return float(response.headers['Retry-After'])
+    except (AttributeError, KeyError, TypeError, ValueError):
+        return default
+
+
+class TaxonomyBuilder:
+    """This class rebuilds the Messari to DeFi Llama taxonomy. The Messari asset
+    pages & the DeFi Llama protocol listing are fetched concurrently, then only the
+    differences with the current mapping are applied.
+
+    Parameters
+    ----------
+       messari: Messari
+           Optional Messari client, an API key raises the rate limit
+       defillama: DeFiLlama
+           Optional DeFiLlama client
+       page_size: int
+           Messari assets requested per page. Default is 500, the API maximum.
+       max_workers: int
+           Pages requested at the same time. Default is 4.
+       max_retries: int
+           Retries of a page answered with HTTP 429. Default is 5.
+       backoff: float
+           Initial seconds to wait after a 429 without Retry-After, doubled on each retry
+       sleep: Callable
+           Function used to wait between retries. Default is time.sleep.
+    """
+
+    def __init__(self, messari=None, defillama=None, page_size: int = 500, max_workers: int = 4,
+                 max_retries: int = 5, backoff: float = 1.0,
+                 sleep: Callable[[float], None] = time.sleep):
+        # pylint: disable=import-outside-toplevel
+        if messari is None:
+            from messari.messari import Messari
+            messari = Messari()
+        if defillama is None:
+            from messari.defillama import DeFiLlama
+            defillama = DeFiLlama()
+        self.messari = messari
+        self.defillama = defillama
+        self.page_size = page_size
+        self.max_workers = max_workers
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.sleep = sleep
+
+    def _fetch_page(self, page: int) -> List[Dict]:
+        """Fetch one page of Messari assets, retrying when rate limited"""
+        delay = self.backoff
+        for attempt in range(self.max_retries + 1):
+            try:
+                assets = self.messari.get_all_assets(page=page, limit=self.page_size,
+                                                     asset_fields=['slug', 'symbol'])
+                return list(assets.values())
+            except SystemError as e:
+                if not _is_rate_limited(e) or attempt == self.max_retries:
+                    raise
+                wait = _retry_after(e, delay)
+                logging.warning('Messari assets page %s rate limited, retrying in %ss', page, wait)
+                self.sleep(wait)
+                delay *= 2
+        return []
+
+    def fetch_messari_assets(self, executor: ThreadPoolExecutor = None) -> List[Dict]:
+        """Fetch every Messari asset, max_workers pages at a time until a short page
+
+        :param executor: ThreadPoolExecutor
+            Optional executor to submit page requests to
+        :return List of assets with 'slug' & 'symbol' keys
+        """
+        if executor is None:
+            with ThreadPoolExecutor(max_workers=self.max_workers) as own_executor:
+                return self.fetch_messari_assets(own_executor)
+
+        assets: List[Dict] = []
+        first_page = 1
+        while True:
+            pages = range(first_page, first_page + self.max_workers)
+            results = list(executor.map(self._fetch_page, pages))
+            for page_assets in results:
+                assets.extend(page_assets)
+            if any(len(page_assets) < self.page_size for page_assets in results):
+                return assets
+            first_page += self.max_workers
+
+    def fetch_dl_slugs(self) -> List[str]:
+        """Fetch every DeFi Llama protocol slug
+
+        :return List of slugs
+        """
+        return self.defillama.get_protocols().index.tolist()
+
+    def build(self, current: Mapping = None, hardcode: Mapping = None) -> TaxonomyDiff:
+        """Fetch both universes concurrently & diff them against the current mapping
+
+        :param current: dict, Taxonomy
+            Current mapping, defaults to the packaged messari_to_dl.json
+        :param hardcode: dict
+            Overrides, defaults to the packaged messari_to_dl_hardcode.json
+        :return TaxonomyDiff
+        """
+        if current is None:
+            current = _load_mapping(DL_TAXONOMY_FILENAME)
+        if hardcode is None:
+            hardcode = _load_mapping(DL_HARDCODE_FILENAME)
+        with ThreadPoolExecutor(max_workers=self.max_workers + 1) as executor:
+            dl_slugs = executor.submit(self.fetch_dl_slugs)
+            messari_assets = self.fetch_messari_assets(executor)
+            dl_slugs = dl_slugs.result()
+        # An empty universe would otherwise remove every entry
+        if not dl_slugs or not messari_assets:
+            raise SystemError('Empty asset universe, refusing to rebuild the taxonomy')
+        return diff_taxonomy(current, messari_assets, dl_slugs, hardcode)
+
+    def update(self, path: str = None, hardcode: Mapping = None) -> TaxonomyDiff:
+        """Rebuild a mapping file in place, only writing it when something changed.
+        The process-wide taxonomy is replaced with the updated mapping.
+
+        :param path: str
+            Mapping JSON to update, defaults to the packaged messari_to_dl.json
+        :param hardcode: dict
+            Overrides, defaults to the packaged messari_to_dl_hardcode.json
+        :return TaxonomyDiff of the applied changes
+        """
+        path = path or os.path.join(MAPPINGS_PATH, DL_TAXONOMY_FILENAME)
+        current = {}
+        if os.path.exists(path):
+            with open(path, 'r', encoding='utf-8') as file:
+                current = json.load(file)
+        diff = self.build(current=current, hardcode=hardcode)
+        if diff:
+            updated = diff.apply(current)
+            with open(path, 'w', encoding='utf-8') as file:
+                json.dump(updated, file)
+            set_taxonomy(updated, os.path.basename(path))
+        return diff
+
+
+def _load_mapping(filename: str) -> Dict[str, str]:
+    """Read a packaged mapping file, empty if it's missing"""
+    path = mapping_path(filename)
+    if path is None:
+        return {}
+    with open(path, 'r', encoding='utf-8') as file:
+        return json.load(file)
@@ -1,12 +1,15 @@
 """This module is dedicated to utilites used by multiple classes"""
 
+from __future__ import annotations
+
 import datetime
-import json
-import os
 from collections.abc import MutableMapping
 from typing import List, Union, Dict
 
-import pandas as pd
+from messari.lazy import numpy as np
+from messari.lazy import pandas as pd
+
+from messari.taxonomy import get_taxonomy
 
 # Inconsistent API usage between metrics and profile end points
 #
@@ -18,7 +21,7 @@ import pandas as pd
 
 
 def convert_flatten(response_json: Union[Dict, MutableMapping],
-                    parent_key: str = "", sep: str = "_") -> Dict:
+                    parent_key: str = '', sep: str = '_') -> Dict:
     """Collapse JSON response to one single dictionary.
 
      :param response_json: dict, MutableMapping
@@ -52,10 +55,10 @@ def validate_input(asset_input: Union[str, List]):
     elif isinstance(asset_input, list):
         return asset_input
     else:
-        raise ValueError("Input should be of type string or list")
+        raise ValueError('Input should be of type string or list')
 
 
-DATETIME_FORMAT = "%Y-%m-%d"
+DATETIME_FORMAT = '%Y-%m-%d'
 
 
 def validate_datetime(datetime_input: Union[str, datetime.datetime]) -> Union[datetime.date, None]:
@@ -85,7 +88,7 @@ def unpack_list_of_dicts(list_of_dicts: List) -> Dict:
         List of python dictionaries
     :return Dictionary of dictionaries
     """
-    return {asset_data["slug"]: asset_data for asset_data in list_of_dicts}
+    return {asset_data['slug']: asset_data for asset_data in list_of_dicts}
 
 
 def validate_asset_fields_list_order(asset_fields: List, field: str) -> List:
@@ -120,12 +123,20 @@ def find_and_update_asset_field(asset_fields: List, field: str, updated_field: s
     return asset_fields
 
 
+def _index_bound(index: pd.Index, date: datetime.date):
+    """Convert a filter date to the type of the index being sliced"""
+    if isinstance(index, pd.DatetimeIndex):
+        bound = pd.Timestamp(date)
+        return bound.tz_localize(index.tz) if index.tz is not None else bound
+    return date
+
+
 def time_filter_df(df_in: pd.DataFrame, start_date: Union[str, datetime.datetime] = None,
                    end_date: Union[str, datetime.datetime] = None) -> pd.DataFrame:
     """Convert filter timeseries indexed DataFrame
 
     :param df_in: pd.DataFrame
-        Dataframe to filter
+        Dataframe to filter, left unmodified
     :param start_date: str
         Optional starting date for filter
     :param end_date: str
@@ -134,36 +145,83 @@ def time_filter_df(df_in: pd.DataFrame, start_date: Union[str, datetime.datetime
     """
 
     filtered_df = df_in
-    filtered_df.sort_index(inplace=True)  # Must sort ascending for this to work
+    if not filtered_df.index.is_monotonic_increasing:
+        filtered_df = filtered_df.sort_index()  # Must sort ascending for this to work
 
     if start_date:
-        start = validate_datetime(start_date)
-        filtered_df = filtered_df[start:]
-        pass
+        start = _index_bound(filtered_df.index, validate_datetime(start_date))
+        filtered_df = filtered_df.loc[start:]
 
     if end_date:
-        end = validate_datetime(end_date)
-        filtered_df = filtered_df[:end]
-        pass
+        end = _index_bound(filtered_df.index, validate_datetime(end_date))
+        filtered_df = filtered_df.loc[:end]
 
     return filtered_df
 
 
+# Number of timestamp units in a second
+UNITS_PER_SECOND = {'s': 1, 'ms': 1000}
+
+
+def _is_date_only(time_input: Union[str, datetime.date, datetime.datetime]) -> bool:
+    """Check if a window bound is a whole day rather than a point in time"""
+    if isinstance(time_input, str):
+        return len(time_input) == len('YYYY-MM-DD')
+    return isinstance(time_input, datetime.date) and not isinstance(time_input, datetime.datetime)
+
+
+def _to_unix(time_input: Union[str, datetime.date, datetime.datetime], unit: str) -> int:
+    """Convert a window bound to a unix timestamp in unit, naive times are UTC"""
+    timestamp = pd.Timestamp(time_input)
+    if timestamp.tzinfo is not None:
+        timestamp = timestamp.tz_convert(None)
+    return int(timestamp.as_unit('ns').value // (10 ** 9 // UNITS_PER_SECOND[unit]))
+
+
+def time_window(timestamps: np.ndarray,
+                start: Union[str, datetime.date, datetime.datetime] = None,
+                end: Union[str, datetime.date, datetime.datetime] = None,
+                unit: str = 's') -> np.ndarray:
+    """Find the positions of raw timestamps inside [start, end] so a date range can be
+    applied before any DataFrame is built. Sorted timestamps use a binary search.
+
+    :param timestamps: np.ndarray
+        unix timestamps
+    :param start: str, datetime.date, datetime.datetime
+        Optional inclusive start of the window
+    :param end: str, datetime.date, datetime.datetime
+        Optional inclusive end of the window, a date ("YYYY-MM-DD") includes the whole day
+    :param unit: str
+        Unit of timestamps, 's' or 'ms'
+    :return: np.ndarray of positions in ascending order
+    """
+    timestamps = np.asarray(timestamps, dtype=np.int64)
+    lower = _to_unix(start, unit) if start else None
+    upper = None
+    if end:
+        upper = _to_unix(end, unit)
+        if _is_date_only(end):
+            upper += 86400 * UNITS_PER_SECOND[unit] - 1
+
+    if np.all(timestamps[1:] >= timestamps[:-1]):
+        first = np.searchsorted(timestamps, lower, side='left') if lower is not None else 0
+        last = np.searchsorted(timestamps, upper, side='right') if upper is not None \
+            else len(timestamps)
+        return np.arange(first, max(first, last))
+
+    inside = np.ones(len(timestamps), dtype=bool)
+    if lower is not None:
+        inside &= timestamps >= lower
+    if upper is not None:
+        inside &= timestamps <= upper
+    return np.flatnonzero(inside)
+
+
 def get_taxonomy_dict(filename: str) -> Dict:
-    current_path = os.path.dirname(__file__)
-    # this file is being called from an install
-    if os.path.exists(os.path.join(current_path, f"../{filename}")):
-        json_path = os.path.join(current_path, f"../{filename}")
-        with open(json_path, "r", encoding="utf=8") as file:
-            taxonomy_dict = json.load(file)
-            file.close()
-    # this file is being called from the project dir
-    elif os.path.exists(os.path.join(current_path, f"mappings/{filename}")):
-        json_path = os.path.join(current_path, f"mappings/{filename}")
-        with open(json_path, "r", encoding="utf-8") as file:
-            taxonomy_dict = json.load(file)
-            file.close()
-    else:  # Can't find .mappings mapping file, default to empty
-        print(f"ERROR: cannot find {filename}")
-        taxonomy_dict = {}
-    return taxonomy_dict
+    """Copy of a packaged taxonomy mapping, loaded once per process.
+
+    :param filename: str
+        Mapping filename (i.e. messari_to_dl.json)
+    :return Dictionary of the mapping, empty if the file can't be found
+    """
+    return dict(get_taxonomy(filename))
@@ -0,0 +1,37 @@
+###########################################################################
+# The purpose of this is to measure how long importing the messari package
+# & constructing its clients takes, i.e. for short-lived CLI jobs. Each
+# statement runs in a fresh interpreter so module caches don't hide the cost.
+# Pass --importtime to print python's -X importtime breakdown as well.
+###########################################################################
+import statistics
+import subprocess
+import sys
+
+RUNS = 10
+
+STATEMENTS = {
+    "import messari": "import messari",
+    "import messari.defillama": "import messari.defillama",
+    "DeFiLlama()": "from messari.defillama import DeFiLlama; DeFiLlama()",
+    "Messari()": "from messari.messari import Messari; Messari()",
+    "import pandas": "import pandas",
+}
+
+TIMER = ("import sys, time; start = time.perf_counter(); {statement}; "
+         "print(time.perf_counter() - start, "
+         "sorted(m for m in ('pandas', 'numpy', 'requests') if m in sys.modules))")
+
+for label, statement in STATEMENTS.items():
+    timings = []
+    for _ in range(RUNS):
+        output = subprocess.run([sys.executable, "-c", TIMER.format(statement=statement)],
+                                capture_output=True, text=True, check=True).stdout.split(" ", 1)
+        timings.append(float(output[0]))
+    print(f"{label:<28} median {statistics.median(timings) * 1000:7.1f} ms, "
+          f"loaded {output[1].strip()}")
+
+if "--importtime" in sys.argv:
+    for statement in STATEMENTS.values():
+        print(f"\n# {statement}")
+        subprocess.run([sys.executable, "-X", "importtime", "-c", statement], check=True)
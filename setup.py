@@ -15,7 +15,16 @@ setup(
     url='',
     long_description=long_description,
     long_description_content_type='text/markdown',
-    package_data={'messari': ['mappings/messari_to_dl.json']},
+    package_data={'messari': ['mappings/messari_to_dl.json', 'mappings/messari_metrics.json']},
+    extras_require={
+        'streaming': ['websocket-client', 'ijson'],
+        'export': ['pyarrow'],
+    },
+    entry_points={
+        'console_scripts': ['messari-export=messari.export:main',
+                            'messari-backfill=messari.backfill:main',
+                            'messari-loadtest=messari.loadtest:main'],
+    },
     license='MIT`',
     classifiers=[
         "Programming Language :: Python :: 3",
@@ -0,0 +1,69 @@
+import unittest
+
+import numpy as np
+import pandas as pd
+
+from messari import analytics
+
+
+def price_panel(rows=200, assets=('bitcoin', 'ethereum', 'tether')):
+    """Random walk price panel indexed by df[asset][field] like get_metric_timeseries"""
+    rng = np.random.default_rng(0)
+    index = pd.date_range('2021-01-01', periods=rows)
+    closes = np.exp(np.cumsum(rng.normal(0, 0.03, (rows, len(assets))), axis=0)) * 100
+    return pd.concat({asset: pd.DataFrame({'open': closes[:, i], 'close': closes[:, i]},
+                                          index=index)
+                      for i, asset in enumerate(assets)}, axis=1)
+
+
+class TestAnalytics(unittest.TestCase):
+    """This is a unit testing class for testing rolling panel analytics"""
+
+    def setUp(self):
+        self.panel = price_panel()
+        self.closes = self.panel.xs('close', axis=1, level=1)
+        self.returns = self.closes.pct_change(fill_method=None)
+
+    def test_rolling_volatility(self):
+        """Test volatility matches pandas rolling std"""
+        volatility = analytics.rolling_volatility(self.panel, 30)
+        expected = self.returns.rolling(30).std() * np.sqrt(365)
+        pd.testing.assert_frame_equal(volatility, expected, check_freq=False)
+
+    def test_rolling_moments_precision(self):
+        """Test windows of large values with a small spread keep their variance"""
+        rng = np.random.default_rng(1)
+        values = 1e8 + rng.normal(0, 1e-2, (5000, 2))
+        mean, std = analytics._rolling_moments(values, 30)
+        np.testing.assert_allclose(mean[-1], values[-30:].mean(axis=0))
+        np.testing.assert_allclose(std[-1], values[-30:].std(axis=0, ddof=1), rtol=1e-4)
+
+    def test_rolling_sharpe(self):
+        """Test Sharpe ratio matches pandas rolling mean / std"""
+        sharpe = analytics.rolling_sharpe(self.panel, 30)
+        rolling = self.returns.rolling(30)
+        expected = rolling.mean() / rolling.std() * np.sqrt(365)
+        pd.testing.assert_frame_equal(sharpe, expected, check_freq=False)
+
+    def test_drawdowns_and_correlation(self):
+        """Test drawdowns & correlation match pandas"""
+        drawdown = analytics.drawdowns(self.panel)
+        expected = self.closes / self.closes.cummax() - 1
+        pd.testing.assert_frame_equal(drawdown, expected, check_freq=False)
+        correlation = analytics.rolling_correlation(self.panel, 30)
+        np.testing.assert_allclose(correlation['values'][-1],
+                                   self.returns.iloc[-30:].corr().to_numpy())
+
+    def test_incremental_updates(self):
+        """Test incremental updates match a full recomputation"""
+        rolling = analytics.RollingAnalytics(30)
+        updates = [rolling.update(self.panel.iloc[:50]), rolling.update(self.panel.iloc[:120]),
+                   rolling.update(self.panel)]
+        volatility = pd.concat([update['volatility'] for update in updates])
+        pd.testing.assert_frame_equal(volatility, analytics.rolling_volatility(self.panel, 30),
+                                      check_freq=False)
+        self.assertEqual(len(rolling.update(self.panel)['volatility']), 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
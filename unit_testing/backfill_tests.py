@@ -0,0 +1,152 @@
+import json
+import os
+import tempfile
+import unittest
+
+import pandas as pd
+
+from messari.backfill import BackfillQueue, BackfillWorker, chunk_range, main, plan_units
+from messari.export import ExportJob
+
+
+class FakeClock:
+    """Clock advanced manually by tests"""
+
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+class FakeMessari:
+    """Messari client returning a daily series, failing for assets in fail & rejecting
+    assets in invalid"""
+
+    def __init__(self, fail=(), invalid=()):
+        self.fail = set(fail)
+        self.invalid = set(invalid)
+        self.calls = []
+
+    def get_metric_timeseries(self, asset_slugs, asset_metric, start=None, end=None,
+                              interval="1d"):
+        self.calls.append((asset_slugs, start, end))
+        if asset_slugs in self.fail:
+            raise SystemError("500 Server Error")
+        if asset_slugs in self.invalid:
+            raise ValueError("Unsupported timeseries metric")
+        index = pd.date_range(start, end, freq="D")
+        return pd.DataFrame({asset_slugs: [float(day.day) for day in index]}, index=index)
+
+
+class TestBackfill(unittest.TestCase):
+    """This is a unit testing class for testing the backfill work queue"""
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp.name, "queue.db")
+        self.output = os.path.join(self.tmp.name, "out")
+        self.spec = {"output": self.output, "format": "csv", "start": "2021-01-01",
+                     "end": "2021-03-10", "messari": {"assets": ["bitcoin", "ethereum"],
+                                                      "metrics": ["sply.circ"],
+                                                      "api_key": "secret"}}
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_chunk_range(self):
+        """Test date ranges are split into inclusive consecutive chunks"""
+        self.assertEqual(chunk_range("2021-01-01", "2021-01-05", 2),
+                         [("2021-01-01", "2021-01-02"), ("2021-01-03", "2021-01-04"),
+                          ("2021-01-05", "2021-01-05")])
+        with self.assertRaises(ValueError):
+            chunk_range("2021-01-05", "2021-01-01", 2)
+
+    def test_chunks_fit_interval(self):
+        """Test chunks are shortened to the points one request can return"""
+        spec = dict(self.spec, end="2021-12-31",
+                    messari={"assets": ["bitcoin"], "metrics": ["price"], "interval": "1h"})
+        units = plan_units(ExportJob.from_dict(spec))
+        # 2016 hourly points per request are 84 days
+        self.assertEqual(len(units), 5)
+        self.assertEqual((units[0][0].kwargs["start"], units[0][0].kwargs["end"]),
+                         ("2021-01-01", "2021-03-25"))
+        daily = plan_units(ExportJob.from_dict(dict(spec, messari=self.spec["messari"])))
+        self.assertEqual(len(daily), 2)
+
+    def test_submit_and_drain(self):
+        """Test units are planned once, processed by several workers & written per chunk"""
+        queue = BackfillQueue(self.path)
+        self.assertEqual(queue.submit("supply", self.spec, chunk_days=30), 6)
+        # Resubmitting only adds missing units & the api key isn't stored
+        self.assertEqual(queue.submit("supply", self.spec, chunk_days=30), 0)
+        self.assertNotIn("api_key", queue.job_spec("supply")["messari"])
+
+        first = BackfillWorker(queue, clients={"messari": FakeMessari()}, owner="first")
+        self.assertEqual(first.run(max_units=2), 2)
+        second = BackfillWorker(BackfillQueue(self.path), clients={"messari": FakeMessari()},
+                                owner="second", threads=2)
+        self.assertEqual(second.run(), 4)
+        self.assertEqual(queue.progress(), {"pending": 0, "leased": 0, "done": 6, "failed": 0})
+
+        # Chunks of one month sit side by side in its partition
+        january = os.path.join(self.output, "sply.circ", "date=2021-01", "asset=bitcoin")
+        self.assertEqual(sorted(os.listdir(january)), ["part-20210101.csv", "part-20210131.csv"])
+        frames = [pd.read_csv(os.path.join(january, name)) for name in sorted(os.listdir(january))]
+        self.assertEqual(sum(len(frame) for frame in frames), 31)
+
+    def test_leases_and_retries(self):
+        """Test expired leases are picked up again & failing units end up failed"""
+        clock = FakeClock()
+        queue = BackfillQueue(self.path, max_attempts=2, retry_delay=10, clock=clock)
+        queue.submit("supply", self.spec, chunk_days=365)
+
+        # A worker crashes while holding a lease
+        crashed = queue.acquire("crashed", lease_seconds=60)
+        self.assertIsNotNone(crashed)
+        clock.now += 30
+        self.assertEqual(queue.heartbeat("crashed", lease_seconds=60), 1)
+        clock.now += 61
+        resumed = queue.acquire("resumed", lease_seconds=60)
+        self.assertEqual((resumed.id, resumed.attempts), (crashed.id, 2))
+        self.assertFalse(queue.complete(crashed, "crashed"))
+        self.assertTrue(queue.complete(resumed, "resumed", {"rows": 1}))
+
+        messari = FakeMessari(fail=["ethereum"])
+        worker = BackfillWorker(queue, clients={"messari": messari}, owner="worker")
+        worker.run()
+        self.assertEqual(queue.progress()["pending"], 1)
+        clock.now += 10
+        worker.run()
+        self.assertEqual(queue.progress(), {"pending": 0, "leased": 0, "done": 1, "failed": 1})
+        self.assertEqual(list(queue.errors().values()), ["500 Server Error"])
+
+        self.assertEqual(queue.retry_failed(), 1)
+        messari.fail.clear()
+        worker.run()
+        self.assertEqual(queue.progress()["done"], 2)
+
+    def test_invalid_not_retried(self):
+        """Test units failing with ValueError are failed without retries"""
+        queue = BackfillQueue(self.path, max_attempts=5, retry_delay=0)
+        queue.submit("supply", self.spec, chunk_days=365)
+        messari = FakeMessari(invalid=["ethereum"])
+        BackfillWorker(queue, clients={"messari": messari}, owner="worker").run()
+        self.assertEqual(queue.progress(), {"pending": 0, "leased": 0, "done": 1, "failed": 1})
+        self.assertEqual(len(messari.calls), 2)
+
+    def test_command_line(self):
+        """Test the submit, work & status commands"""
+        spec_path = os.path.join(self.tmp.name, "job.json")
+        with open(spec_path, "w") as outfile:
+            json.dump(self.spec, outfile)
+        self.assertEqual(main(["submit", self.path, "supply", spec_path, "--chunk-days", "60"]),
+                         0)
+        self.assertEqual(main(["work", self.path, "--threads", "2"],
+                              clients={"messari": FakeMessari()}), 0)
+        self.assertEqual(main(["status", self.path, "--job", "supply"]), 0)
+        self.assertEqual(BackfillQueue(self.path).progress("supply")["done"], 4)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,218 @@
+import fnmatch
+import math
+import os
+import tempfile
+import threading
+import time
+import unittest
+from unittest import mock
+
+from messari.cache import CachePolicy, ResponseCache, backend_key
+from messari.cache_backends import CacheBackend, MemoryBackend, RedisBackend, SQLiteBackend, \
+    RELEASE_LOCK_SCRIPT
+from messari.defillama import DeFiLlama
+
+
+class FakeRedis:
+    """Local stand-in for the subset of redis.Redis used by RedisBackend"""
+
+    def __init__(self):
+        self.data = {}
+        self.lock = threading.Lock()
+
+    def _live(self, name):
+        entry = self.data.get(name)
+        if entry is not None and entry[1] is not None and entry[1] <= time.time():
+            del self.data[name]
+            return None
+        return entry
+
+    def get(self, name):
+        with self.lock:
+            entry = self._live(name)
+        return None if entry is None else entry[0]
+
+    def set(self, name, value, nx=False, px=None):
+        with self.lock:
+            if nx and self._live(name) is not None:
+                return None
+            value = value.encode() if isinstance(value, str) else value
+            self.data[name] = (value, None if px is None else time.time() + px / 1000)
+            return True
+
+    def delete(self, *names):
+        with self.lock:
+            return sum(self.data.pop(name, None) is not None for name in names)
+
+    def pttl(self, name):
+        with self.lock:
+            entry = self._live(name)
+        if entry is None:
+            return -2
+        return -1 if entry[1] is None else int((entry[1] - time.time()) * 1000)
+
+    def scan_iter(self, match="*"):
+        with self.lock:
+            return [name for name in self.data if fnmatch.fnmatch(name, match)]
+
+    def eval(self, script, numkeys, *args):
+        assert script == RELEASE_LOCK_SCRIPT and numkeys == 1
+        name, token = args
+        with self.lock:
+            entry = self._live(name)
+            if entry is not None and entry[0] == token.encode():
+                del self.data[name]
+                return 1
+        return 0
+
+
+class BackendTests:
+    """Tests shared by every cache backend"""
+
+    def make_backend(self):
+        raise NotImplementedError
+
+    def setUp(self):
+        self.backend = self.make_backend()
+
+    def test_get_set(self):
+        """Test values round trip, expire & are deleted"""
+        self.assertIsNone(self.backend.get('missing'))
+        self.assertIsNone(self.backend.ttl('missing'))
+        self.backend.set('key', {'data': [1, 2]})
+        self.assertEqual(self.backend.get('key'), {'data': [1, 2]})
+        self.assertEqual(self.backend.ttl('key'), math.inf)
+        self.backend.set('short', 'value', ttl=60)
+        self.assertTrue(0 < self.backend.ttl('short') <= 60)
+        self.backend.set('expired', 'value', ttl=0.01)
+        time.sleep(0.05)
+        self.assertIsNone(self.backend.get('expired'))
+        self.backend.delete('key')
+        self.assertIsNone(self.backend.get('key'))
+        self.backend.clear()
+        self.assertIsNone(self.backend.get('short'))
+
+    def test_lock(self):
+        """Test a held lock blocks other tokens until it is released or expires"""
+        token = self.backend.acquire_lock('key', ttl=60, timeout=0)
+        self.assertIsNotNone(token)
+        self.assertIsNone(self.backend.acquire_lock('key', ttl=60, timeout=0.05))
+        # Releasing with another token doesn't free the lock
+        self.backend.release_lock('key', 'other')
+        self.assertIsNone(self.backend.acquire_lock('key', ttl=60, timeout=0))
+        self.backend.release_lock('key', token)
+        with self.backend.lock('key', ttl=0.05, timeout=0) as acquired:
+            self.assertTrue(acquired)
+            time.sleep(0.1)
+            # The lock of a holder that never released it expires
+            self.assertIsNotNone(self.backend.acquire_lock('key', ttl=60, timeout=0))
+
+    def test_no_stampede(self):
+        """Test concurrent callers of a cold key trigger a single fetch"""
+        caches = [ResponseCache(self.backend) for _ in range(8)]
+        calls, results = [], []
+
+        def fetch():
+            calls.append(1)
+            time.sleep(0.2)
+            return {'value': 1}
+
+        def worker(cache):
+            results.append(cache.get(('url',), CachePolicy(ttl=60), fetch))
+
+        threads = [threading.Thread(target=worker, args=(cache,)) for cache in caches]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join(10)
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(results, [{'value': 1}] * 8)
+
+
+class TestMemoryBackend(BackendTests, unittest.TestCase):
+    """This is a unit testing class for testing the memory cache backend"""
+
+    def make_backend(self):
+        return MemoryBackend()
+
+
+class TestSQLiteBackend(BackendTests, unittest.TestCase):
+    """This is a unit testing class for testing the SQLite cache backend"""
+
+    def make_backend(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        return SQLiteBackend(os.path.join(directory.name, 'cache.db'))
+
+    def test_shared_file(self):
+        """Test backends opened on one file share entries & locks"""
+        other = SQLiteBackend(self.backend.path)
+        self.backend.set('key', [1, 2], ttl=60)
+        self.assertEqual(other.get('key'), [1, 2])
+        token = self.backend.acquire_lock('key', timeout=0)
+        self.assertIsNone(other.acquire_lock('key', timeout=0))
+        self.backend.release_lock('key', token)
+        self.assertIsNotNone(other.acquire_lock('key', timeout=0))
+
+
+class TestRedisBackend(BackendTests, unittest.TestCase):
+    """This is a unit testing class for testing the Redis cache backend"""
+
+    def make_backend(self):
+        return RedisBackend(client=FakeRedis(), prefix='test:')
+
+    def test_prefix(self):
+        """Test keys are prefixed & clear leaves other keys alone"""
+        self.backend.client.set('other', 'value')
+        self.backend.set('key', 'value')
+        self.assertIn('test:key', self.backend.client.data)
+        self.backend.clear()
+        self.assertEqual(list(self.backend.client.data), ['other'])
+
+
+class TestCacheBackendInterface(unittest.TestCase):
+    """This is a unit testing class for testing the cache backend interface"""
+
+    def test_incomplete_backend(self):
+        """Test backends missing a method fail when they are created"""
+        class PartialBackend(CacheBackend):
+            def get(self, key):
+                return None
+
+        with self.assertRaises(TypeError):
+            PartialBackend()  # pylint: disable=abstract-class-instantiated
+        with self.assertRaises(TypeError):
+            CacheBackend()  # pylint: disable=abstract-class-instantiated
+
+
+class TestSharedResponseCache(unittest.TestCase):
+    """This is a unit testing class for testing clients sharing a response cache"""
+
+    def test_clients_share_backend(self):
+        """Test a response fetched by one client is served to another"""
+        backend = RedisBackend(client=FakeRedis())
+        first = DeFiLlama(use_cache=True, cache_backend=backend)
+        second = DeFiLlama(use_cache=True, cache_backend=backend)
+        response = [{'name': 'Ethereum'}]
+        with mock.patch.object(first, '_fetch_response', return_value=response) as fetch:
+            self.assertEqual(first.get_chains(), ['Ethereum'])
+        with mock.patch.object(second, '_fetch_response') as fetch_second:
+            self.assertEqual(second.get_chains(), ['Ethereum'])
+        fetch.assert_called_once()
+        fetch_second.assert_not_called()
+
+    def test_stale_refresh_locked(self):
+        """Test a stale entry isn't refreshed while another process holds its lock"""
+        backend = MemoryBackend()
+        cache = ResponseCache(backend)
+        policy = CachePolicy(ttl=0, stale_ttl=60)
+        cache.get('key', policy, lambda: 'old')
+        fetch = mock.Mock(return_value='new')
+        with backend.lock(backend_key('key'), timeout=0):
+            self.assertEqual(cache.get('key', policy, fetch), 'old')
+            time.sleep(0.1)
+        fetch.assert_not_called()
+
+
+if __name__ == '__main__':
+    unittest.main()
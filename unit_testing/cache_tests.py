@@ -0,0 +1,64 @@
+import threading
+import time
+import unittest
+from unittest import mock
+
+from messari.cache import CachePolicy, ResponseCache
+from messari.defillama import DeFiLlama
+
+
+class TestResponseCache(unittest.TestCase):
+    """This is a unit testing class for testing response cache policies"""
+
+    def test_fresh_hit(self):
+        """Test fresh entries are served without fetching"""
+        cache = ResponseCache()
+        fetch = mock.Mock(return_value=1)
+        policy = CachePolicy(ttl=60)
+        self.assertEqual(cache.get('key', policy, fetch), 1)
+        self.assertEqual(cache.get('key', policy, fetch), 1)
+        fetch.assert_called_once()
+
+    def test_stale_while_revalidate(self):
+        """Test stale entries are served immediately & refreshed in the background"""
+        cache = ResponseCache()
+        policy = CachePolicy(ttl=0, stale_ttl=60)
+        refreshed = threading.Event()
+        cache.get('key', policy, lambda: 'old')
+
+        def fetch():
+            refreshed.set()
+            return 'new'
+
+        self.assertEqual(cache.get('key', policy, fetch), 'old')
+        self.assertTrue(refreshed.wait(5))
+        time.sleep(0.05)
+        self.assertEqual(cache.get('key', CachePolicy(ttl=60), fetch), 'new')
+
+    def test_expired(self):
+        """Test entries past stale_ttl are fetched synchronously"""
+        cache = ResponseCache()
+        policy = CachePolicy(ttl=0, stale_ttl=0)
+        cache.get('key', policy, lambda: 'old')
+        time.sleep(0.01)
+        self.assertEqual(cache.get('key', policy, lambda: 'new'), 'new')
+
+    def test_client_policies(self):
+        """Test client default policies & per method overrides"""
+        dl = DeFiLlama(use_cache=True, cache_policies={'get_chains': None})
+        self.assertIn('get_protocols', dl.cache_policies)
+        self.assertNotIn('get_chains', dl.cache_policies)
+        self.assertEqual(DeFiLlama().cache_policies, {})
+
+        with mock.patch.object(dl, '_fetch_response', return_value=[{'name': 'Ethereum'}]) as fetch:
+            dl.get_chains()
+            dl.get_chains()
+            self.assertEqual(fetch.call_count, 2)
+            dl.set_cache_policy('get_chains', CachePolicy(ttl=60))
+            dl.get_chains()
+            dl.get_chains()
+            self.assertEqual(fetch.call_count, 3)
+
+
+if __name__ == '__main__':
+    unittest.main()
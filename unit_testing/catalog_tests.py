@@ -0,0 +1,82 @@
+import unittest
+from unittest import mock
+
+from messari.messari import Messari
+from messari.messari.catalog import get_catalog
+
+
+class TestMetricCatalog(unittest.TestCase):
+    """This is a unit testing class for testing the local metric catalog"""
+
+    def test_valid_timeseries(self):
+        """Test a valid timeseries request passes validation"""
+        catalog = get_catalog()
+        catalog.validate_timeseries('price', '1d', start='2020-06-01', end='2021-01-01')
+
+    def test_invalid_metric(self):
+        """Test unknown metrics are rejected"""
+        catalog = get_catalog()
+        with self.assertRaises(ValueError):
+            catalog.validate_timeseries('prcie', '1d')
+        with self.assertRaises(ValueError):
+            catalog.validate_asset_metric('market-data')
+        with self.assertRaises(ValueError):
+            catalog.validate_asset_fields(['id', 'metric'])
+
+    def test_non_strict(self):
+        """Test non strict validation only warns on metrics missing from the catalog &
+        still rejects unknown intervals"""
+        catalog = get_catalog()
+        with self.assertLogs(level='WARNING') as logs:
+            catalog.validate_timeseries('prcie', '1d', strict=False)
+            catalog.validate_asset_metric('market-data', strict=False)
+            catalog.validate_asset_fields(['id', 'metric'], strict=False)
+        self.assertEqual(len(logs.output), 3)
+        with self.assertRaises(ValueError):
+            catalog.validate_timeseries('price', '2h', strict=False)
+
+    def test_point_limit(self):
+        """Test ranges exceeding the maximum number of points are rejected"""
+        catalog = get_catalog()
+        # 7 days of 5m data is exactly 2016 points
+        catalog.validate_timeseries('price', '5m', start='2021-01-01',
+                                    end='2021-01-07T23:55:00')
+        with self.assertRaises(ValueError):
+            catalog.validate_timeseries('price', '5m', start='2021-01-01', end='2021-01-08')
+
+    def test_fails_before_network(self):
+        """Test invalid requests never reach the session"""
+        messari = Messari()
+        with mock.patch.object(messari.session, 'get') as get:
+            with self.assertRaises(ValueError):
+                messari.get_metric_timeseries('bitcoin', 'price', start='2015-01-01',
+                                              end='2021-01-01', interval='1h')
+            with self.assertRaises(ValueError):
+                messari.get_asset_metrics('bitcoin', asset_metric='marketcapp')
+            with self.assertRaises(ValueError):
+                messari.get_metric_timeseries('bitcoin', 'price', interval='2h')
+            get.assert_not_called()
+
+    def test_refresh(self):
+        """Test catalog refresh keeps known aggregations & infers new ones"""
+        catalog = get_catalog()
+        response = {'data': {'metrics': [
+            {'metric_id': 'price', 'description': ''},
+            {'metric_id': 'new.metric', 'description': 'The sum count of things.'},
+            {'metric_id': 'new.rate', 'description': 'The mean rate of hashes over that '
+                                                     'interval.'}]}}
+        refreshed = catalog.updated_from_response(response)
+        self.assertEqual(refreshed.aggregation('price'), catalog.aggregation('price'))
+        self.assertEqual(refreshed.aggregation('new.metric'), 'sum')
+        self.assertEqual(refreshed.aggregation('new.rate'), 'mean')
+        unique = catalog.updated_from_response({'data': {'metrics': [
+            {'metric_id': 'new.addr', 'description': 'The sum count of unique addresses.'},
+            {'metric_id': 'new.med', 'description': 'The median fee of transactions.'}]}})
+        self.assertIsNone(unique.aggregation('new.addr'))
+        self.assertIsNone(unique.aggregation('new.med'))
+        self.assertIsNone(catalog.aggregation('act.addr.cnt'))
+        self.assertNotIn('blk.cnt', refreshed.timeseries_metrics)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,151 @@
+import json
+import os
+import tempfile
+import threading
+import unittest
+
+import numpy as np
+import pandas as pd
+
+from messari.export import ExportJob, PartitionedWriter, main
+
+
+class FakeMessari:
+    """Messari client returning generated timeseries"""
+
+    def __init__(self, fail=()):
+        self.fail = set(fail)
+        self.calls = []
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self._lock = threading.Lock()
+
+    def get_metric_timeseries(self, asset_slugs, asset_metric, start=None, end=None,
+                              interval="1d"):
+        with self._lock:
+            self.calls.append((asset_slugs, asset_metric, start, end, interval))
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            if asset_slugs in self.fail:
+                raise SystemError("429 Too Many Requests")
+            index = pd.date_range(start, end, freq="D")
+            if asset_metric == "price":
+                columns = pd.MultiIndex.from_product([[asset_slugs], ["open", "close"]])
+                return pd.DataFrame(np.ones((len(index), 2)), index=index, columns=columns)
+            return pd.DataFrame({asset_slugs: np.arange(len(index), dtype=float)}, index=index)
+        finally:
+            with self._lock:
+                self.in_flight -= 1
+
+
+class FakeDeFiLlama:
+    """DeFi Llama client returning generated timeseries"""
+
+    def get_protocol_tvl_timeseries(self, asset_slugs, start_date=None, end_date=None):
+        index = pd.date_range(start_date, end_date, freq="D")
+        columns = pd.MultiIndex.from_tuples([(asset_slugs, "Ethereum", "totalLiquidityUSD"),
+                                             (asset_slugs, "Ethereum", "USDC")])
+        values = np.column_stack([np.arange(len(index)), np.full(len(index), np.nan)])
+        values[-1, 1] = 5.0
+        return pd.DataFrame(values, index=index, columns=columns)
+
+    def get_chain_tvl_timeseries(self, chains_in, start_date=None, end_date=None):
+        index = pd.date_range(start_date, end_date, freq="D")
+        return pd.DataFrame({chains_in: np.arange(len(index), dtype=float)}, index=index)
+
+
+class TestExport(unittest.TestCase):
+    """This is a unit testing class for testing bulk exports"""
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.output = self.tmp.name
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def read(self, *parts):
+        return pd.read_csv(os.path.join(self.output, *parts), index_col="date",
+                           parse_dates=["date"])
+
+    def test_partitioned_csv(self):
+        """Test tasks are written to date/asset partitions with flat columns"""
+        job = ExportJob(self.output, assets=["bitcoin", "ethereum"], metrics=["price", "sply.circ"],
+                        protocols=["aave"], chains=["Ethereum"], start="2021-01-30",
+                        end="2021-02-02", file_format="csv", concurrency=2)
+        messari = FakeMessari()
+        report = job.run({"messari": messari, "defillama": FakeDeFiLlama()})
+
+        self.assertEqual(report.failures, {})
+        self.assertEqual(report.tasks, 6)
+        self.assertEqual(len(messari.calls), 4)
+        self.assertLessEqual(messari.max_in_flight, 2)
+
+        january = self.read("price", "date=2021-01", "asset=bitcoin", "part-0.csv")
+        self.assertEqual(list(january.columns), ["open", "close"])
+        self.assertEqual(len(january), 2)
+        february = self.read("sply.circ", "date=2021-02", "asset=ethereum", "part-0.csv")
+        self.assertEqual(list(february.columns), ["sply.circ"])
+        self.assertEqual(february["sply.circ"].tolist(), [2.0, 3.0])
+
+        tvl = self.read("protocol_tvl", "date=2021-02", "asset=aave", "part-0.csv")
+        self.assertEqual(list(tvl.columns), ["chain", "token", "value"])
+        # Missing token amounts aren't written
+        self.assertEqual(tvl["token"].tolist(), ["totalLiquidityUSD", "totalLiquidityUSD",
+                                                 "USDC"])
+        chain = self.read("chain_tvl", "date=2021-01", "asset=Ethereum", "part-0.csv")
+        self.assertEqual(list(chain.columns), ["tvl"])
+
+    def test_failures_and_retries(self):
+        """Test failed tasks are retried, reported & don't stop other tasks"""
+        job = ExportJob(self.output, assets=["bitcoin", "ethereum"], metrics=["price"],
+                        start="2021-01-01", end="2021-01-02", file_format="csv",
+                        retries=1, backoff=0)
+        messari = FakeMessari(fail=["ethereum"])
+        report = job.run({"messari": messari})
+        self.assertEqual(list(report.failures), ["price/ethereum"])
+        self.assertEqual(report.tasks, 1)
+        self.assertEqual([call[0] for call in messari.calls].count("ethereum"), 2)
+
+    def test_job_spec(self):
+        """Test job specs & command line options build jobs"""
+        job = ExportJob.from_dict({"output": "out", "start": "2021-01-01", "end": "2021-02-01",
+                                   "messari": {"assets": ["bitcoin"], "metrics": ["price"]},
+                                   "defillama": {"global": True}, "format": "csv"})
+        self.assertEqual([task.name for task in job.tasks()],
+                         ["price/bitcoin", "global_tvl/global"])
+        with self.assertRaises(ValueError):
+            ExportJob.from_dict({"output": "out", "messari": {"assets": ["bitcoin"]}})
+        with self.assertRaises(ValueError):
+            ExportJob.from_dict({"output": "out", "defillama": {"protocol": ["aave"]}})
+        with self.assertRaises(ValueError):
+            ExportJob(self.output, file_format="xlsx")
+
+        spec_path = os.path.join(self.output, "job.json")
+        with open(spec_path, "w") as outfile:
+            json.dump({"output": self.output, "format": "csv",
+                       "messari": {"assets": ["bitcoin"], "metrics": ["price"]}}, outfile)
+        exit_code = main([spec_path, "--start", "2021-01-01", "--end", "2021-01-03",
+                          "--assets", "bitcoin", "ethereum"], clients={"messari": FakeMessari()})
+        self.assertEqual(exit_code, 0)
+        self.assertTrue(os.path.exists(os.path.join(self.output, "price", "date=2021-01",
+                                                    "asset=ethereum", "part-0.csv")))
+        self.assertEqual(main([spec_path, "--start", "2021-01-01"]), 2)
+
+    def test_parquet_requires_pyarrow(self):
+        """Test parquet exports fail fast without pyarrow"""
+        try:
+            import pyarrow  # pylint: disable=import-outside-toplevel,unused-import
+        except ImportError:
+            with self.assertRaises(ImportError):
+                PartitionedWriter(self.output, "parquet")
+        else:
+            writer = PartitionedWriter(self.output, "parquet")
+            frame = pd.DataFrame({"tvl": [1.0]}, index=pd.to_datetime(["2021-01-01"]))
+            path, = writer.write("global_tvl", "global", frame)
+            pd.testing.assert_frame_equal(pd.read_parquet(path), frame.rename_axis("date"))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,120 @@
+import os
+import subprocess
+import sys
+import tempfile
+import unittest
+from unittest import mock
+
+import numpy as np
+import pandas as pd
+
+from messari.cache import CachePolicy
+from messari.defillama import DeFiLlama
+
+try:
+    import pyarrow  # pylint: disable=unused-import
+    HAS_PYARROW = True
+except ImportError:
+    HAS_PYARROW = False
+
+if HAS_PYARROW:
+    from messari.frame_cache import ArrowFrameCache, frame_to_table, table_to_frame
+
+
+def tvl_frame():
+    """Protocol tvl shaped frame with missing values"""
+    index = pd.date_range("2021-01-01", periods=5, freq="D")
+    columns = pd.MultiIndex.from_tuples([("aave", "Ethereum", "totalLiquidityUSD"),
+                                         ("aave", "Ethereum", "USDC"), ("aave", "all", "USDC")])
+    values = np.arange(15, dtype=float).reshape(5, 3)
+    values[0, 1] = np.nan
+    return pd.DataFrame(values, index=index, columns=columns)
+
+
+@unittest.skipUnless(HAS_PYARROW, "requires pyarrow")
+class TestArrowFrameCache(unittest.TestCase):
+    """This is a unit testing class for testing the memory mapped frame cache"""
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.cache = ArrowFrameCache(self.tmp.name)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_round_trip(self):
+        """Test frames keep their labels, index & NaN values without nulls"""
+        frame = tvl_frame()
+        table = frame_to_table(frame)
+        self.assertTrue(all(table.column(i).null_count == 0 for i in range(table.num_columns)))
+        pd.testing.assert_frame_equal(table_to_frame(table), frame, check_freq=False)
+
+        flat = pd.DataFrame({"tvl": [1.0, 2.0], "chain": ["Ethereum", None]},
+                            index=pd.to_datetime(["2021-01-01", "2021-01-02"]).rename("date"))
+        pd.testing.assert_frame_equal(table_to_frame(frame_to_table(flat)), flat)
+
+    def test_memory_mapped_reads(self):
+        """Test warm reads are served from the mapped file without rebuilding"""
+        build = mock.Mock(return_value=tvl_frame())
+        policy = CachePolicy(ttl=60)
+        first = self.cache.get(("tvl", "aave"), policy, build)
+        second = self.cache.get(("tvl", "aave"), policy, build)
+        self.assertEqual(build.call_count, 1)
+        pd.testing.assert_frame_equal(first, tvl_frame())
+        pd.testing.assert_frame_equal(second, tvl_frame(), check_freq=False)
+        # Numeric columns are views of the mapped file
+        values = second.iloc[:, 0].to_numpy()
+        self.assertFalse(values.flags.owndata)
+        self.assertIs(self.cache.get(("tvl", "aave"), policy, build), second)
+
+        # Other processes read the same file
+        code = (f"from messari.frame_cache import ArrowFrameCache; "
+                f"from messari.cache import CachePolicy; "
+                f"frame = ArrowFrameCache({self.tmp.name!r}).get(('tvl', 'aave'), "
+                f"CachePolicy(ttl=60), None); print(frame.iloc[4, 0])")
+        output = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True,
+                                check=True).stdout
+        self.assertEqual(output.strip(), "12.0")
+
+    def test_expiry(self):
+        """Test expired files are rebuilt & deleted keys are missing"""
+        build = mock.Mock(return_value=tvl_frame())
+        self.cache.get("tvl", CachePolicy(ttl=60), build)
+        path = self.cache.path("tvl")
+        os.utime(path, (os.path.getmtime(path) - 120,) * 2)
+        self.cache.get("tvl", CachePolicy(ttl=60), build)
+        self.assertEqual(build.call_count, 2)
+        self.cache.delete("tvl")
+        self.assertFalse(os.path.exists(path))
+
+    def test_client_frame_cache(self):
+        """Test protocol tvl frames are served from the frame cache"""
+        dl = DeFiLlama(frame_cache=self.tmp.name)
+        with mock.patch.object(dl, "_get_protocol_tvl_df", return_value=tvl_frame()) as build:
+            dl.get_protocol_tvl_timeseries("aave", start_date="2021-01-01")
+            tvl_df = dl.get_protocol_tvl_timeseries("aave", start_date="2021-01-01")
+            dl.get_protocol_tvl_timeseries("aave", start_date="2021-01-02")
+        self.assertEqual(build.call_count, 2)
+        pd.testing.assert_frame_equal(tvl_df, tvl_frame(), check_freq=False)
+
+
+class TestWithoutPyarrow(unittest.TestCase):
+    """This is a unit testing class for testing the frame cache is optional"""
+
+    @unittest.skipIf(HAS_PYARROW, "pyarrow is installed")
+    def test_import_error(self):
+        """Test a frame cache without pyarrow fails with install instructions"""
+        with tempfile.TemporaryDirectory() as directory:
+            with self.assertRaisesRegex(ImportError, "pip install pyarrow"):
+                DeFiLlama(frame_cache=directory)
+
+    def test_no_frame_cache(self):
+        """Test frames are built directly without a frame cache"""
+        dl = DeFiLlama()
+        self.assertIsNone(dl.frame_cache)
+        build = mock.Mock(return_value="frame")
+        self.assertEqual(dl.get_frame(("key",), "get_protocol_tvl_timeseries", build), "frame")
+
+
+if __name__ == "__main__":
+    unittest.main()
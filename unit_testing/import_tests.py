@@ -0,0 +1,59 @@
+import subprocess
+import sys
+import unittest
+
+import messari.defillama
+from messari.defillama.defillama import DeFiLlama
+from messari.lazy import LazyModule
+
+HEAVY_MODULES = ("pandas", "numpy", "requests")
+
+
+def loaded_modules(statement: str) -> list:
+    """Heavy modules imported after running statement in a fresh interpreter"""
+    code = f"import sys; {statement}; " \
+           f"print(','.join(m for m in {HEAVY_MODULES!r} if m in sys.modules))"
+    output = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True,
+                            check=True).stdout.strip()
+    return output.split(",") if output else []
+
+
+class TestLazyImports(unittest.TestCase):
+    """This is a unit testing class for testing the package imports lazily"""
+
+    def test_import_and_construct(self):
+        """Test importing & constructing clients doesn't import pandas, numpy or requests"""
+        self.assertEqual(loaded_modules("import messari"), [])
+        self.assertEqual(loaded_modules(
+            "from messari.defillama import DeFiLlama; DeFiLlama()"), [])
+        self.assertEqual(loaded_modules(
+            "from messari import Messari; Messari(api_key='key')"), [])
+
+    def test_first_use_loads(self):
+        """Test building a frame or a session imports what it needs"""
+        self.assertEqual(loaded_modules(
+            "from messari.defillama.helpers import days_to_index; days_to_index([0])"),
+            ["pandas", "numpy"])
+        self.assertEqual(loaded_modules(
+            "from messari.defillama import DeFiLlama; DeFiLlama().session"), ["requests"])
+
+    def test_lazy_module(self):
+        """Test the stand in module forwards attributes once loaded"""
+        module = LazyModule("json")
+        self.assertIn("not loaded", repr(module))
+        self.assertEqual(module.dumps([1]), "[1]")
+        self.assertIn("dumps", module.__dict__)
+        self.assertNotIn("not loaded", repr(module))
+        with self.assertRaises(AttributeError):
+            module.missing_attribute  # pylint: disable=pointless-statement
+
+    def test_package_attributes(self):
+        """Test public names of the client modules stay reachable from the packages"""
+        self.assertIs(messari.defillama.DeFiLlama, DeFiLlama)
+        self.assertIn("DeFiLlama", dir(messari.defillama))
+        with self.assertRaises(AttributeError):
+            messari.defillama.missing_attribute  # pylint: disable=pointless-statement
+
+
+if __name__ == "__main__":
+    unittest.main()
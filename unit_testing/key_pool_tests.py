@@ -0,0 +1,156 @@
+import threading
+import unittest
+from unittest import mock
+
+from messari.key_pool import ApiKeyPool
+from messari.messari import Messari
+
+
+class FakeClock:
+    """Manually advanced clock"""
+
+    def __init__(self):
+        self.now = 100.0
+
+    def __call__(self):
+        return self.now
+
+
+def fake_response(status_code=200, headers=None, payload=None):
+    """Mocked requests.Response"""
+    response = mock.Mock(status_code=status_code, headers=headers or {})
+    response.json.return_value = payload if payload is not None else {'data': []}
+    return response
+
+
+class TestApiKeyPool(unittest.TestCase):
+    """This is a unit testing class for testing API key rotation"""
+
+    def test_spreads_requests(self):
+        """Test requests alternate across keys with the same state"""
+        pool = ApiKeyPool(['key-a', 'key-b', 'key-c'])
+        used = []
+        for _ in range(6):
+            state = pool.acquire()
+            used.append(state.key)
+            pool.release(state)
+        self.assertEqual(sorted(used), ['key-a', 'key-a', 'key-b', 'key-b', 'key-c', 'key-c'])
+
+    def test_remaining_from_headers(self):
+        """Test keys with more remaining requests are preferred"""
+        pool = ApiKeyPool(['key-a', 'key-b'])
+        states = {state.key: state for state in pool.states}
+        pool.update(states['key-a'], 200, {'X-RateLimit-Limit': '20', 'X-RateLimit-Remaining': '3'})
+        pool.update(states['key-b'], 200, {'x-ratelimit-remaining': '15'})
+        self.assertEqual(states['key-a'].limit, 20)
+        state = pool.acquire()
+        self.assertEqual(state.key, 'key-b')
+        self.assertEqual(state.remaining, 14)
+
+    def test_exhausted_key_skipped(self):
+        """Test exhausted & throttled keys are skipped until they recover"""
+        clock = FakeClock()
+        pool = ApiKeyPool(['key-a', 'key-b'], clock=clock)
+        states = {state.key: state for state in pool.states}
+        pool.update(states['key-a'], 200, {'x-ratelimit-remaining': '0',
+                                           'x-ratelimit-reset': '30'})
+        pool.update(states['key-b'], 429, {'retry-after': '10'})
+        self.assertEqual(states['key-b'].throttles, 1)
+        with self.assertRaises(SystemError):
+            pool.acquire(timeout=5)
+        clock.now += 10
+        self.assertEqual(pool.acquire().key, 'key-b')
+        clock.now += 20
+        self.assertEqual(pool.acquire(timeout=0).key, 'key-a')
+
+    def test_throttle_backoff(self):
+        """Test consecutive 429s without reset headers back off exponentially"""
+        clock = FakeClock()
+        pool = ApiKeyPool(['key-a'], backoff=1, clock=clock)
+        state = pool.states[0]
+        pool.update(state, 429, {})
+        self.assertEqual(state.throttled_until, clock.now + 1)
+        pool.update(state, 429, {})
+        self.assertEqual(state.throttled_until, clock.now + 2)
+        pool.update(state, 200, {})
+        self.assertEqual(state.consecutive_throttles, 0)
+
+    def test_recovers_without_headers(self):
+        """Test a key throttled once isn't throttled again by responses without headers"""
+        clock = FakeClock()
+        pool = ApiKeyPool(['key-a'], clock=clock)
+        state = pool.states[0]
+        pool.update(state, 429, {'retry-after': '1'})
+        clock.now += 1
+        pool.update(state, 200, {})
+        self.assertEqual(pool.acquire(timeout=0).key, 'key-a')
+
+    def test_local_rate(self):
+        """Test a per key rate spaces requests of each key"""
+        clock = FakeClock()
+        pool = ApiKeyPool(['key-a', 'key-b'], rate=1, clock=clock)
+        pool.acquire()
+        pool.acquire()
+        # Both keys used their slot, a third request has to wait a second
+        with self.assertRaises(SystemError):
+            pool.acquire(timeout=0.5)
+
+    def test_thread_safety(self):
+        """Test concurrent acquires keep the accounting consistent"""
+        pool = ApiKeyPool([f'key-{i}' for i in range(4)])
+
+        def worker():
+            for _ in range(250):
+                pool.release(pool.acquire())
+
+        threads = [threading.Thread(target=worker) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(sum(state.requests for state in pool.states), 1000)
+        self.assertTrue(all(state.in_flight == 0 for state in pool.states))
+
+    def test_invalid(self):
+        """Test pools need keys & a positive rate"""
+        with self.assertRaises(ValueError):
+            ApiKeyPool([])
+        with self.assertRaises(ValueError):
+            ApiKeyPool(['key-a'], rate=0)
+
+
+class TestMessariKeyPool(unittest.TestCase):
+    """This is a unit testing class for testing Messari clients with several keys"""
+
+    def test_rotation(self):
+        """Test requests carry each key of the pool"""
+        messari = Messari(api_key=['key-a', 'key-b'])
+        self.assertEqual(messari.key_pool.keys, ['key-a', 'key-b'])
+        self.assertEqual(messari.api_dict['x-messari-api-key'], 'key-a')
+        session = mock.Mock()
+        session.get.return_value = fake_response()
+        messari._session = session
+        for _ in range(4):
+            messari.get_response('https://example.com', headers=messari.api_dict)
+        keys = [call.kwargs['headers']['x-messari-api-key'] for call in session.get.call_args_list]
+        self.assertEqual(sorted(keys), ['key-a', 'key-a', 'key-b', 'key-b'])
+
+    def test_retry_on_other_key(self):
+        """Test a throttled request is retried with another key"""
+        messari = Messari(api_key=['key-a', 'key-b'])
+        session = mock.Mock()
+        session.get.side_effect = [fake_response(429, {'retry-after': '60'}),
+                                   fake_response(payload={'data': 1})]
+        messari._session = session
+        self.assertEqual(messari.get_response('https://example.com'), {'data': 1})
+        keys = [call.kwargs['headers']['x-messari-api-key'] for call in session.get.call_args_list]
+        self.assertEqual(len(set(keys)), 2)
+        self.assertEqual(sum(state.throttles for state in messari.key_pool.states), 1)
+
+    def test_single_key(self):
+        """Test a single key doesn't create a pool"""
+        self.assertIsNone(Messari(api_key='key-a').key_pool)
+
+
+if __name__ == '__main__':
+    unittest.main()
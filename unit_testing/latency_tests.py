@@ -0,0 +1,194 @@
+import itertools
+import threading
+import time
+import unittest
+from unittest import mock
+
+import requests
+
+from messari.defillama import DeFiLlama
+from messari.key_pool import ApiKeyPool
+from messari.latency import DEFAULT_TIMEOUT, HedgePolicy, current_deadline, request_deadline, \
+    request_timeout
+from messari.messari import Messari
+from messari.priority import INTERACTIVE, RequestScheduler, request_priority
+
+
+class TestDeadline(unittest.TestCase):
+    """This is a unit testing class for testing request timeouts & deadlines"""
+
+    def test_timeout(self):
+        """Test timeouts are shortened to the deadline"""
+        self.assertEqual(request_timeout((3, 30)), (3, 30))
+        self.assertEqual(request_timeout(10), (10, 10))
+        with request_deadline(5):
+            connect, read = request_timeout((3, 30))
+            self.assertEqual(connect, 3)
+            self.assertTrue(4 < read <= 5)
+            with request_deadline(60):
+                # Nested deadlines keep the earliest
+                self.assertTrue(request_timeout(None)[1] <= 5)
+        self.assertIsNone(current_deadline())
+
+    def test_expired(self):
+        """Test requests past the deadline raise SystemError"""
+        with request_deadline(0.01):
+            time.sleep(0.02)
+            with self.assertRaises(SystemError):
+                request_timeout(DEFAULT_TIMEOUT)
+
+    def test_client_timeouts(self):
+        """Test client requests carry timeouts & timeouts raise SystemError"""
+        dl = DeFiLlama(timeout=(1, 2))
+        session = mock.Mock()
+        session.get.return_value.json.return_value = [{'name': 'Ethereum'}]
+        dl._session = session
+        dl.get_chains()
+        self.assertEqual(session.get.call_args.kwargs['timeout'], (1, 2))
+        session.get.side_effect = requests.exceptions.ReadTimeout('slow')
+        with self.assertRaises(SystemError):
+            dl.get_chains()
+
+    def test_deadline_spans_calls(self):
+        """Test one deadline bounds every request of a multi-request call"""
+        dl = DeFiLlama()
+        session = mock.Mock()
+
+        def get(*args, **kwargs):
+            time.sleep(0.05)
+            return mock.Mock(status_code=200, **{'json.return_value': {'tvl': 1}})
+
+        session.get.side_effect = get
+        dl._session = session
+        with request_deadline(0.12):
+            with self.assertRaises(SystemError):
+                for _ in range(5):
+                    dl.get_response('https://api.llama.fi/protocol/aave')
+        self.assertEqual(session.get.call_count, 3)
+
+
+class TestHedgePolicy(unittest.TestCase):
+    """This is a unit testing class for testing hedged requests"""
+
+    def test_threshold(self):
+        """Test the threshold is the latency percentile once enough samples exist"""
+        policy = HedgePolicy(percentile=90, min_samples=10, min_delay=0)
+        for latency in range(1, 10):
+            policy.record('host', latency / 100)
+        self.assertIsNone(policy.threshold('host'))
+        policy.record('host', 0.1)
+        self.assertEqual(policy.threshold('host'), 0.09)
+        self.assertIsNone(policy.threshold('other'))
+
+    def test_hedge_wins(self):
+        """Test a slow request gets a hedge & the first response is used"""
+        policy = HedgePolicy(min_samples=1, max_ratio=1)
+        policy.record('host', 0.01)
+        calls = itertools.count()
+        discarded = []
+
+        def send():
+            if next(calls) == 0:
+                time.sleep(0.3)
+                return 'slow'
+            return 'fast'
+
+        start = time.monotonic()
+        self.assertEqual(policy.call(send, 'host', discard=discarded.append), 'fast')
+        self.assertLess(time.monotonic() - start, 0.25)
+        self.assertEqual(policy.to_dict(), {'requests': 1, 'hedges': 1, 'hedge_wins': 1})
+        time.sleep(0.35)
+        self.assertEqual(discarded, ['slow'])
+
+    def test_no_hedge_when_fast(self):
+        """Test fast requests & requests without samples aren't hedged"""
+        policy = HedgePolicy(min_samples=1, max_ratio=1)
+        self.assertEqual(policy.call(lambda: 1, 'host'), 1)
+        self.assertEqual(policy.call(lambda: 2, 'host'), 2)
+        self.assertEqual(policy.hedges, 0)
+
+    def test_budget(self):
+        """Test hedges are capped at max_ratio of requests"""
+        policy = HedgePolicy(min_samples=1, max_ratio=0.5, min_delay=0.01)
+        for _ in range(100):
+            policy.record('host', 0.001)
+        for _ in range(4):
+            policy.call(lambda: time.sleep(0.03), 'host')
+        self.assertEqual(policy.hedges, 2)
+
+    def test_errors(self):
+        """Test a failed request waits for its hedge & both failing raises"""
+        policy = HedgePolicy(min_samples=1, max_ratio=1)
+        policy.record('host', 0.01)
+        lock, calls = threading.Lock(), []
+
+        def send():
+            with lock:
+                calls.append(1)
+                first = len(calls) == 1
+            time.sleep(0.05)
+            if first:
+                raise SystemError('failed')
+            return 'ok'
+
+        self.assertEqual(policy.call(send, 'host'), 'ok')
+
+        def fail():
+            time.sleep(0.05)
+            raise SystemError('failed')
+
+        with self.assertRaises(SystemError):
+            policy.call(fail, 'host')
+
+    def test_client_hedging(self):
+        """Test clients hedge slow requests to the same host"""
+        policy = HedgePolicy(min_samples=1, max_ratio=1)
+        policy.record('api.llama.fi', 0.01)
+        dl = DeFiLlama(hedging=policy)
+        calls = itertools.count()
+        session = mock.Mock()
+
+        def get(*args, **kwargs):
+            if next(calls) == 0:
+                time.sleep(0.3)
+            return mock.Mock(status_code=200, **{'json.return_value': [{'name': 'Ethereum'}]})
+
+        session.get.side_effect = get
+        dl._session = session
+        start = time.monotonic()
+        self.assertEqual(dl.get_chains(), ['Ethereum'])
+        self.assertLess(time.monotonic() - start, 0.25)
+        self.assertEqual(policy.hedge_wins, 1)
+
+    def test_hedges_admitted(self):
+        """Test hedges are admitted by the scheduler at the caller's priority & take
+        their own key, whose response headers are recorded"""
+        policy = HedgePolicy(min_samples=1, max_ratio=1)
+        policy.record('example.com', 0.01)
+        scheduler = RequestScheduler(rate=1000, burst=10)
+        messari = Messari(api_key=ApiKeyPool(['key-a', 'key-b']), scheduler=scheduler,
+                          hedging=policy)
+        calls = itertools.count()
+        session = mock.Mock()
+
+        def get(*args, **kwargs):
+            if next(calls) == 0:
+                time.sleep(0.3)
+            return mock.Mock(status_code=200, headers={'x-ratelimit-remaining': '7'},
+                             **{'json.return_value': {'data': 1}})
+
+        session.get.side_effect = get
+        messari._session = session
+        with request_priority(INTERACTIVE):
+            self.assertEqual(messari.get_response('https://example.com'), {'data': 1})
+        self.assertEqual(policy.hedge_wins, 1)
+        self.assertEqual(dict(scheduler.admitted), {INTERACTIVE: 2})
+        keys = [call.kwargs['headers']['x-messari-api-key'] for call in session.get.call_args_list]
+        self.assertEqual(sorted(keys), ['key-a', 'key-b'])
+        time.sleep(0.35)
+        self.assertEqual([state.remaining for state in messari.key_pool.states], [7, 7])
+        self.assertTrue(all(state.in_flight == 0 for state in messari.key_pool.states))
+
+
+if __name__ == '__main__':
+    unittest.main()
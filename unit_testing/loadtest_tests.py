@@ -0,0 +1,88 @@
+import json
+import os
+import random
+import tempfile
+import unittest
+
+from messari.defillama import DeFiLlama
+from messari.key_pool import ApiKeyPool
+from messari.loadtest import FakeApiServer, LatencyDistribution, main, percentiles, \
+    run_scenario
+from messari.messari import Messari
+
+
+class TestLatencyDistribution(unittest.TestCase):
+    """This is a unit testing class for testing fake API latencies"""
+
+    def test_from_spec(self):
+        """Test distributions are parsed & sampled within their bounds"""
+        rng = random.Random(0)
+        self.assertEqual(LatencyDistribution.from_spec('constant:0.01').sample(rng), 0.01)
+        uniform = LatencyDistribution.from_spec('uniform:0.01:0.02')
+        self.assertTrue(all(0.01 <= uniform.sample(rng) <= 0.02 for _ in range(100)))
+        lognormal = LatencyDistribution.from_spec('lognormal:0.02:0.5')
+        self.assertTrue(all(lognormal.sample(rng) > 0 for _ in range(100)))
+        for spec in ('gamma:1', 'uniform:1', 'constant:fast'):
+            with self.assertRaises(ValueError):
+                LatencyDistribution.from_spec(spec)
+
+    def test_percentiles(self):
+        """Test nearest rank percentiles in milliseconds"""
+        report = percentiles([i / 1000 for i in range(1, 101)])
+        self.assertAlmostEqual(report['p50_ms'], 50)
+        self.assertAlmostEqual(report['p99_ms'], 99)
+        self.assertAlmostEqual(report['max_ms'], 100)
+        self.assertEqual(percentiles([]), {})
+
+
+class TestFakeApiServer(unittest.TestCase):
+    """This is a unit testing class for testing clients against the fake API"""
+
+    def test_clients(self):
+        """Test real client methods parse the fake responses"""
+        with FakeApiServer() as server:
+            overrides = server.base_url_overrides()
+            messari = Messari(api_key='key', base_url_overrides=overrides)
+            metrics = messari.get_asset_metrics(['asset-0', 'asset-1'])
+            self.assertEqual(list(metrics['id']), ['asset-0', 'asset-1'])
+            dl = DeFiLlama(base_url_overrides=overrides)
+            tvl = dl.get_protocol_tvl_timeseries(['protocol-0', 'protocol-1'])
+            self.assertEqual(len(tvl), 365)
+            self.assertEqual(set(tvl.columns.get_level_values(0)), {'protocol-0', 'protocol-1'})
+            self.assertEqual(server.status_counts, {200: 4})
+
+    def test_scenario_report(self):
+        """Test throttled requests fail without a key pool & are retried with one"""
+        with FakeApiServer(throttle_rate=0.3, retry_after=0.01, seed=1) as server:
+            overrides = server.base_url_overrides()
+            assets = [f'asset-{i}' for i in range(5)]
+            single = Messari(api_key='key', base_url_overrides=overrides)
+            report = run_scenario('single', single, lambda: single.get_asset_metrics(assets),
+                                  server, concurrency=2, calls=6)
+            self.assertGreater(report['errors'].get('SystemError', 0), 0)
+            self.assertIn('429', report['status_counts'])
+
+            pooled = Messari(api_key=ApiKeyPool([f'key-{i}' for i in range(8)]),
+                             base_url_overrides=overrides)
+            report = run_scenario('pooled', pooled, lambda: pooled.get_asset_metrics(assets),
+                                  server, concurrency=2, calls=6)
+        self.assertEqual(report['succeeded'], 6)
+        self.assertEqual(report['requests'], sum(report['status_counts'].values()))
+        self.assertGreater(report['call_latency']['p99_ms'], 0)
+        self.assertEqual(len(report['keys']), 8)
+
+    def test_main(self):
+        """Test the command line writes a JSON report"""
+        with tempfile.TemporaryDirectory() as directory:
+            output = os.path.join(directory, 'report.json')
+            self.assertEqual(main(['--assets', '3', '--protocols', '2', '--calls', '2',
+                                   '--latency', 'constant:0', '-o', output]), 0)
+            with open(output, 'r', encoding='utf-8') as infile:
+                report = json.load(infile)
+        self.assertEqual([s['scenario'] for s in report['scenarios']],
+                         ['asset_metrics', 'protocol_tvl'])
+        self.assertTrue(all(s['succeeded'] == 2 for s in report['scenarios']))
+
+
+if __name__ == '__main__':
+    unittest.main()
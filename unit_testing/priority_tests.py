@@ -0,0 +1,116 @@
+import threading
+import time
+import unittest
+from unittest import mock
+
+from messari.defillama import DeFiLlama
+from messari.priority import BATCH, DEFAULT, INTERACTIVE, RequestScheduler, \
+    current_priority, request_priority
+
+
+class TestRequestPriority(unittest.TestCase):
+    """This is a unit testing class for testing the thread local priority context"""
+
+    def test_context(self):
+        """Test priorities nest & don't leak across threads"""
+        self.assertEqual(current_priority(), DEFAULT)
+        seen = []
+        with request_priority(BATCH):
+            with request_priority(INTERACTIVE):
+                self.assertEqual(current_priority(), INTERACTIVE)
+            self.assertEqual(current_priority(), BATCH)
+            thread = threading.Thread(target=lambda: seen.append(current_priority()))
+            thread.start()
+            thread.join()
+        self.assertEqual(current_priority(), DEFAULT)
+        self.assertEqual(seen, [DEFAULT])
+
+
+class TestRequestScheduler(unittest.TestCase):
+    """This is a unit testing class for testing priority request scheduling"""
+
+    def test_rate(self):
+        """Test requests are admitted at the configured rate"""
+        scheduler = RequestScheduler(rate=100)
+        start = time.monotonic()
+        for _ in range(11):
+            scheduler.admit()
+        self.assertGreaterEqual(time.monotonic() - start, 0.09)
+        self.assertEqual(scheduler.admitted[DEFAULT], 11)
+
+    def test_interactive_jumps_ahead(self):
+        """Test interactive requests pass a batch backlog while batch still progresses"""
+        scheduler = RequestScheduler(rate=200)
+        order, lock = [], threading.Lock()
+
+        def request(priority):
+            scheduler.admit(priority)
+            with lock:
+                order.append(priority)
+
+        batch = [threading.Thread(target=request, args=(BATCH,)) for _ in range(40)]
+        for thread in batch:
+            thread.start()
+        time.sleep(0.05)
+        interactive = [threading.Thread(target=request, args=(INTERACTIVE,)) for _ in range(5)]
+        for thread in interactive:
+            thread.start()
+        for thread in batch + interactive:
+            thread.join(10)
+        # Interactive requests arrived behind ~30 waiting batch requests
+        last_interactive = max(i for i, priority in enumerate(order) if priority == INTERACTIVE)
+        self.assertLess(last_interactive, 25)
+        self.assertEqual(order.count(BATCH), 40)
+
+    def test_weighted_share(self):
+        """Test backlogged classes share the rate by weight"""
+        scheduler = RequestScheduler(rate=100, weights={'high': 3, 'low': 1})
+        order, lock = [], threading.Lock()
+
+        def request(priority):
+            scheduler.admit(priority)
+            with lock:
+                order.append(priority)
+
+        threads = [threading.Thread(target=request, args=(priority,))
+                   for priority in ['low'] * 30 + ['high'] * 30]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join(10)
+        # Both backlogs queue within the first admissions, then high gets 3 of every 4
+        self.assertGreaterEqual(order[4:24].count('high'), 14)
+
+    def test_timeout(self):
+        """Test a request waiting past its timeout is removed from the queue"""
+        scheduler = RequestScheduler(rate=1)
+        scheduler.admit()
+        with self.assertRaises(SystemError):
+            scheduler.admit(timeout=0.05)
+        self.assertEqual(scheduler.waiting(), {INTERACTIVE: 0, DEFAULT: 0, BATCH: 0})
+
+    def test_invalid(self):
+        """Test invalid rates, weights & classes raise ValueError"""
+        with self.assertRaises(ValueError):
+            RequestScheduler(rate=0)
+        with self.assertRaises(ValueError):
+            RequestScheduler(rate=1, weights={'a': 0})
+        with self.assertRaises(ValueError):
+            RequestScheduler(rate=1).admit('unknown')
+
+    def test_client(self):
+        """Test client requests go through the scheduler with the thread's priority"""
+        scheduler = RequestScheduler(rate=1000)
+        dl = DeFiLlama(scheduler=scheduler)
+        session = mock.Mock()
+        session.get.return_value.json.return_value = [{'name': 'Ethereum'}]
+        dl._session = session
+        with request_priority(INTERACTIVE):
+            self.assertEqual(dl.get_chains(), ['Ethereum'])
+        dl.get_chains()
+        self.assertEqual(scheduler.admitted[INTERACTIVE], 1)
+        self.assertEqual(scheduler.admitted[DEFAULT], 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,92 @@
+import unittest
+from unittest import mock
+
+import numpy as np
+
+from messari.defillama import DeFiLlama
+from messari.defillama.protocols import ProtocolIndex, protocols_to_df
+
+
+def protocols_payload():
+    """Small /protocols response"""
+    return [
+        {"slug": "aave", "name": "Aave", "symbol": "AAVE", "category": "Lending",
+         "chain": "Multi-Chain", "chains": ["Ethereum", "Arbitrum", "Polygon"], "tvl": 10.0,
+         "change_1d": 1.5, "mcap": 100},
+        {"slug": "compound", "name": "Compound", "symbol": "COMP", "category": "Lending",
+         "chain": "Ethereum", "chains": ["Ethereum"], "tvl": 5.0, "change_1d": None},
+        {"slug": "radiant", "name": "Radiant", "symbol": "RDNT", "category": "Lending",
+         "chain": "Arbitrum", "chains": ["Arbitrum"], "tvl": 20.0, "change_1d": -1.0},
+        {"slug": "gmx", "name": "GMX", "symbol": "GMX", "category": "Derivatives",
+         "chain": "Arbitrum", "chains": ["Arbitrum", "Avalanche"], "tvl": None},
+        {"slug": "aave-v1", "name": "Aave V1", "symbol": "AAVE", "category": "Lending",
+         "chain": "Ethereum", "chains": ["Ethereum"], "tvl": 1.0},
+    ]
+
+
+class TestProtocolIndex(unittest.TestCase):
+    """This is a unit testing class for testing the indexed /protocols listing"""
+
+    def test_row_per_protocol(self):
+        """Test one typed row per protocol indexed by slug"""
+        protocols_df = protocols_to_df(protocols_payload())
+        self.assertEqual(protocols_df.index.tolist(),
+                         ["aave", "compound", "radiant", "gmx", "aave-v1"])
+        self.assertEqual(protocols_df.loc["aave", "name"], "Aave")
+        self.assertEqual(protocols_df["tvl"].dtype, np.float64)
+        self.assertEqual(protocols_df["change_1d"].dtype, np.float64)
+        self.assertEqual(protocols_df["category"].dtype.name, "category")
+
+    def test_select(self):
+        """Test filters intersect secondary indexes & sort by tvl"""
+        index = ProtocolIndex(protocols_to_df(protocols_payload()))
+        lending = index.select(chain="arbitrum", category="Lending")
+        self.assertEqual(lending.index.tolist(), ["radiant", "aave"])
+        self.assertEqual(index.select(symbol="AAVE").index.tolist(), ["aave", "aave-v1"])
+        self.assertEqual(index.select(chain=["Avalanche", "Polygon"], sort_by_tvl=False)
+                         .index.tolist(), ["aave", "gmx"])
+        self.assertEqual(index.select().index.tolist()[-1], "gmx")
+        self.assertTrue(index.select(chain="Solana").empty)
+        with self.assertRaises(ValueError):
+            index.keys("name")
+
+    def test_get_protocols(self):
+        """Test get_protocols & the index are built from one response"""
+        dl = DeFiLlama()
+        with mock.patch.object(dl, "get_response", return_value=protocols_payload()):
+            protocols_df = dl.get_protocols()
+            index = dl.get_protocol_index()
+        self.assertEqual(len(protocols_df), 5)
+        self.assertIn("arbitrum", index.keys("chain"))
+
+
+class TestCurrentTvl(unittest.TestCase):
+    """This is a unit testing class for testing current tvl lookups"""
+
+    def test_bulk_snapshot(self):
+        """Test bulk mode answers from one /protocols response & falls back per slug"""
+        dl = DeFiLlama()
+        responses = {"https://api.llama.fi/protocols": protocols_payload(),
+                     "https://api.llama.fi/tvl/uniswap": 42.0,
+                     "https://api.llama.fi/tvl/gmx": {"message": "Protocol not found"}}
+        with mock.patch.object(dl, "_fetch_response",
+                               side_effect=lambda url, **kwargs: responses[url]) as fetch:
+            tvl_df = dl.get_current_tvl(["radiant", "uniswap", "aave", "gmx"], bulk=True)
+            dl.get_current_tvl(["radiant", "aave"], bulk=True)
+        self.assertEqual(tvl_df["tvl"].to_dict(),
+                         {"radiant": 20.0, "uniswap": 42.0, "aave": 10.0})
+        self.assertEqual(tvl_df.attrs["errors"], {"gmx": "Protocol not found"})
+        # One cached snapshot & one request per slug missing from it
+        self.assertEqual(fetch.call_count, 3)
+
+    def test_errors_returned(self):
+        """Test per slug errors are returned instead of printed"""
+        dl = DeFiLlama()
+        with mock.patch.object(dl, "_fetch_response", side_effect=SystemError("404")):
+            tvl_df = dl.get_current_tvl("unknown")
+        self.assertTrue(tvl_df.empty)
+        self.assertEqual(tvl_df.attrs["errors"], {"unknown": "404"})
+
+
+if __name__ == "__main__":
+    unittest.main()
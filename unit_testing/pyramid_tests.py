@@ -0,0 +1,192 @@
+import json
+import unittest
+from unittest import mock
+
+import pandas as pd
+
+from messari.messari import Messari
+from messari.messari.helpers import timeseries_to_dataframe, timeseries_block, \
+    blocks_to_dataframe
+from messari.parallel import shutdown_process_pools
+
+
+def fake_timeseries(url, params=None, headers=None):
+    """Return a fake 1h price response counting up from 0 over the requested range,
+    2021-01-01 to 2021-01-05 without a range"""
+    start, end = params.get('start', '2021-01-01'), params.get('end', '2021-01-05T23:00:00')
+    index = pd.date_range(start.rstrip('Z'), end.rstrip('Z'), freq='1h')
+    timestamps = index.as_unit('ms').asi8.tolist()
+    values = [[ts, i, i + 2, i - 1, i + 1, 1.0] for i, ts in enumerate(timestamps)]
+    columns = ['timestamp', 'open', 'high', 'low', 'close', 'volume']
+    return {'data': {'parameters': {'columns': columns}, 'values': values}}
+
+
+class TestTimeseriesPyramid(unittest.TestCase):
+    """This is a unit testing class for testing locally derived timeseries intervals"""
+
+    def test_derived_intervals(self):
+        """Test coarser intervals are rolled up locally with per column aggregation"""
+        messari = Messari()
+        with mock.patch.object(messari, '_fetch_response', side_effect=fake_timeseries) as fetch:
+            daily_df = messari.get_metric_timeseries('bitcoin', 'price', start='2021-01-01',
+                                                     end='2021-01-03T23:00:00', interval='1d',
+                                                     base_interval='1h')
+            self.assertEqual(fetch.call_count, 1)
+            self.assertEqual(len(daily_df), 3)
+            first_day = daily_df['bitcoin'].iloc[0]
+            self.assertEqual(first_day['open'], 0)
+            self.assertEqual(first_day['high'], 25)
+            self.assertEqual(first_day['low'], -1)
+            self.assertEqual(first_day['close'], 24)
+            self.assertEqual(first_day['volume'], 24)
+
+            # Served from the stored base interval without another request
+            sub_df = messari.get_metric_timeseries('bitcoin', 'price', start='2021-01-02',
+                                                   end='2021-01-03T23:00:00', interval='1d',
+                                                   base_interval='1h')
+            self.assertEqual(fetch.call_count, 1)
+            self.assertEqual(len(sub_df), 2)
+            self.assertEqual(sub_df['bitcoin'].iloc[-1]['volume'], 24)
+
+    def test_unbounded_after_range(self):
+        """Test a request without a range isn't served from a narrower stored range"""
+        messari = Messari()
+        with mock.patch.object(messari, '_fetch_response', side_effect=fake_timeseries) as fetch:
+            messari.get_metric_timeseries('bitcoin', 'price', start='2021-01-02',
+                                          end='2021-01-02T23:00:00', interval='1d',
+                                          base_interval='1h')
+            full_df = messari.get_metric_timeseries('bitcoin', 'price', interval='1d',
+                                                    base_interval='1h')
+            self.assertEqual(fetch.call_count, 2)
+            self.assertEqual(len(full_df), 5)
+            # Without a cache policy the API default range is refetched every time
+            messari.get_metric_timeseries('bitcoin', 'price', interval='1w', base_interval='1h')
+            self.assertEqual(fetch.call_count, 3)
+
+    def test_recent_points_expire(self):
+        """Test ranges reaching the present & the API default range expire after the TTL"""
+        messari = Messari(use_cache=True)
+        now = [pd.Timestamp('2021-01-03T12:30:00').timestamp()]
+        messari.pyramid.clock = lambda: now[0]
+        with mock.patch.object(messari, '_fetch_response', side_effect=fake_timeseries) as fetch:
+            messari.get_metric_timeseries('bitcoin', 'price', start='2021-01-01',
+                                          end='2021-01-03T23:00:00', interval='1d',
+                                          base_interval='1h')
+            messari.get_metric_timeseries('bitcoin', 'price', interval='1d', base_interval='1h')
+            self.assertEqual(fetch.call_count, 2)
+        ttl = messari.cache_policies['get_metric_timeseries'].ttl
+        for options in ({}, {'start': '2021-01-02', 'end': '2021-01-03T23:00:00'}):
+            self.assertTrue(messari.pyramid.covers('bitcoin', 'price', '1h', ttl=ttl, **options))
+        now[0] += ttl + 1
+        for options in ({}, {'start': '2021-01-02', 'end': '2021-01-03T23:00:00'}):
+            self.assertFalse(messari.pyramid.covers('bitcoin', 'price', '1h', ttl=ttl, **options))
+        # Completed points never expire
+        self.assertTrue(messari.pyramid.covers('bitcoin', 'price', '1h', '2021-01-01',
+                                               '2021-01-03T11:00:00', ttl=ttl))
+
+    def test_gap_before_unbounded_fetch(self):
+        """Test an unbounded fetch only covers its own rows, not the gap to earlier rows"""
+        messari = Messari()
+        with mock.patch.object(messari, '_fetch_response', side_effect=fake_timeseries) as fetch:
+            messari.get_metric_timeseries('bitcoin', 'price', start='2020-01-01',
+                                          end='2020-01-02T23:00:00', interval='1d',
+                                          base_interval='1h')
+            messari.get_metric_timeseries('bitcoin', 'price', interval='1d', base_interval='1h')
+            self.assertFalse(messari.pyramid.covers('bitcoin', 'price', '1h',
+                                                    '2020-06-01', '2020-06-30'))
+            gap_df = messari.get_metric_timeseries('bitcoin', 'price', start='2020-06-01',
+                                                   end='2020-06-30T23:00:00', interval='1d',
+                                                   base_interval='1h')
+            self.assertEqual(fetch.call_count, 3)
+            self.assertEqual(len(gap_df), 30)
+
+    def test_chunked_base_fetch(self):
+        """Test base ranges exceeding the point limit are fetched in windows"""
+        messari = Messari()
+        with mock.patch.object(messari, '_fetch_response', side_effect=fake_timeseries) as fetch:
+            weekly_df = messari.get_metric_timeseries('bitcoin', 'price', start='2021-01-04',
+                                                      end='2021-06-27', interval='1w',
+                                                      base_interval='1h')
+            self.assertEqual(fetch.call_count, 3)
+            self.assertEqual(len(weekly_df), 25)
+
+    def test_response_window(self):
+        """Test points outside the requested window are dropped before building frames"""
+        response = fake_timeseries(None, {'start': '2021-01-01', 'end': '2021-01-03T23:00:00Z'})
+        response_flat = {'parameters_columns': response['data']['parameters']['columns'],
+                         'values': response['data']['values']}
+        window_df = timeseries_to_dataframe({'bitcoin': response_flat}, start='2021-01-02',
+                                            end='2021-01-02T05:00:00Z')['bitcoin']
+        self.assertEqual(len(window_df), 6)
+        self.assertEqual(window_df.index[0], pd.Timestamp('2021-01-02'))
+        day_df = timeseries_to_dataframe({'bitcoin': response_flat}, end='2021-01-02')
+        self.assertEqual(len(day_df), 48)
+
+    def test_missing_asset_data(self):
+        """Test assets without data are left out of the frame instead of misaligning keys"""
+        response = fake_timeseries(None, {'start': '2021-01-01', 'end': '2021-01-01T23:00:00Z'})
+        missing = {'data': {'parameters': {'columns': None}, 'values': None}}
+        response_data = {'fakecoin': missing, 'bitcoin': response}
+        with self.assertLogs(level='WARNING'):
+            timeseries_df = timeseries_to_dataframe(
+                {asset: {'parameters_columns': data['data']['parameters']['columns'],
+                         'values': data['data']['values']}
+                 for asset, data in response_data.items()})
+        self.assertEqual(list(timeseries_df.columns.levels[0]), ['bitcoin'])
+        self.assertEqual(len(timeseries_df), 24)
+        blocks = {asset: timeseries_block(json.dumps(data).encode())
+                  for asset, data in response_data.items()}
+        with self.assertLogs(level='WARNING'):
+            blocks_df = blocks_to_dataframe(blocks)
+        pd.testing.assert_frame_equal(blocks_df, timeseries_df, check_dtype=False)
+
+    def test_not_derivable(self):
+        """Test distinct counts & medians are fetched at the interval instead of rolled up"""
+        messari = Messari()
+        for metric in ('act.addr.cnt', 'txn.fee.med'):
+            self.assertFalse(messari.pyramid.derivable(metric, '1h', '1d'))
+            self.assertTrue(messari.pyramid.derivable(metric, '1h', '1h'))
+        with mock.patch.object(messari, '_fetch_response', side_effect=fake_timeseries) as fetch:
+            messari.get_metric_timeseries('bitcoin', 'act.addr.cnt', start='2021-01-01',
+                                          end='2021-01-03', interval='1d', base_interval='1h')
+            self.assertEqual(fetch.call_args.kwargs['params']['interval'], '1d')
+        self.assertFalse(messari.pyramid.stored('bitcoin', 'act.addr.cnt', '1h'))
+
+    def test_finer_interval_rejected(self):
+        """Test deriving a finer interval than the base interval fails"""
+        messari = Messari()
+        with self.assertRaises(ValueError):
+            messari.get_metric_timeseries('bitcoin', 'price', start='2021-01-01',
+                                          end='2021-01-02', interval='5m', base_interval='1h')
+
+
+class TestProcessPool(unittest.TestCase):
+    """This is a unit testing class for testing timeseries decoded in worker processes"""
+
+    @classmethod
+    def tearDownClass(cls):
+        shutdown_process_pools()
+
+    def test_processes_option(self):
+        """Test timeseries decoded in worker processes match timeseries decoded in process"""
+        messari = Messari()
+
+        def fake_content(url, params=None, headers=None):
+            return json.dumps(fake_timeseries(url, params, headers)).encode()
+
+        options = {'start': '2021-01-01', 'end': '2021-01-02T23:00:00Z', 'interval': '1h'}
+        with mock.patch.object(messari, 'get_content', side_effect=fake_content) as get_content:
+            pool_df = messari.get_metric_timeseries(['bitcoin', 'ethereum'], 'price',
+                                                    processes=2, **options)
+        self.assertEqual(get_content.call_count, 2)
+        with mock.patch.object(messari, '_fetch_response', side_effect=fake_timeseries):
+            expected = messari.get_metric_timeseries(['bitcoin', 'ethereum'], 'price', **options)
+        self.assertEqual(len(pool_df), 48)
+        pd.testing.assert_frame_equal(pool_df, expected, check_dtype=False)
+        with self.assertRaises(ValueError):
+            messari.get_metric_timeseries('bitcoin', 'price', processes=2, to_dataframe=False,
+                                          **options)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,80 @@
+import threading
+import unittest
+from unittest import mock
+
+from messari.scheduler import RateLimiter, RefreshScheduler
+
+
+class FakeClock:
+    """Clock advanced manually by tests"""
+
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+class TestRefreshScheduler(unittest.TestCase):
+    """This is a unit testing class for testing the recurring feed scheduler"""
+
+    def test_cadence_priority_subscribers(self):
+        """Test due feeds run by priority, notify subscribers & requeue on their cadence"""
+        clock = FakeClock()
+        scheduler = RefreshScheduler(clock=clock)
+        received = []
+        scheduler.register("global", mock.Mock(return_value="tvl"), cadence=60)
+        scheduler.register("protocols", mock.Mock(return_value="listing"), cadence=30,
+                           priority=5, subscribers=[lambda name, result:
+                                                    received.append((name, result))])
+        self.assertEqual(scheduler.run_pending(), ["protocols", "global"])
+        self.assertEqual(received, [("protocols", "listing")])
+        self.assertEqual(scheduler.latest("global"), "tvl")
+
+        clock.now += 30
+        self.assertEqual(scheduler.run_pending(), ["protocols"])
+        clock.now += 30
+        self.assertEqual(scheduler.run_pending(), ["protocols", "global"])
+        self.assertEqual(scheduler.feeds["protocols"].runs, 3)
+
+    def test_jitter_failures_unregister(self):
+        """Test jitter delays refreshes, failures are kept & removed feeds stop"""
+        clock = FakeClock()
+        scheduler = RefreshScheduler(clock=clock, seed=1)
+        feed = scheduler.register("markets", mock.Mock(side_effect=SystemError("429")),
+                                  cadence=10, jitter=5, run_immediately=False)
+        self.assertTrue(clock.now + 10 <= scheduler.next_due() <= clock.now + 15)
+        clock.now = scheduler.next_due()
+        self.assertEqual(scheduler.run_pending(), ["markets"])
+        self.assertEqual(feed.failures, 1)
+        self.assertIsInstance(feed.last_error, SystemError)
+
+        scheduler.unregister("markets")
+        clock.now += 100
+        self.assertEqual(scheduler.run_pending(), [])
+        self.assertIsNone(scheduler.next_due())
+
+    def test_rate_limiter(self):
+        """Test the token bucket spaces out fetches beyond the burst"""
+        clock = FakeClock()
+        limiter = RateLimiter(rate=2, burst=2, clock=clock)
+        self.assertEqual([limiter.delay() for _ in range(3)], [0.0, 0.0, 0.5])
+        clock.now += 1.5
+        self.assertEqual(limiter.delay(), 0.0)
+
+    def test_background_thread(self):
+        """Test the background thread refreshes registered feeds"""
+        scheduler = RefreshScheduler(rate_limit=100)
+        refreshed = threading.Event()
+        scheduler.register("assets", mock.Mock(return_value=1), cadence=60,
+                           subscribers=[lambda name, result: refreshed.set()])
+        scheduler.start()
+        try:
+            self.assertTrue(refreshed.wait(5))
+        finally:
+            scheduler.stop(timeout=5)
+        self.assertFalse(scheduler._thread.is_alive())
+
+
+if __name__ == "__main__":
+    unittest.main()
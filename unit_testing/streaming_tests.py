@@ -0,0 +1,109 @@
+import json
+import queue
+import unittest
+
+import numpy as np
+
+from messari.messari import Messari
+from messari.messari.streaming import RingBuffer
+
+
+class FakeConnection:
+    """Local stand-in for a WebSocket connection fed from a queue"""
+
+    def __init__(self, messages: queue.Queue):
+        self.messages = messages
+        self.sent = []
+
+    def send(self, message):
+        self.sent.append(json.loads(message))
+
+    def recv(self):
+        message = self.messages.get(timeout=5)
+        if isinstance(message, Exception):
+            raise message
+        return message
+
+    def close(self):
+        self.messages.put(ConnectionError('closed'))
+
+
+def trade(timestamp, price, size=1.0, market='coinbase-btc-usd'):
+    return json.dumps({'type': 'trade', 'market': market, 'timestamp': timestamp,
+                       'price': price, 'size': size})
+
+
+class TestMarketStream(unittest.TestCase):
+    """This is a unit testing class for testing the real-time market stream"""
+
+    def test_ring_buffer(self):
+        """Test ring buffer overwrites oldest rows & keeps chronological order"""
+        buffer = RingBuffer(3, ('price',))
+        for i in range(5):
+            buffer.append(i, [float(i)])
+        timestamps, values = buffer.snapshot()
+        np.testing.assert_array_equal(timestamps, [2, 3, 4])
+        np.testing.assert_array_equal(values[:, 0], [2.0, 3.0, 4.0])
+        timestamps, _ = buffer.window(4)
+        np.testing.assert_array_equal(timestamps, [4])
+
+    def test_stream_reconnect_backfill(self):
+        """Test messages are buffered, disconnects reconnect & gaps are backfilled"""
+        connections = []
+        messages = queue.Queue()
+
+        def connection_factory(url, headers):
+            connection = FakeConnection(messages)
+            connections.append(connection)
+            return connection
+
+        backfilled = []
+
+        def backfill(market, since):
+            backfilled.append(since)
+            # The backfill starts at the last timestamp received
+            return [trade(2000, 102.0, 3.0), trade(3000, 103.0), trade(4000, 104.0)]
+
+        stream = Messari('key').stream_markets('ws://localhost', 'coinbase-btc-usd',
+                                               connection_factory=connection_factory,
+                                               backfill=backfill, reconnect_delay=0.01)
+        for message in [trade(1000, 101.0), trade(2000, 102.0, 3.0),
+                        ConnectionError('dropped'), trade(5000, 105.0)]:
+            messages.put(message)
+        stream.start()
+        try:
+            for _ in range(500):
+                if len(stream.buffers[('coinbase-btc-usd', 'trades')]) == 5:
+                    break
+                stream.connected.wait(0.01)
+        finally:
+            stream.stop(timeout=5)
+
+        self.assertEqual(len(connections), 2)
+        self.assertEqual(connections[0].sent[0]['markets'], ['coinbase-btc-usd'])
+        self.assertEqual(backfilled, [2000])
+        snapshot = stream.snapshot('coinbase-btc-usd')
+        np.testing.assert_array_equal(snapshot['price'], [101.0, 102.0, 103.0, 104.0, 105.0])
+        stats = stream.aggregate('coinbase-btc-usd', window_seconds=3.5, now=5)
+        self.assertEqual(stats['count'], 4)
+        self.assertEqual(stats['last'], 105.0)
+        self.assertAlmostEqual(stats['vwap'], (102.0 * 3 + 103 + 104 + 105) / 6)
+
+    def test_overlapping_messages(self):
+        """Test messages resent at the latest timestamp are dropped, other messages
+        sharing the timestamp are kept"""
+        stream = Messari('key').stream_markets('ws://localhost', 'coinbase-btc-usd',
+                                               connection_factory=lambda url, headers: None)
+        for message in [trade(1000, 101.0), trade(1000, 101.5), trade(1000, 101.0),
+                        trade(500, 99.0), trade(2000, 102.0)]:
+            stream.handle_message(message)
+        with_ids = [{'type': 'trade', 'market': 'coinbase-btc-usd', 'timestamp': 3000,
+                     'price': 103.0, 'size': 1.0, 'id': trade_id} for trade_id in (1, 2, 1)]
+        for message in with_ids:
+            stream.handle_message(message)
+        snapshot = stream.snapshot('coinbase-btc-usd')
+        np.testing.assert_array_equal(snapshot['price'], [101.0, 101.5, 102.0, 103.0, 103.0])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,121 @@
+import json
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+import pandas as pd
+import requests
+
+from messari import taxonomy
+from messari.defillama import DeFiLlama
+from messari.taxonomy import Taxonomy, TaxonomyBuilder, diff_taxonomy, get_taxonomy
+
+
+class TestTaxonomy(unittest.TestCase):
+    """This is a unit testing class for testing shared taxonomy lookups"""
+
+    def test_lookups(self):
+        """Test exact, case insensitive, reverse & batch lookups"""
+        mapping = Taxonomy({"uniswap": "uniswap", "uni": "uniswap", "aave": "aave",
+                            "Mixed": "mixed-case"})
+        self.assertEqual(mapping.lookup("UNI"), "uniswap")
+        self.assertEqual(mapping.lookup(" mixed "), "mixed-case")
+        self.assertIsNone(mapping.lookup("bitcoin"))
+        self.assertEqual(mapping.reverse("uniswap"), ("uniswap", "uni"))
+        self.assertEqual(mapping.translate(["Uni", "bitcoin", "aave"]),
+                         ["uniswap", "bitcoin", "aave"])
+        with self.assertRaises(TypeError):
+            mapping["uni"] = "other"  # pylint: disable=unsupported-assignment-operation
+
+    def test_loaded_once(self):
+        """Test the packaged mapping is loaded lazily & shared by every client"""
+        with mock.patch.dict(taxonomy._TAXONOMIES, clear=True), \
+                mock.patch.object(Taxonomy, "from_file", wraps=Taxonomy.from_file) as load:
+            clients = [DeFiLlama() for _ in range(3)]
+            load.assert_not_called()
+            translated = [client.translate(["UNI", "aave"]) for client in clients]
+            load.assert_called_once()
+            self.assertIs(clients[0].taxonomy, clients[1].taxonomy)
+            self.assertIs(clients[0].taxonomy, get_taxonomy())
+        self.assertEqual(translated[0], ["uniswap", "aave"])
+
+    def test_missing_mapping(self):
+        """Test a missing mapping file disables translations instead of failing"""
+        with mock.patch.dict(taxonomy._TAXONOMIES, clear=True):
+            with self.assertLogs(level="WARNING"):
+                empty = get_taxonomy("missing.json")
+        self.assertEqual(len(empty), 0)
+        self.assertEqual(empty.translate(["aave"]), ["aave"])
+
+
+def rate_limited():
+    """SystemError raised by DataLoader for an HTTP 429 response"""
+    response = requests.Response()
+    response.status_code = 429
+    response.headers["Retry-After"] = "2"
+    error = SystemError("429")
+    error.__cause__ = requests.exceptions.HTTPError(response=response)
+    return error
+
+
+class FakeMessari:
+    """Messari client serving 5 pages of 2 assets & rate limiting page 2 once"""
+
+    def __init__(self):
+        self.calls = []
+
+    def get_all_assets(self, page, limit, asset_fields):
+        self.calls.append(page)
+        if page == 2 and self.calls.count(2) == 1:
+            raise rate_limited()
+        assets = [{"slug": f"asset-{page}-{i}", "symbol": f"A{page}{i}"} for i in range(limit)]
+        if page == 5:
+            assets = [{"slug": "uniswap", "symbol": "UNI"}]
+        return {asset["slug"]: asset for asset in assets}
+
+
+class TestTaxonomyBuilder(unittest.TestCase):
+    """This is a unit testing class for testing incremental taxonomy rebuilds"""
+
+    def test_diff(self):
+        """Test only changes are reported & hardcoded overrides win"""
+        current = {"uniswap": "uniswap", "uni": "uniswap", "gone": "delisted",
+                   "manual": "aave", "ohm": "olympus-dao"}
+        assets = [{"slug": "uniswap", "symbol": "UNI"}, {"slug": "aave", "symbol": "AAVE"},
+                  {"slug": "ohm", "symbol": "OHM"}, {"slug": "bitcoin", "symbol": "BTC"}]
+        diff = diff_taxonomy(current, assets, ["uniswap", "aave", "ohm", "olympus-dao"],
+                             hardcode={"ohm": "olympus-dao"})
+        self.assertEqual(diff.added, {"aave": "aave"})
+        self.assertEqual(diff.changed, {})
+        self.assertEqual(diff.removed, {"gone": "delisted"})
+        self.assertEqual(diff.overridden, {"ohm": ("ohm", "olympus-dao")})
+        self.assertEqual(diff.apply(current), {"uniswap": "uniswap", "uni": "uniswap",
+                                               "manual": "aave", "ohm": "olympus-dao",
+                                               "aave": "aave"})
+
+    def test_update(self):
+        """Test pages are fetched concurrently with retries & the file is patched"""
+        messari, sleeps = FakeMessari(), []
+        defillama = mock.Mock()
+        defillama.get_protocols.return_value = pd.DataFrame(index=["uniswap", "asset-3-1"])
+        builder = TaxonomyBuilder(messari=messari, defillama=defillama, page_size=2,
+                                  max_workers=2, sleep=sleeps.append)
+        with tempfile.TemporaryDirectory() as directory, \
+                mock.patch.dict(taxonomy._TAXONOMIES):
+            path = os.path.join(directory, "messari_to_dl.json")
+            with open(path, "w", encoding="utf-8") as file:
+                json.dump({"uni": "uniswap"}, file)
+            diff = builder.update(path=path, hardcode={})
+            with open(path, "r", encoding="utf-8") as file:
+                updated = json.load(file)
+            self.assertEqual(get_taxonomy("messari_to_dl.json").lookup("A31"), "asset-3-1")
+        self.assertEqual(sorted(set(messari.calls)), [1, 2, 3, 4, 5, 6])
+        self.assertEqual(sleeps, [2.0])
+        self.assertEqual(diff.added, {"uniswap": "uniswap", "asset-3-1": "asset-3-1",
+                                      "a31": "asset-3-1"})
+        self.assertEqual(updated, {"uni": "uniswap", **diff.added})
+
+
+if __name__ == "__main__":
+    unittest.main()
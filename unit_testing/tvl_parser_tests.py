@@ -0,0 +1,230 @@
+import io
+import json
+import unittest
+from unittest import mock
+
+import numpy as np
+import pandas as pd
+
+from messari.defillama import DeFiLlama
+from messari.defillama.helpers import format_df, parse_protocol_tvl
+from messari.defillama.stream_parser import parse_protocol_stream
+from messari.parallel import get_process_pool, shutdown_process_pools
+from messari.utils import time_filter_df
+
+DAY = 86400
+START = 1600000000 - 1600000000 % DAY
+
+
+def token_series(days, tokens, offset=0):
+    return [{"date": START + (day + offset) * DAY, "tokens": {t: float(day + i) for i, t in
+                                                               enumerate(tokens) if (day + i) % 3}}
+            for day in range(days)]
+
+
+def protocol_payload():
+    """Small /protocol response with duplicate days & partially overlapping arrays"""
+    chain = {"tvl": [{"date": START + day * DAY, "totalLiquidityUSD": float(day)}
+                     for day in range(10)],
+             "tokens": token_series(10, ["USDC", "WETH", "DAI"]),
+             "tokensInUsd": token_series(12, ["USDC", "WETH"], offset=-2)}
+    # Same day reported twice, the last entry wins
+    chain["tvl"].append({"date": START + 9 * DAY + 3600, "totalLiquidityUSD": 99.0})
+    chain["tokens"].insert(2, {"date": START + 2 * DAY, "tokens": {"GHOST": 1.0}})
+    short_chain = {"tvl": chain["tvl"][4:], "tokens": [], "tokensInUsd": []}
+    return {"chains": ["Ethereum", "Polygon"],
+            "chainTvls": {"Ethereum": chain, "Polygon": short_chain},
+            "tvl": chain["tvl"], "tokens": chain["tokens"], "tokensInUsd": chain["tokensInUsd"]}
+
+
+def reference_frame(slug, protocol):
+    """Frame built the way get_protocol_tvl_timeseries originally did, one DataFrame per array"""
+    def chain_frame(chain_tvl):
+        tvl_df = format_df(pd.DataFrame(chain_tvl["tvl"]))
+        frames = []
+        for key, suffix in (("tokens", ""), ("tokensInUsd", "_usd")):
+            records = [{"date": token["date"], **token["tokens"]} for token in chain_tvl[key]]
+            if records:
+                frames.append(format_df(pd.DataFrame(records)).add_suffix(suffix))
+        if not frames:
+            return tvl_df
+        return tvl_df.join(pd.concat(frames, axis=1, sort=True))
+
+    chain_dfs = [chain_frame(protocol["chainTvls"][chain]) for chain in protocol["chains"]]
+    chain_dfs.append(chain_frame(protocol))
+    slug_df = pd.concat(chain_dfs, keys=protocol["chains"] + ["all"], axis=1)
+    return pd.concat([slug_df], keys=[slug], axis=1).sort_index()
+
+
+class TestProtocolTvlParser(unittest.TestCase):
+    """This is a unit testing class for testing DeFi Llama protocol TVL parsing"""
+
+    def test_matches_reference(self):
+        """Test vectorized parser builds the same frame as per array DataFrames"""
+        dl = DeFiLlama()
+        protocol = protocol_payload()
+        with mock.patch.object(dl, "_fetch_response", return_value=protocol):
+            tvl_df = dl.get_protocol_tvl_timeseries("aave")
+        expected = reference_frame("aave", protocol_payload())
+        pd.testing.assert_frame_equal(tvl_df, expected, check_dtype=False, check_freq=False)
+        self.assertEqual(tvl_df["aave"]["all"]["totalLiquidityUSD"].iloc[-1], 99.0)
+
+    def test_response_not_mutated(self):
+        """Test decoded JSON is left untouched so cached responses can be reused"""
+        dl = DeFiLlama()
+        protocol = protocol_payload()
+        with mock.patch.object(dl, "_fetch_response", return_value=protocol):
+            dl.get_protocol_tvl_timeseries("aave")
+        self.assertEqual(protocol, protocol_payload())
+
+    def test_selective_parsing(self):
+        """Test chains, native/usd amounts & top tokens can be selected"""
+        dl = DeFiLlama()
+        with mock.patch.object(dl, "_fetch_response", return_value=protocol_payload()):
+            tvl_df = dl.get_protocol_tvl_timeseries("aave", chains=["Ethereum", "all"],
+                                                    include_native=False, top_n_tokens=1)
+            full_df = dl.get_protocol_tvl_timeseries("aave")
+        self.assertEqual(tvl_df.columns.tolist(),
+                         [("aave", "Ethereum", "totalLiquidityUSD"),
+                          ("aave", "Ethereum", "USDC_usd"),
+                          ("aave", "all", "totalLiquidityUSD"), ("aave", "all", "USDC_usd")])
+        pd.testing.assert_frame_equal(tvl_df, full_df[tvl_df.columns])
+
+    def test_chain_names(self):
+        """Test chains match case-insensitively & unknown chains return no columns"""
+        dl = DeFiLlama()
+        with mock.patch.object(dl, "_fetch_response", return_value=protocol_payload()):
+            tvl_df = dl.get_protocol_tvl_timeseries("aave", chains="ethereum")
+            expected_df = dl.get_protocol_tvl_timeseries("aave", chains="Ethereum")
+            with self.assertLogs(level="WARNING"):
+                unknown_df = dl.get_protocol_tvl_timeseries("aave", chains=["Nope"])
+        pd.testing.assert_frame_equal(tvl_df, expected_df)
+        self.assertEqual(set(tvl_df.columns.get_level_values(1)), {"Ethereum"})
+        self.assertTrue(unknown_df.empty)
+        self.assertEqual(unknown_df.columns.nlevels, 3)
+
+        body = json.dumps(protocol_payload()).encode()
+        _, columns, _ = parse_protocol_stream(io.BytesIO(body), chains=["POLYGON"])
+        self.assertEqual({column[0] for column in columns}, {"Polygon"})
+        self.assertEqual(parse_protocol_stream(io.BytesIO(body), chains=["Nope"])[1], [])
+
+
+class TestDateHandling(unittest.TestCase):
+    """This is a unit testing class for testing DeFi Llama date indexes & filters"""
+
+    def test_datetime_index(self):
+        """Test format_df keeps a datetime64 index of days without mutating its input"""
+        raw_df = pd.DataFrame({"date": [str(START + DAY), str(START + DAY + 60), str(START)],
+                               "totalLiquidityUSD": [1.0, 2.0, 3.0]})
+        original = raw_df.copy()
+        tvl_df = format_df(raw_df)
+        pd.testing.assert_frame_equal(raw_df, original)
+        self.assertIsInstance(tvl_df.index, pd.DatetimeIndex)
+        self.assertEqual(tvl_df.index.tolist(), [pd.Timestamp(START + DAY, unit="s"),
+                                                 pd.Timestamp(START, unit="s")])
+        self.assertEqual(tvl_df["totalLiquidityUSD"].tolist(), [2.0, 3.0])
+
+        filtered_df = time_filter_df(tvl_df, start_date=pd.Timestamp(START, unit="s")
+                                     .strftime("%Y-%m-%d"))
+        self.assertTrue(filtered_df.index.is_monotonic_increasing)
+        self.assertFalse(tvl_df.index.is_monotonic_increasing)
+        self.assertEqual(filtered_df["totalLiquidityUSD"].tolist(), [3.0, 2.0])
+        end = pd.Timestamp(START, unit="s").strftime("%Y-%m-%d")
+        self.assertEqual(time_filter_df(tvl_df, end_date=end)["totalLiquidityUSD"].tolist(),
+                         [3.0])
+
+    def test_window_pushdown(self):
+        """Test date ranges applied to raw entries match filtering the full frame"""
+        dl = DeFiLlama()
+        start = pd.Timestamp(START + 3 * DAY, unit="s").strftime("%Y-%m-%d")
+        end = pd.Timestamp(START + 8 * DAY, unit="s").strftime("%Y-%m-%d")
+        with mock.patch.object(dl, "_fetch_response", return_value=protocol_payload()):
+            tvl_df = dl.get_protocol_tvl_timeseries("aave", start_date=start, end_date=end)
+            full_df = time_filter_df(dl.get_protocol_tvl_timeseries("aave"), start, end)
+        self.assertEqual(len(tvl_df), 6)
+        # Tokens without entries in the range are returned as NaN columns
+        pd.testing.assert_frame_equal(tvl_df, full_df, check_freq=False)
+        self.assertTrue(tvl_df["aave"]["all"]["GHOST"].isna().all())
+
+        chart = protocol_payload()["tvl"]
+        with mock.patch.object(dl, "_fetch_response", return_value=chart):
+            global_df = dl.get_global_tvl_timeseries(start_date=start, end_date=end)
+            chain_df = dl.get_chain_tvl_timeseries("Ethereum", end_date=end)
+        self.assertEqual(global_df["totalLiquidityUSD"].tolist(), [3.0, 4.0, 5.0, 6.0, 7.0, 8.0])
+        self.assertEqual(chain_df.index[-1], pd.Timestamp(end))
+
+    def test_chain_without_entries_in_window(self):
+        """Test a chain with no entries in the date range is returned as a NaN column"""
+        dl = DeFiLlama()
+        chart = protocol_payload()["tvl"]
+        start = pd.Timestamp(START + 6 * DAY, unit="s").strftime("%Y-%m-%d")
+        with mock.patch.object(dl, "_fetch_response", side_effect=[chart, chart[:3]]):
+            chain_df = dl.get_chain_tvl_timeseries(["Ethereum", "Polygon"], start_date=start)
+        self.assertEqual(list(chain_df.columns), ["Ethereum", "Polygon"])
+        self.assertEqual(chain_df["Ethereum"].tolist(), [6.0, 7.0, 8.0, 99.0])
+        self.assertTrue(chain_df["Polygon"].isna().all())
+
+
+class TestProtocolStreamParser(unittest.TestCase):
+    """This is a unit testing class for testing incremental DeFi Llama protocol TVL parsing"""
+
+    def test_matches_decoded_parser(self):
+        """Test streamed parsing builds the same block as parsing the decoded response"""
+        protocol = protocol_payload()
+        protocol["raises"] = [{"date": START, "amount": 1}]
+        body = json.dumps(protocol).encode()
+        window = (START + 2 * DAY, START + 6 * DAY)
+        for options in ({}, {"chains": ["Polygon", "all"]}, {"include_native": False},
+                        {"include_usd": False, "top_n_tokens": 2}, {"window": window},
+                        {"top_n_tokens": 1, "window": window}):
+            with self.subTest(**options):
+                days, columns, values = parse_protocol_stream(io.BytesIO(body), **options)
+                expected_days, expected_columns, expected_values = \
+                    parse_protocol_tvl(protocol, **options)
+                np.testing.assert_array_equal(days, expected_days)
+                self.assertEqual(columns, expected_columns)
+                np.testing.assert_array_equal(values, expected_values)
+
+    def test_stream_option(self):
+        """Test get_protocol_tvl_timeseries parses streamed responses"""
+        dl = DeFiLlama()
+        response = mock.MagicMock()
+        response.__enter__.return_value.raw = io.BytesIO(json.dumps(protocol_payload()).encode())
+        with mock.patch.object(dl, "get_stream", return_value=response):
+            tvl_df = dl.get_protocol_tvl_timeseries("aave", stream=True)
+        with mock.patch.object(dl, "_fetch_response", return_value=protocol_payload()):
+            expected = dl.get_protocol_tvl_timeseries("aave")
+        pd.testing.assert_frame_equal(tvl_df, expected)
+
+
+class TestProcessPool(unittest.TestCase):
+    """This is a unit testing class for testing protocols parsed in worker processes"""
+
+    @classmethod
+    def tearDownClass(cls):
+        shutdown_process_pools()
+
+    def test_processes_option(self):
+        """Test protocols parsed in worker processes match protocols parsed in process"""
+        dl = DeFiLlama()
+        content = json.dumps(protocol_payload()).encode()
+        options = {"start_date": "2020-09-15", "top_n_tokens": 1}
+        with mock.patch.object(dl, "get_content", return_value=content) as get_content:
+            tvl_df = dl.get_protocol_tvl_timeseries(["aave", "compound"], processes=2, **options)
+        self.assertEqual(get_content.call_count, 2)
+        with mock.patch.object(dl, "_fetch_response", return_value=protocol_payload()):
+            expected = dl.get_protocol_tvl_timeseries(["aave", "compound"], **options)
+        pd.testing.assert_frame_equal(tvl_df, expected)
+        with self.assertRaises(ValueError):
+            dl.get_protocol_tvl_timeseries("aave", stream=True, processes=2)
+
+    def test_shared_pool(self):
+        """Test pools are shared per number of processes"""
+        self.assertIs(get_process_pool(2), get_process_pool(2))
+        self.assertIsNot(get_process_pool(1), get_process_pool(2))
+        with self.assertRaises(ValueError):
+            get_process_pool(0)
+
+
+if __name__ == "__main__":
+    unittest.main()